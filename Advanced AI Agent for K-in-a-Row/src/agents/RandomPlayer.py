@@ -61,11 +61,13 @@ class OurAgent(KAgent):
     def nickname(self): return self.nickname
 
     def make_move(self, state, last_utterance, time_limit):
-        possibleMoves = successors_and_moves(state)
-        myMove = chooseMove(possibleMoves)
+        # Pick the square first, so only the chosen successor is built.
+        possibleMoves = legal_moves(state)
+        if possibleMoves==[]: return [[None, state], "I have no legal moves!"]
+        i, j = possibleMoves[randint(0, len(possibleMoves)-1)]
+        newState = do_move(state, i, j, other(state.whose_move))
         myUtterance = self.nextUtterance()
-        newState, newMove = myMove
-        return [[newMove, newState], myUtterance]
+        return [[(i, j), newState], myUtterance]
 
     def nextUtterance(self):
         if self.repeat_count > 1: return "I am randomed out now."
@@ -118,6 +120,12 @@ def move_gen(state):
             news = do_move(state, i, j, o)
             yield [(i, j), news]
 
+# The empty squares, without building any successor states.
+def legal_moves(state):
+    b = state.board
+    return [(i, j) for i in range(len(b)) for j in range(len(b[0]))
+            if b[i][j] == ' ']
+
 # This uses the generator to get all the successors.
 def successors_and_moves(state):
     moves = []
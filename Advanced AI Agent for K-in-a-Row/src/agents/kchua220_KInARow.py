@@ -17,6 +17,19 @@ TO PROVIDE A GOOD STRUCTURE FOR YOUR IMPLEMENTATION.
 
 from src.agents.agent_base import KAgent
 from src.core.game_types import State, Game_Type
+from src.core.bitboard import BitState
+from src.core.incremental_eval import IncrementalEvaluator
+from src.core.pattern_table import get_line_tables
+from src.core import batch_eval
+from src.core.move_gen import lazy_moves, move_count, CutoffHistory
+from src.core.search import Search, TimeBudget
+from src.core.threat_space import ThreatSpaceSearch
+from src.core.proof_number import ProofNumberSearch, WIN, DRAW
+from src.core.parallel import ParallelSearch
+from src.core.opening_book import OpeningBook, book_path
+from src.core.retrograde import PerfectPlayTable, table_path
+from src.core.ponder import Ponderer
+from src.core.transposition import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
 
 
 AUTHORS = 'Chuang, Kevin'
@@ -54,11 +67,54 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
        self.opponent_nickname = None
        self.time_limit = 1.0
        self.start_time = None
-       self.zobrist_table = {}
+       self.zobrist_table = None
+       self.zobrist_table_max_bytes = 8 * 1024 * 1024
+       self.zobrist_table_num_overwrites_this_turn = 0
+       self.zobrist_table_user = None
+       self.cutoff_history = None
+       self.fixed_search_depth = 0
        self.zobrist_random_numbers = None
+       self.out_of_time = False
        self.use_llm = False
        self.llm_model = None
        self.move_history = []
+       self.use_incremental_eval = True
+       self.evaluator = None
+       self.special_eval_fn = None
+       self.batch_evaluator = None
+       self.use_batch_ordering = False  # Score children with NumPy (see src/core/batch_eval.py)
+       self.order_interior_nodes = False
+       self.nodes_this_turn = 0
+       self.children_skipped_this_turn = 0
+       self.re_searches_this_turn = 0
+       self.use_iterative_deepening = True
+       self.use_pvs_search = True  # PVS, aspiration windows and late-move reductions
+       self.use_candidate_moves = True  # Quiet moves only near the stones
+       self.search = None
+       self.time_budget = None
+       self.depth_reached_this_turn = 0
+       self.use_threat_search = True
+       self.threat_time_share = 0.1  # Of each move's time limit
+       self.threat_search = None
+       self.threat_line_this_turn = None
+       self.threat_proof_this_turn = False
+       self.use_endgame_solver = True
+       self.endgame_empty_squares = 12  # Solve outright once this few are left
+       self.endgame_time_share = 0.3
+       self.endgame_solver = None
+       self.proof_this_turn = None
+       self.parallel_workers = 0  # Extra processes to share the search with
+       self.parallel_search = None
+       self.use_opening_book = True  # Built offline by src/core/opening_book.py
+       self.opening_book = None
+       self.book_depth_this_turn = 0
+       self.use_perfect_play = True  # Tables built offline by src/core/retrograde.py
+       self.perfect_play = None
+       self.perfect_play_this_turn = None
+       self.use_pondering = False  # Search on the opponent's time (see src/core/ponder.py)
+       self.ponderer = None
+       self.ponder_this_turn = None
+       self.last_pv = []
 
 
    def introduce(self):
@@ -100,6 +156,50 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
       
        # Initialize Zobrist random numbers for hashing
        self.initialize_zobrist_table(game_type)
+       # Fixed-size table, kept for the whole game so each search can
+       # reuse the positions the previous ones already searched
+       self.zobrist_table = TranspositionTable(self.zobrist_table_max_bytes)
+      
+       # Killer moves and history scores, kept between searches
+       self.cutoff_history = CutoffHistory(game_type.n * game_type.m)
+      
+       # Window scores for the running-total form of static_eval
+       self.evaluator = WindowEvaluator(game_type, self.score_line)
+       if batch_eval.AVAILABLE:
+           self.batch_evaluator = batch_eval.WindowCountBatch(game_type, self.evaluator.window_scores)
+      
+       # Iterative deepening, used outside AUTOGRADER mode
+       self.search = Search(lambda state: self.static_eval(state, game_type),
+                            self.order_children, self.zobrist_table,
+                            self.cutoff_history)
+       self.search.aspiration_window = 25  # Window scores run from 1 to 100
+       self.time_budget = TimeBudget(game_type)
+      
+       # Forced wins made only of threats, tried before the search
+       self.threat_search = ThreatSpaceSearch()
+      
+       # Proof-number search, to settle the last few moves exactly
+       self.endgame_solver = ProofNumberSearch()
+      
+       # Opening moves searched deeply offline, if a book was built
+       self.opening_book = OpeningBook.load(book_path('kchua220', game_type), game_type)
+      
+       # Every position solved outright, for boards small enough to have a table
+       self.perfect_play = PerfectPlayTable.load(table_path(game_type), game_type)
+      
+       # Thinking about the expected reply while the opponent moves
+       if self.ponderer is not None:
+           self.ponderer.stop()
+       self.ponderer = Ponderer(self.search) if self.use_pondering else None
+      
+       # Helper processes for the search, started once per game so
+       # that no move pays for starting them
+       if self.parallel_search is not None:
+           self.parallel_search.close()
+           self.parallel_search = None
+       if self.parallel_workers > 0:
+           self.parallel_search = ParallelSearch(parallel_helper, game_type,
+                                                 self.parallel_workers)
       
        return "OK"
  
@@ -115,56 +215,114 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
        self.num_static_evals_this_turn = 0
        self.zobrist_table_num_entries_this_turn = 0  # Reset
        self.zobrist_table_num_hits_this_turn = 0     # Reset
+       self.nodes_this_turn = 0
+       self.children_skipped_this_turn = 0
+       self.zobrist_table_num_overwrites_this_turn = 0
+       self.re_searches_this_turn = 0
+       self.depth_reached_this_turn = 0
+       self.threat_line_this_turn = None
+       self.threat_proof_this_turn = False
+       self.proof_this_turn = None
+       self.book_depth_this_turn = 0
+       self.perfect_play_this_turn = None
+       self.ponder_this_turn = None
+       self.last_pv = []
+       self.out_of_time = False
+      
+       # Pondering shares our search and its tables, so it stops first
+       if self.ponderer is not None:
+           self.ponderer.stop()
       
-       # Clear zobrist table at start of each move
-       if use_zobrist_hashing:
-           self.zobrist_table = {}
+       # Outside AUTOGRADER mode, deepen until the move's time is used;
+       # the autograder's stats need the fixed-depth search
+       iterative = (self.use_iterative_deepening and use_alpha_beta
+                    and not special_static_eval_fn
+                    and self.playing_mode != KAgent.AUTOGRADER)
+      
+       # Scores stored by the other search (minimax scores rather than
+       # negamax), or under a different eval function, are no use
+       table_user = ('search' if iterative else 'minimax', special_static_eval_fn)
+       if (iterative or use_zobrist_hashing) and table_user != self.zobrist_table_user:
+           self.zobrist_table.clear()
+           self.zobrist_table_user = table_user
+       self.zobrist_table.new_search()
+       self.cutoff_history.new_turn()
       
        # Store the special eval function if provided (for autograder)
        self.special_eval_fn = special_static_eval_fn
       
+       # Order children by static value inside the search too
+       self.order_interior_nodes = (use_alpha_beta and use_child_ordering
+                                    and not special_static_eval_fn)
+      
        # Find all legal moves
        legal_moves = self.get_legal_moves(current_state)
       
        if not legal_moves:
            return [[None, current_state], "No legal moves available!"]
       
-       # Order moves if using alpha-beta
-       if use_alpha_beta and use_child_ordering:
-           ordered_moves = self.order_moves_by_eval(current_state, legal_moves)
-       else:
-           ordered_moves = legal_moves
+       # Use minimax to find best move, making and unmaking each
+       # move on one bitboard instead of copying the board
+       root = BitState(self.current_game_type, current_state,
+                       self.search_symmetries())
+       if self.use_incremental_eval and self.evaluator and not special_static_eval_fn:
+           root.attach_evaluator(self.evaluator)
+       pondered = None
+       if self.ponderer is not None:
+           pondered = self.ponderer.finish(root)
+           self.ponder_this_turn = self.ponderer.outcome
       
-       # Use minimax to find best move
-       best_move = None
-       best_score = float('-inf') if current_state.whose_move == 'X' else float('inf')
+       # A solved position or a book move needs no search, a win by
+       # continuous fours no full-width search at all (an attack that
+       # needs threes is only tried first), and near the end of the
+       # game a proof beats any search
+       threat = proof = book = perfect = None
+       if not special_static_eval_fn and self.playing_mode != KAgent.AUTOGRADER:
+           self.time_budget.open(root, time_limit)
+           if self.use_perfect_play and self.perfect_play is not None:
+               perfect = self.perfect_play.lookup(current_state)
+               if perfect is not None and perfect[0] is None:
+                   perfect = None
+           if perfect is None and self.use_opening_book and self.opening_book is not None:
+               book = self.opening_book.lookup(root)
+           if perfect is None and book is None and self.use_threat_search:
+               threat = self.find_threat_win(root, time_limit)
+           if perfect is None and book is None and (threat is None or not threat.proof) \
+                   and self.use_endgame_solver and root.num_empty() <= self.endgame_empty_squares:
+               proof = self.solve_endgame(root, time_limit)
       
-       for move in ordered_moves:
-           new_state = self.make_move_on_board(current_state, move)
-          
-           # Call minimax with zobrist flag
-           if use_alpha_beta:
-               score, _ = self.minimax(new_state, max_ply - 1, True,
-                                   float('-inf'), float('inf'), use_zobrist_hashing)
-           else:
-               score, _ = self.minimax(new_state, max_ply - 1, False,
-                                   None, None, use_zobrist_hashing)
-          
-           # Choose best move based on player
-           if current_state.whose_move == 'X':
-               if score > best_score:
-                   best_score = score
-                   best_move = move
-           else:
-               if score < best_score:
-                   best_score = score
-                   best_move = move
+       if perfect is not None:
+           best_move, outcome, plies = perfect
+           self.perfect_play_this_turn = f"{outcome} in {plies} {'ply' if plies == 1 else 'plies'}" if plies else outcome
+       elif book is not None:
+           best_move, _, self.book_depth_this_turn = book
+       elif threat is not None and threat.proof:
+           best_move = threat.move
+       elif proof is not None:
+           best_move = proof.move
+       elif iterative:
+           attack = threat.line if threat is not None else None
+           best_move = self.search_iteratively(root, time_limit, pondered, attack)
+       else:
+           best_move = self.search_fixed_depth(root, legal_moves, use_alpha_beta,
+                                               use_zobrist_hashing, max_ply,
+                                               use_child_ordering)
+      
+       if iterative or use_zobrist_hashing:
+           self.zobrist_table_num_entries_this_turn = self.zobrist_table.stores
+           self.zobrist_table_num_hits_this_turn = self.zobrist_table.hits
+           if iterative and self.parallel_search is not None:
+               self.zobrist_table_num_entries_this_turn += self.parallel_search.helper_stats['table_stores']
+               self.zobrist_table_num_hits_this_turn += self.parallel_search.helper_stats['table_hits']
+           self.zobrist_table_num_overwrites_this_turn = self.zobrist_table.overwrites
       
        # Make the move
        final_state = self.make_move_on_board(current_state, best_move)
       
        # Calculate elapsed time
        elapsed_time = time.time() - self.start_time
+       if self.time_budget is not None:
+           self.time_budget.spend(elapsed_time)
       
        # Check if opponent asked for explanation
        if current_remark and "tell me how you did that" in current_remark.lower():
@@ -172,6 +330,12 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
        else:
            utterance = self.generate_utterance(current_state, best_move)
       
+       # Think about the reply we expect while the opponent makes theirs
+       if self.ponderer is not None and len(self.last_pv) > 1:
+           root.make_move(best_move)
+           if root.winner() is None:
+               self.ponderer.start(root, self.last_pv[1], self.time_budget.turns_left(root))
+      
        # Return format depends on mode
        if self.playing_mode == KAgent.AUTOGRADER:
            stats = [self.alpha_beta_cutoffs_this_turn,
@@ -185,21 +349,141 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
 
 
 
+   def search_fixed_depth(self, root, legal_moves, use_alpha_beta,
+                          use_zobrist_hashing, max_ply, use_child_ordering):
+       """
+       Search every root move to max_ply with minimax; return the best move.
+       """
+       self.fixed_search_depth = max_ply
+      
+       # Order moves if using alpha-beta
+       if use_alpha_beta and use_child_ordering:
+           ordered_moves = self.order_moves_by_eval(root, legal_moves)
+       else:
+           ordered_moves = legal_moves
+      
+       best_move = None
+       best_score = float('-inf') if root.whose_move == 'X' else float('inf')
+      
+       for move in ordered_moves:
+           root.make_move(move)
+           self.nodes_this_turn += 1
+          
+           # Call minimax with zobrist flag
+           if use_alpha_beta:
+               score, _ = self.minimax(root, max_ply - 1, True,
+                                   float('-inf'), float('inf'), use_zobrist_hashing)
+           else:
+               score, _ = self.minimax(root, max_ply - 1, False,
+                                   None, None, use_zobrist_hashing)
+           root.unmake_move()
+          
+           # Choose best move based on player
+           if root.whose_move == 'X':
+               if score > best_score:
+                   best_score = score
+                   best_move = move
+           else:
+               if score < best_score:
+                   best_score = score
+                   best_move = move
+       return best_move
+
+
+   def search_iteratively(self, root, time_limit, pondered=None, first_line=None):
+       """
+       Iterative deepening: search 1, 2, 3, ... plies until this move's
+       share of the time is used, and return the best move of the
+       deepest search that finished.  If we already pondered this very
+       position for at least as long, or pondering proved its result,
+       that result is played at once.  first_line, if given, is the
+       line searched first.
+       """
+       soft_deadline, hard_deadline = self.time_budget.plan(root, self.start_time, time_limit)
+       if self.ponderer is not None and self.ponderer.settles(pondered, soft_deadline - self.start_time):
+           self.ponder_this_turn = 'used'
+           self.depth_reached_this_turn = pondered.depth
+           self.last_pv = pondered.pv
+           return pondered.move
+       self.search.reset_stats()
+       self.search.pvs = self.search.aspiration = self.search.reductions = self.use_pvs_search
+       self.search.near_only = self.use_candidate_moves
+       turns_left = self.time_budget.turns_left(root)
+       if self.parallel_search is not None:
+           result = self.parallel_search.search(self.search, root, hard_deadline,
+                                                soft_deadline, turns_left, first_line)
+           helpers = self.parallel_search.helper_stats
+       else:
+           result = self.search.iterative_deepening(root, hard_deadline, soft_deadline,
+                                                    turns_left=turns_left, first_line=first_line)
+           helpers = {}
+       self.alpha_beta_cutoffs_this_turn = self.search.cutoffs + helpers.get('cutoffs', 0)
+       self.num_static_evals_this_turn = self.search.static_evals + helpers.get('static_evals', 0)
+       self.nodes_this_turn = self.search.nodes + helpers.get('nodes', 0)
+       self.children_skipped_this_turn = self.search.children_skipped + helpers.get('children_skipped', 0)
+       self.re_searches_this_turn = self.search.re_searches + helpers.get('re_searches', 0)
+       self.depth_reached_this_turn = result.depth
+       self.last_pv = result.pv
+       return result.move
+
+
+   def find_threat_win(self, root, time_limit):
+       """
+       Look for a win in which every move of ours is a threat, giving
+       it a small share of the move's time; return a ThreatResult or None.
+       Only a win made of fours is a proof (result.proof); one that needs
+       threes is an attack for the search to try first.
+       """
+       deadline = self.start_time + time_limit * self.threat_time_share
+       result = self.threat_search.find_win(root, deadline,
+                                            turns_left=self.time_budget.turns_left(root))
+       if result is not None:
+           self.nodes_this_turn = self.threat_search.nodes
+           self.threat_line_this_turn = result.line
+           self.threat_proof_this_turn = result.proof
+       return result
+
+
+   def solve_endgame(self, root, time_limit):
+       """
+       Try to prove the position a win or a draw for us with
+       proof-number search; return the ProofResult if it is one.
+       """
+       deadline = self.start_time + time_limit * self.endgame_time_share
+       result = self.endgame_solver.solve(root, self.time_budget.turns_left(root), deadline)
+       if result.outcome in (WIN, DRAW) and result.move is not None:
+           self.nodes_this_turn = result.nodes
+           self.proof_this_turn = result.outcome
+           return result
+       return None
+
+
+
+
        # The main adversarial search function:
    def minimax(self, state, depth_remaining, pruning=False, alpha=None, beta=None,
                use_zobrist=False):  # Add this parameter
        """
        Minimax algorithm with optional alpha-beta pruning and Zobrist hashing.
+       Children are visited by making and unmaking moves on a BitState.
        """
+       if not isinstance(state, BitState):
+           state = BitState(self.current_game_type, state, self.search_symmetries())
+           if self.use_incremental_eval and self.evaluator and not self.special_eval_fn:
+               state.attach_evaluator(self.evaluator)
       
        # Check time limit
        if self.start_time and (time.time() - self.start_time) > (self.time_limit * 0.8):
+           self.out_of_time = True  # Scores from now on are not stored
            score = self.static_eval(state, self.current_game_type)
            return [score, None]
       
        # ZOBRIST LOOKUP: Check if we've seen this state before
+       alpha_orig, beta_orig = alpha, beta
+       hash_move = None
        if use_zobrist:
-           found, cached_score = self.lookup_zobrist(state, depth_remaining)
+           found, cached_score, hash_move = self.lookup_zobrist(state, depth_remaining,
+                                                                alpha, beta)
            if found:
                return [cached_score, None]
       
@@ -213,9 +497,21 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
           
            return [score, None]
       
-       legal_moves = self.get_legal_moves(state)
+       history = None
+       if pruning and self.order_interior_nodes:
+           # Lazy and ordered: threats first, then killer moves, then the
+           # rest (sorted by static value when deep enough, otherwise by
+           # history score), one child at a time
+           history = self.cutoff_history
+           ply = self.fixed_search_depth - depth_remaining
+           order_rest = self.order_children if depth_remaining >= 2 else history.order
+           legal_moves = lazy_moves(state, hash_move, order_rest,
+                                    history.killer_moves(ply))
+       else:
+           legal_moves = state.legal_moves()
+       visited = 0
       
-       if not legal_moves:
+       if state.is_full():
            score = self.static_eval(state, self.current_game_type)
           
            if use_zobrist:
@@ -229,9 +525,11 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
            best_move = None
           
            for move in legal_moves:
-               new_state = self.make_move_on_board(state, move)
-               score, _ = self.minimax(new_state, depth_remaining - 1, pruning,
+               state.make_move(move)
+               visited += 1
+               score, _ = self.minimax(state, depth_remaining - 1, pruning,
                                    alpha, beta, use_zobrist)
+               state.unmake_move()
               
                if score > max_score:
                    max_score = score
@@ -241,11 +539,16 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
                    alpha = max(alpha, score)
                    if beta is not None and beta <= alpha:
                        self.alpha_beta_cutoffs_this_turn += 1
+                       self.children_skipped_this_turn += self.children_left(state, history, visited)
+                       if history is not None:
+                           history.record_cutoff(state, move, depth_remaining, ply)
                        break
+           self.nodes_this_turn += visited
           
            # ZOBRIST STORE: Save this evaluation
            if use_zobrist:
-               self.store_zobrist(state, max_score, depth_remaining)
+               self.store_zobrist(state, max_score, depth_remaining,
+                                  alpha_orig, beta_orig, best_move)
           
            return [max_score, best_move]
       
@@ -255,9 +558,11 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
            best_move = None
           
            for move in legal_moves:
-               new_state = self.make_move_on_board(state, move)
-               score, _ = self.minimax(new_state, depth_remaining - 1, pruning,
+               state.make_move(move)
+               visited += 1
+               score, _ = self.minimax(state, depth_remaining - 1, pruning,
                                    alpha, beta, use_zobrist)
+               state.unmake_move()
               
                if score < min_score:
                    min_score = score
@@ -267,11 +572,16 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
                    beta = min(beta, score)
                    if alpha is not None and beta <= alpha:
                        self.alpha_beta_cutoffs_this_turn += 1
+                       self.children_skipped_this_turn += self.children_left(state, history, visited)
+                       if history is not None:
+                           history.record_cutoff(state, move, depth_remaining, ply)
                        break
+           self.nodes_this_turn += visited
           
            # ZOBRIST STORE: Save this evaluation
            if use_zobrist:
-               self.store_zobrist(state, min_score, depth_remaining)
+               self.store_zobrist(state, min_score, depth_remaining,
+                                  alpha_orig, beta_orig, best_move)
           
            return [min_score, best_move]
    def static_eval(self, state, game_type=None):
@@ -291,6 +601,21 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
        if not gt:
            return 0
       
+       # Score a plain State by table lookups too
+       if not isinstance(state, BitState) and self.evaluator is not None \
+               and self.evaluator.game_type is gt:
+           state = BitState(gt, state)
+           state.attach_evaluator(self.evaluator)
+      
+       # Running total of the same window scores, kept by WindowEvaluator
+       if isinstance(state, BitState) and state.evaluator is not None \
+               and state.evaluator.game_type is gt:
+           if state.x_wins:
+               return 10000
+           if state.o_wins:
+               return -10000
+           return state.eval_score
+      
        k = gt.k
        board = state.board
        n_rows = len(board)
@@ -383,6 +708,8 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
   
    def check_win(self, state, player, k):
        """Check if player has k in a row."""
+       if isinstance(state, BitState):
+           return state.has_win(player)  # O(1): window counts are kept per move
        board = state.board
        n_rows = len(board)
        n_cols = len(board[0])
@@ -449,6 +776,8 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
            return True
       
        # Check for draw (no legal moves)
+       if isinstance(state, BitState):
+           return state.is_full()
        return len(self.get_legal_moves(state)) == 0
 
 
@@ -584,6 +913,30 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
        explanation += f"- I evaluated {self.num_static_evals_this_turn} different board positions\n"
        explanation += f"- My alpha-beta pruning made {self.alpha_beta_cutoffs_this_turn} cutoffs, "
        explanation += f"saving me from evaluating unnecessary branches\n"
+       explanation += f"- I visited {self.nodes_this_turn} positions and never even generated "
+       explanation += f"{self.children_skipped_this_turn} others, thanks to threat-first move ordering\n"
+       if self.depth_reached_this_turn:
+           explanation += f"- I looked {self.depth_reached_this_turn} moves ahead with iterative deepening\n"
+       if self.re_searches_this_turn:
+           explanation += f"- {self.re_searches_this_turn} times a line beat my narrow search window or reduction, so I searched it again\n"
+       if self.threat_line_this_turn and self.threat_proof_this_turn:
+           explanation += f"- I spotted a forced win by continuous fours: {self.threat_line_this_turn}\n"
+       elif self.threat_line_this_turn:
+           explanation += f"- I spotted an attack of fours and threes, not a sure win, so I searched it first: {self.threat_line_this_turn}\n"
+       if self.proof_this_turn:
+           explanation += f"- Proof-number search proved this position a {self.proof_this_turn} for me\n"
+       if self.perfect_play_this_turn:
+           explanation += f"- No search needed: my perfect-play table says this is a {self.perfect_play_this_turn}\n"
+       if self.ponder_this_turn == 'used':
+           explanation += f"- I saw your move coming and had already worked it out on your time!\n"
+       elif self.ponder_this_turn == 'hit':
+           explanation += f"- I saw your move coming, so my thinking on your time gave this search a head start\n"
+       if self.book_depth_this_turn:
+           explanation += f"- I had this one in my opening book, searched {self.book_depth_this_turn} moves deep ahead of time\n"
+       if self.zobrist_table_num_entries_this_turn:
+           explanation += f"- My transposition table took {self.zobrist_table_num_entries_this_turn} stores, "
+           explanation += f"{self.zobrist_table_num_hits_this_turn} hits and "
+           explanation += f"{self.zobrist_table_num_overwrites_this_turn} overwrites\n"
        explanation += f"- Total computation time: {time_taken:.4f} seconds\n"
        explanation += f"- This move maximizes my strategic advantage based on threat analysis "
        explanation += f"and positioning for a {self.current_game_type.k}-in-a-row!"
@@ -631,66 +984,220 @@ class OurAgent(KAgent):  # Keep the class name "OurAgent" so a game master
        return sorted(moves, key=score_move, reverse=True)
 
 
+   def make_search_root(self, state):
+       """
+       Return the BitState the iterative-deepening search runs on for
+       state, with our evaluator attached.
+       """
+       root = BitState(self.current_game_type, state, self.search_symmetries())
+       if self.use_incremental_eval and self.evaluator:
+           root.attach_evaluator(self.evaluator)
+       return root
+
+
+   def search_symmetries(self):
+       """
+       Board symmetries the search may treat as equivalent positions:
+       all those of the layout for our own (window-based) evaluation,
+       none for a special eval function we know nothing about.
+       """
+       symmetries = self.current_game_type.get_symmetries()
+       if self.special_eval_fn or self.evaluator is None:
+           return symmetries[:1]
+       return self.evaluator.symmetries()
+
+
+   def children_left(self, state, history, visited):
+       """
+       Children of state never generated after visiting visited of them:
+       lazily generated (with history) or all the empty squares.
+       """
+       total = move_count(state) if history is not None else state.num_empty()
+       return max(total - visited, 0)
+
+
+   def order_children(self, state, moves):
+       """
+       Order moves inside the search, best child first for the side to move,
+       by the children's static values.  Scores all the children in one
+       NumPy call with use_batch_ordering, or when no running-total
+       evaluator is attached; otherwise uses the running total (one
+       make/unmake per child).  Not counted as static evals.
+       """
+       if self.use_batch_ordering and self.batch_evaluator is not None:
+           values = self.batch_evaluator.score_children(state, moves)
+       elif state.evaluator is not None:
+           values = []
+           for move in moves:
+               state.make_move(move)
+               if state.x_wins:
+                   values.append(10000)
+               elif state.o_wins:
+                   values.append(-10000)
+               else:
+                   values.append(state.eval_score)
+               state.unmake_move()
+       elif self.batch_evaluator is not None:
+           values = self.batch_evaluator.score_children(state, moves)
+       else:
+           return moves
+       order = sorted(range(len(moves)), key=lambda i: values[i],
+                      reverse=(state.whose_move == 'X'))
+       return [moves[i] for i in order]
+
+
    def initialize_zobrist_table(self, game_type):
        """
        Initialize Zobrist random numbers for hashing board states.
        Extra Credit B: Creates unique random numbers for each piece at each position.
+       The keys belong to the game type (built once, from a private random
+       number generator), so the global random module is left alone.
        """
-       import random
-       random.seed(42)  # Fixed seed for consistency
-      
-       n_rows = game_type.n
-       n_cols = game_type.m
-      
-       # Create random numbers for X and O at each board position
-       self.zobrist_random_numbers = {}
-       for i in range(n_rows):
-           for j in range(n_cols):
-               self.zobrist_random_numbers[(i, j, 'X')] = random.getrandbits(64)
-               self.zobrist_random_numbers[(i, j, 'O')] = random.getrandbits(64)
+       self.zobrist_random_numbers = game_type.get_zobrist_keys()
 
 
    def compute_zobrist_hash(self, state):
        """
-       Compute Zobrist hash for a given state.
+       Compute Zobrist hash for a given state, including whose move it is.
        Extra Credit B: XOR random numbers for all pieces on board.
+       A BitState keeps its hash up to date as moves are made and unmade,
+       so it costs nothing there; other states are scanned.
        """
-       hash_value = 0
+       if isinstance(state, BitState):
+           return state.hash
+       x_keys, o_keys, side_key = self.zobrist_random_numbers
+       hash_value = side_key if state.whose_move == 'O' else 0
        board = state.board
+       n_cols = len(board[0])
       
        for i in range(len(board)):
-           for j in range(len(board[0])):
+           for j in range(n_cols):
                piece = board[i][j]
-               if piece in ['X', 'O']:
-                   hash_value ^= self.zobrist_random_numbers[(i, j, piece)]
+               if piece == 'X':
+                   hash_value ^= x_keys[i * n_cols + j]
+               elif piece == 'O':
+                   hash_value ^= o_keys[i * n_cols + j]
       
        return hash_value
 
 
-   def lookup_zobrist(self, state, depth_remaining):
+   def lookup_zobrist(self, state, depth_remaining, alpha=None, beta=None):
        """
        Look up a state in the Zobrist hash table.
-       Returns (found, score) where found is True if state was in table.
+       Returns (found, score, move): found is True if the stored entry was
+       searched at least depth_remaining deep and its score (exact, or a
+       bound that falls outside the (alpha, beta) window) settles this node.
+       move is the stored best move, to try first, or None.
        """
-       hash_value = self.compute_zobrist_hash(state)
-      
-       if hash_value in self.zobrist_table:
-           stored_score, stored_depth = self.zobrist_table[hash_value]
-           # Only use cached value if it was computed at equal or greater depth
-           if stored_depth >= depth_remaining:
-               self.zobrist_table_num_hits_this_turn += 1
-               return (True, stored_score)
-      
-       return (False, None)
+       table = self.zobrist_table
+       key, t = self.zobrist_key(state)
+       slot = table.probe(key)
+       if slot < 0:
+           return (False, None, None)
+       move = None
+       if table.moves[slot] != NO_MOVE:
+           sq = table.moves[slot]
+           if t:
+               sq = state.real_square(sq, t)
+           move = divmod(sq, len(state.board[0]))
+       if table.cutoff(slot, depth_remaining, alpha, beta):
+           return (True, table.scores[slot], move)
+       return (False, None, move)
+
+
+   def store_zobrist(self, state, score, depth_remaining, alpha=None, beta=None,
+                     best_move=None):
+       """
+       Store a state evaluation in the Zobrist hash table, with whether
+       it is the exact value or only a bound: a score at or below alpha
+       is an upper bound, one at or above beta a lower bound.
+       """
+       if self.out_of_time:
+           return
+       if alpha is not None and score <= alpha:
+           bound = UPPER
+       elif beta is not None and score >= beta:
+           bound = LOWER
+       else:
+           bound = EXACT
+       key, t = self.zobrist_key(state)
+       move = NO_MOVE
+       if best_move is not None:
+           move = best_move[0] * len(state.board[0]) + best_move[1]
+           if t:
+               move = state.canonical_square(move, t)
+       self.zobrist_table.store(key, depth_remaining, score, bound, move)
 
 
-   def store_zobrist(self, state, score, depth_remaining):
+   def zobrist_key(self, state):
        """
-       Store a state evaluation in the Zobrist hash table.
+       Table key for a state, and the symmetry that maps it to its
+       canonical form (0 for none): a BitState is stored once for all its
+       symmetric images, with moves kept in the canonical frame.
        """
-       hash_value = self.compute_zobrist_hash(state)
-       self.zobrist_table[hash_value] = (score, depth_remaining)
-       self.zobrist_table_num_entries_this_turn += 1
+       if isinstance(state, BitState):
+           return state.canonical_key()
+       return (self.compute_zobrist_hash(state), 0)
+
+
+class WindowEvaluator(IncrementalEvaluator):
+   """
+   Incremental form of OurAgent.static_eval (used once no one has won).
+   Each k-square window scores score_line for X minus score_line for O,
+   which depends only on the window's X and O counts.  Windows through
+   forbidden squares always score 0, so the score is a sum over the
+   lines of non-forbidden squares (Game_Type.get_lines) of the windows
+   inside each line.  Line scores are looked up by the line's base-3
+   code in tables built once per board layout (see pattern_table.py),
+   so a move costs one lookup per line through its square.
+   """
+
+   def __init__(self, game_type, score_line):
+       super().__init__(game_type)
+       k = game_type.k
+       self.k = k
+       # window_scores[x][o] for a window holding x X's and o O's
+       self.window_scores = [[0] * (k + 1) for _ in range(k + 1)]
+       for x in range(k + 1):
+           for o in range(k + 1 - x):
+               empty = k - x - o
+               self.window_scores[x][o] = (score_line(x, o, empty, k)
+                                           - score_line(o, x, empty, k))
+       self.lines, self.lines_through = game_type.get_lines()
+       tables = get_line_tables(game_type, 'kchua220', self.cells_score)
+       self.line_tables = [tables[len(line)] for line in self.lines]
+
+   def cells_score(self, cells):
+       """Sum of the window scores of one line of 0 (empty), 1 (X) or 2 (O) cells."""
+       k = self.k
+       score = 0
+       for start in range(len(cells) - k + 1):
+           window = cells[start:start + k]
+           score += self.window_scores[window.count(1)][window.count(2)]
+       return score
+
+   def full_score(self, state):
+       tables = self.line_tables
+       codes = state.line_codes
+       score = 0
+       for l in range(len(codes)):
+           score += tables[l][codes[l]]
+       return score
+
+   def local_score(self, state, sq):
+       tables = self.line_tables
+       codes = state.line_codes
+       score = 0
+       for l, _ in self.lines_through[sq]:
+           score += tables[l][codes[l]]
+       return score
+
+
+def parallel_helper(game_type):
+   """Build the search run by a ParallelSearch worker process."""
+   agent = OurAgent()
+   agent.prepare(game_type, 'X', 'helper', utterances_matter=False)
+   return agent.search, agent.make_search_root
 
 
 # OPTIONAL THINGS TO KEEP TRACK OF:
@@ -0,0 +1,149 @@
+'''
+mcts_KInARow.py
+Authors: Gupta, Srijan and Chuang, Kevin
+CSE 415, University of Washington
+
+A K-in-a-Row agent that plays by Monte Carlo tree search (see
+src/core/mcts.py) instead of fixed-depth minimax: the longer it thinks,
+and the more processes it is given, the more playouts back its move.
+'''
+
+from src.agents.agent_base import KAgent
+from src.core.game_types import State
+from src.core.mcts import MCTS, MCTSWorkers
+from src.core.search import TimeBudget
+import time
+import random
+
+AUTHORS = 'Gupta, Srijan and Chuang, Kevin'
+UWNETIDS = ['sguptasr', 'kchua220']
+
+class OurAgent(KAgent):
+
+    def __init__(self, twin=False):
+        super().__init__()
+        self.twin = twin
+        self.nickname = 'Monty'
+        if twin: self.nickname = 'Monty-Twin'
+        self.long_name = 'Monte Carlo Monty'
+        if twin: self.long_name = 'Monte Carlo Monty II'
+        self.persona = 'a cheerful gambler who trusts the odds'
+        self.voice_info = {'Chrome': 10, 'Firefox': 2, 'other': 0}
+        self.alpha_beta_cutoffs_this_turn = 0
+        self.num_static_evals_this_turn = 0
+        self.zobrist_table_num_entries_this_turn = 0
+        self.zobrist_table_num_hits_this_turn = 0
+        self.opponent_nickname = None
+        self.time_limit = 1.0
+        self.mcts = None
+        self.parallel_workers = 0 # Extra processes, each growing its own tree.
+        self.workers = None
+        self.last_move_stats = {}
+
+    def introduce(self):
+        intro = '\nHi there! I am Monte Carlo Monty.\n'
+        intro += 'I do not look a fixed number of moves ahead: I play out\n'
+        intro += 'thousands of random games and back the move that wins most often.\n'
+        if self.twin:
+            intro += 'My twin and I play the same odds, but roll different dice.\n'
+        return intro
+
+    def prepare(self, game_type, what_side_to_play, opponent_nickname,
+                expected_time_per_move=0.1, utterances_matter=True):
+        self.current_game_type = game_type
+        self.playing = what_side_to_play
+        self.opponent_nickname = opponent_nickname
+        self.time_limit = expected_time_per_move
+        self.mcts = MCTS(game_type)
+        if self.workers is not None:
+            self.workers.close()
+            self.workers = None
+        if self.parallel_workers > 0:
+            # Started once per game, so no move pays for process start-up.
+            self.workers = MCTSWorkers(game_type, self.parallel_workers)
+        return "OK"
+
+    def make_move(self, current_state, current_remark, time_limit=1000,
+                  use_alpha_beta=True, use_zobrist_hashing=False, max_ply=3,
+                  special_static_eval_fn=None):
+        # The minimax options (alpha-beta, Zobrist hashing, max_ply, a
+        # special static eval) do not apply to tree search; time does.
+        start_time = time.time()
+        deadline = start_time + max(time_limit * TimeBudget.SAFETY - TimeBudget.MARGIN,
+                                    time_limit * 0.5)
+
+        if self.workers is not None:
+            self.workers.start(current_state.board, current_state.whose_move, deadline)
+        self.mcts.set_position(current_state.board, current_state.whose_move)
+        reused = self.mcts.reused_visits
+        self.mcts.search(deadline)
+        visits = self.mcts.root_visits()
+        playouts = self.mcts.playouts
+        if self.workers is not None:
+            playouts += self.workers.collect(visits, deadline)
+        move = self.mcts.best_move(visits)
+        win_rate = self.mcts.win_rate(move)
+        self.mcts.advance(move)
+
+        new_state = State(old=current_state)
+        new_state.board[move[0]][move[1]] = current_state.whose_move
+        new_state.change_turn()
+
+        self.num_static_evals_this_turn = playouts
+        self.last_move_stats = {
+            'time': time.time() - start_time,
+            'iterations': self.mcts.iterations,
+            'playouts': playouts,
+            'reused': reused,
+            'visits': visits.get(move[0] * self.current_game_type.m + move[1], 0),
+            'win_rate': win_rate
+        }
+
+        if current_remark and "tell me how you did that" in current_remark.lower():
+            utterance = self.explain_last_move()
+        else:
+            utterance = self.generate_utterance(win_rate)
+
+        if self.playing_mode == KAgent.AUTOGRADER:
+            stats = [self.alpha_beta_cutoffs_this_turn,
+                     self.num_static_evals_this_turn,
+                     self.zobrist_table_num_entries_this_turn,
+                     self.zobrist_table_num_hits_this_turn]
+            return [[move, new_state] + stats, utterance]
+        return [[move, new_state], utterance]
+
+    def generate_utterance(self, win_rate):
+        if win_rate is None:
+            return "No time to roll the dice, so I'll go with my gut."
+        percent = int(round(win_rate * 100))
+        if win_rate > 0.9:
+            lines = [f"The dice say {percent}%. I like those odds a lot!",
+                     "I can almost hear the jackpot.",
+                     f"{self.opponent_nickname}, the odds are not in your favour."]
+        elif win_rate > 0.6:
+            lines = [f"About {percent}% of my playouts win from here.",
+                     "The odds are leaning my way.",
+                     "Let's see if luck follows the numbers."]
+        elif win_rate > 0.4:
+            lines = [f"A {percent}% shot: this one could go either way.",
+                     "Even money. Just how I like it.",
+                     "Roll the dice and see!"]
+        else:
+            lines = [f"Only {percent}%... time for a comeback.",
+                     "The numbers look grim, but the house doesn't always win.",
+                     "I've beaten worse odds than these."]
+        return random.choice(lines)
+
+    def explain_last_move(self):
+        stats = self.last_move_stats
+        explanation = "Happy to share my secrets!\n"
+        explanation += f"- I ran {stats.get('iterations', 0)} tree-search iterations "
+        explanation += f"and {stats.get('playouts', 0)} random playouts in {stats.get('time', 0):.3f} seconds\n"
+        explanation += f"- My move was visited {stats.get('visits', 0)} times\n"
+        if stats.get('reused'):
+            explanation += f"- {stats['reused']} playouts from this position were already in my tree, "
+            explanation += "since it carries over from move to move\n"
+        if stats.get('win_rate') is not None:
+            explanation += f"- The move I chose won {stats['win_rate']:.0%} of its playouts\n"
+        explanation += "- I picked the move my search visited most, the one the odds trusted most."
+        return explanation
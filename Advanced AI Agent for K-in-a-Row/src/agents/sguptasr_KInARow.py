@@ -5,7 +5,20 @@ CSE 415, University of Washington
 '''
 
 from src.agents.agent_base import KAgent
-from src.core.game_types import State, Game_Type
+from src.core.game_types import Game_Type
+from src.core.bitboard import BitState
+from src.core.incremental_eval import IncrementalEvaluator
+from src.core.pattern_table import get_line_tables
+from src.core import batch_eval
+from src.core.move_gen import lazy_moves, move_count, CutoffHistory
+from src.core.search import Search, TimeBudget, WIN_SCORE
+from src.core.threat_space import ThreatSpaceSearch
+from src.core.proof_number import ProofNumberSearch, WIN, DRAW
+from src.core.parallel import ParallelSearch
+from src.core.opening_book import OpeningBook, book_path
+from src.core.retrograde import PerfectPlayTable, table_path
+from src.core.ponder import Ponderer
+from src.core.transposition import TranspositionTable
 import time
 import random
 
@@ -38,6 +51,43 @@ class OurAgent(KAgent):
         self.time_limit = 1.0
         self.last_move_time = 0
         self.last_move_stats = {}
+        self.nodes_this_turn = 0
+        self.children_skipped_this_turn = 0
+        self.re_searches_this_turn = 0
+        self.use_incremental_eval = True
+        self.evaluator = None
+        self.batch_evaluator = None
+        self.use_batch_ordering = False # Score children with NumPy (see src/core/batch_eval.py)
+        self.use_iterative_deepening = True
+        self.use_pvs_search = True # PVS, aspiration windows and late-move reductions
+        self.use_candidate_moves = True # Quiet moves only near the stones
+        self.search = None
+        self.time_budget = None
+        self.transposition_table = None
+        self.cutoff_history = None
+        self.depth_reached_this_turn = 0
+        self.use_threat_search = True
+        self.threat_time_share = 0.1 # Of each move's time limit.
+        self.threat_search = None
+        self.threat_line_this_turn = None
+        self.threat_proof_this_turn = False
+        self.use_endgame_solver = True
+        self.endgame_empty_squares = 12 # Solve outright once this few are left.
+        self.endgame_time_share = 0.3
+        self.endgame_solver = None
+        self.proof_this_turn = None
+        self.parallel_workers = 0 # Extra processes to share the search with.
+        self.parallel_search = None
+        self.use_opening_book = True # Built offline by src/core/opening_book.py
+        self.opening_book = None
+        self.book_depth_this_turn = 0
+        self.use_perfect_play = True # Tables built offline by src/core/retrograde.py
+        self.perfect_play = None
+        self.perfect_play_this_turn = None
+        self.use_pondering = False # Search on the opponent's time (see src/core/ponder.py)
+        self.ponderer = None
+        self.ponder_this_turn = None
+        self.last_pv = []
 
     def introduce(self):
         intro = '\nGreetings! I am the Strategic Sage.\n'
@@ -59,6 +109,29 @@ class OurAgent(KAgent):
         self.opponent_past_utterances = []
         self.game_history = []
         self.utt_count = 0
+        self.evaluator = SageEvaluator(game_type)
+        if batch_eval.AVAILABLE:
+            self.batch_evaluator = batch_eval.OpenSequenceBatch(game_type, self.evaluator.weights)
+        self.transposition_table = TranspositionTable()
+        self.cutoff_history = CutoffHistory(game_type.n * game_type.m)
+        self.search = Search(lambda state: self.static_eval(state, game_type),
+                             lambda state, moves: self.order_moves(state, moves, self.static_eval),
+                             self.transposition_table, self.cutoff_history)
+        self.search.aspiration_window = 200 # Sequence weights run from 40 to 800.
+        self.time_budget = TimeBudget(game_type)
+        self.threat_search = ThreatSpaceSearch()
+        self.endgame_solver = ProofNumberSearch()
+        self.opening_book = OpeningBook.load(book_path('sguptasr', game_type), game_type)
+        self.perfect_play = PerfectPlayTable.load(table_path(game_type), game_type)
+        if self.ponderer is not None:
+            self.ponderer.stop()
+        self.ponderer = Ponderer(self.search) if self.use_pondering else None
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+            self.parallel_search = None
+        if self.parallel_workers > 0:
+            # Started once per game, so no move pays for process start-up.
+            self.parallel_search = ParallelSearch(parallel_helper, game_type, self.parallel_workers)
 
         if self.twin:
             self.utt_count = 3
@@ -72,107 +145,253 @@ class OurAgent(KAgent):
         self.num_static_evals_this_turn = 0
         self.zobrist_table_num_entries_this_turn = 0
         self.zobrist_table_num_hits_this_turn = 0
+        self.nodes_this_turn = 0
+        self.children_skipped_this_turn = 0
+        self.re_searches_this_turn = 0
+        self.depth_reached_this_turn = 0
+        self.threat_line_this_turn = None
+        self.threat_proof_this_turn = False
+        self.proof_this_turn = None
+        self.book_depth_this_turn = 0
+        self.perfect_play_this_turn = None
+        self.ponder_this_turn = None
+        self.last_pv = []
 
         start_time = time.time()
+        if self.ponderer is not None:
+            self.ponderer.stop() # Before anything touches the search's tables.
+        if self.cutoff_history is not None:
+            self.cutoff_history.new_turn()
 
         if current_remark and current_remark.strip():
             self.opponent_past_utterances.append(current_remark)
 
-        possible_moves = self.get_successors_and_moves(current_state)
+        root = BitState(self.current_game_type, current_state,
+                        self.search_symmetries(special_static_eval_fn))
+        moves = root.legal_moves()
 
-        if not possible_moves or len(possible_moves[0]) == 0:
+        if len(moves) == 0:
             return [[None, current_state], "I have no legal moves!"]
 
-        states, moves = possible_moves
-
         if special_static_eval_fn:
             eval_fn = lambda state, game_type=None: special_static_eval_fn(state)
         else:
             eval_fn = self.static_eval
+            if self.use_incremental_eval and self.evaluator:
+                root.attach_evaluator(self.evaluator)
+        pondered = None
+        if self.ponderer is not None:
+            pondered = self.ponderer.finish(root)
+            self.ponder_this_turn = self.ponderer.outcome
+
+        threat = proof = book = perfect = None
+        if not special_static_eval_fn and self.playing_mode != KAgent.AUTOGRADER:
+            self.time_budget.open(root, time_limit)
+            if self.use_perfect_play and self.perfect_play is not None:
+                perfect = self.perfect_play.lookup(current_state)
+                if perfect is not None and perfect[0] is None:
+                    perfect = None
+            if perfect is None and self.use_opening_book and self.opening_book is not None:
+                book = self.opening_book.lookup(root)
+            if perfect is None and book is None and self.use_threat_search:
+                threat = self.find_threat_win(root, start_time, time_limit)
+            if perfect is None and book is None and (threat is None or not threat.proof) \
+                    and self.use_endgame_solver and root.num_empty() <= self.endgame_empty_squares:
+                proof = self.solve_endgame(root, start_time, time_limit)
+
+        if perfect is not None:
+            best_move, best_score = self.play_perfectly(perfect, root.whose_move)
+        elif book is not None:
+            best_move, best_score, self.book_depth_this_turn = book
+        elif threat is not None and threat.proof:
+            best_move, best_score = threat.move, threat.score(root.whose_move)
+        elif proof is not None:
+            best_move, best_score = proof.move, proof.score(root.whose_move)
+        elif self.use_iterative_deepening and use_alpha_beta and not special_static_eval_fn \
+                and self.playing_mode != KAgent.AUTOGRADER:
+            attack = threat.line if threat is not None else None # An attack with threes: try it first.
+            best_move, best_score = self.search_iteratively(root, start_time, time_limit,
+                                                            pondered, attack)
+        else:
+            best_move, best_score = self.search_fixed_depth(root, moves, start_time, time_limit,
+                                                            use_alpha_beta, max_ply, eval_fn)
 
-        if use_alpha_beta and not special_static_eval_fn:
-            state_evals = []
-            for i, state in enumerate(states):
-                eval_score = eval_fn(state, self.current_game_type)
-                state_evals.append((eval_score, i))
+        root.make_move(best_move)
+        best_state = root.to_state()
+
+        self.last_move_time = time.time() - start_time
+        self.last_move_stats = {
+            'score': best_score,
+            'time': self.last_move_time,
+            'cutoffs': self.alpha_beta_cutoffs_this_turn,
+            'static_evals': self.num_static_evals_this_turn,
+            'zobrist_entries': self.zobrist_table_num_entries_this_turn,
+            'zobrist_hits': self.zobrist_table_num_hits_this_turn,
+            'nodes': self.nodes_this_turn,
+            'children_skipped': self.children_skipped_this_turn,
+            're_searches': self.re_searches_this_turn,
+            'depth': self.depth_reached_this_turn,
+            'threat_line': self.threat_line_this_turn,
+            'threat_proof': self.threat_proof_this_turn,
+            'proof': self.proof_this_turn,
+            'book_depth': self.book_depth_this_turn,
+            'perfect_play': self.perfect_play_this_turn,
+            'ponder': self.ponder_this_turn
+        }
+        if self.time_budget is not None:
+            self.time_budget.spend(self.last_move_time)
 
-            is_maximizing = (current_state.whose_move == 'X')
-            state_evals.sort(reverse=is_maximizing)
+        self.game_history.append({
+            'state': current_state,
+            'move': best_move,
+            'new_state': best_state,
+            'opponent_remark': current_remark
+        })
 
-            sorted_indices = [idx for _, idx in state_evals]
-            states = [states[i] for i in sorted_indices]
-            moves = [moves[i] for i in sorted_indices]
+        utterance = self.generate_utterance(current_state, best_state, best_move, current_remark)
+        self.my_past_utterances.append(utterance)
+
+        if self.ponderer is not None and len(self.last_pv) > 1 and root.winner() is None:
+            # Think about the reply we expect while the opponent makes theirs.
+            self.ponderer.start(root, self.last_pv[1], self.time_budget.turns_left(root))
+
+        if self.playing_mode == KAgent.AUTOGRADER:
+            stats = [self.alpha_beta_cutoffs_this_turn,
+                    self.num_static_evals_this_turn,
+                    self.zobrist_table_num_entries_this_turn,
+                    self.zobrist_table_num_hits_this_turn]
+            return [[best_move, best_state] + stats, utterance]
+        else:
+            return [[best_move, best_state], utterance]
+
+    def search_fixed_depth(self, root, moves, start_time, time_limit,
+                           use_alpha_beta, max_ply, eval_fn):
+        """Search every root move to max_ply; return (best move, its score)."""
+        if use_alpha_beta and eval_fn == self.static_eval:
+            moves = self.order_moves(root, moves, eval_fn)
 
         best_move = None
-        best_state = None
-        best_score = float('-inf') if current_state.whose_move == 'X' else float('inf')
+        best_score = float('-inf') if root.whose_move == 'X' else float('inf')
 
         alpha = float('-inf')
         beta = float('inf')
 
-        for i, (state, move) in enumerate(zip(states, moves)):
+        for move in moves:
             if time.time() - start_time > time_limit * 0.9:
                 break
 
+            root.make_move(move)
+            self.nodes_this_turn += 1
             if use_alpha_beta:
-                score = self.minimax(state, max_ply - 1, True,
+                score = self.minimax(root, max_ply - 1, True,
                                    alpha, beta, eval_fn)[0]
             else:
-                score = self.minimax(state, max_ply - 1, False,
+                score = self.minimax(root, max_ply - 1, False,
                                    None, None, eval_fn)[0]
+            root.unmake_move()
 
-            if current_state.whose_move == 'X':
+            if root.whose_move == 'X':
                 if score > best_score:
                     best_score = score
                     best_move = move
-                    best_state = state
                 if use_alpha_beta:
                     alpha = max(alpha, score)
             else:
                 if score < best_score:
                     best_score = score
                     best_move = move
-                    best_state = state
                 if use_alpha_beta:
                     beta = min(beta, score)
 
         if best_move is None:
             best_move = moves[0]
-            best_state = states[0]
-
-        self.last_move_time = time.time() - start_time
-        self.last_move_stats = {
-            'score': best_score,
-            'time': self.last_move_time,
-            'cutoffs': self.alpha_beta_cutoffs_this_turn,
-            'static_evals': self.num_static_evals_this_turn,
-            'zobrist_entries': self.zobrist_table_num_entries_this_turn,
-            'zobrist_hits': self.zobrist_table_num_hits_this_turn
-        }
-
-        self.game_history.append({
-            'state': current_state,
-            'move': best_move,
-            'new_state': best_state,
-            'opponent_remark': current_remark
-        })
-
-        utterance = self.generate_utterance(current_state, best_state, best_move, current_remark)
-        self.my_past_utterances.append(utterance)
-
-        if self.playing_mode == KAgent.AUTOGRADER:
-            stats = [self.alpha_beta_cutoffs_this_turn,
-                    self.num_static_evals_this_turn,
-                    self.zobrist_table_num_entries_this_turn,
-                    self.zobrist_table_num_hits_this_turn]
-            return [[best_move, best_state] + stats, utterance]
+        return best_move, best_score
+
+    def search_iteratively(self, root, start_time, time_limit, pondered=None, first_line=None):
+        """Deepen one ply at a time until this move's share of the time is used.
+
+        pondered is the result of pondering this very position, played
+        at once if it is a proof or searched at least as long as this
+        move would.  first_line is a line to search first, or None.
+        """
+        soft_deadline, hard_deadline = self.time_budget.plan(root, start_time, time_limit)
+        if self.ponderer is not None and self.ponderer.settles(pondered, soft_deadline - start_time):
+            self.ponder_this_turn = 'used'
+            self.depth_reached_this_turn = pondered.depth
+            self.last_pv = pondered.pv
+            return pondered.move, pondered.score
+        self.search.reset_stats()
+        self.search.pvs = self.search.aspiration = self.search.reductions = self.use_pvs_search
+        self.search.near_only = self.use_candidate_moves
+        self.transposition_table.new_search()
+        turns_left = self.time_budget.turns_left(root)
+        if self.parallel_search is not None:
+            result = self.parallel_search.search(self.search, root, hard_deadline,
+                                                 soft_deadline, turns_left, first_line)
+            helpers = self.parallel_search.helper_stats
         else:
-            return [[best_move, best_state], utterance]
+            result = self.search.iterative_deepening(root, hard_deadline, soft_deadline,
+                                                     turns_left=turns_left, first_line=first_line)
+            helpers = {}
+        self.alpha_beta_cutoffs_this_turn = self.search.cutoffs + helpers.get('cutoffs', 0)
+        self.num_static_evals_this_turn = self.search.static_evals + helpers.get('static_evals', 0)
+        self.nodes_this_turn = self.search.nodes + helpers.get('nodes', 0)
+        self.children_skipped_this_turn = self.search.children_skipped + helpers.get('children_skipped', 0)
+        self.re_searches_this_turn = self.search.re_searches + helpers.get('re_searches', 0)
+        self.zobrist_table_num_entries_this_turn = self.transposition_table.stores + helpers.get('table_stores', 0)
+        self.zobrist_table_num_hits_this_turn = self.transposition_table.hits + helpers.get('table_hits', 0)
+        self.depth_reached_this_turn = result.depth
+        self.last_pv = result.pv
+        return result.move, result.score
+
+    def find_threat_win(self, root, start_time, time_limit):
+        """Look for a win made only of threats, before searching full width.
+
+        Only a win made of fours is a proof; one that needs threes is an
+        attack for the search to try first.
+        """
+        deadline = start_time + time_limit * self.threat_time_share
+        result = self.threat_search.find_win(root, deadline,
+                                             turns_left=self.time_budget.turns_left(root))
+        if result is not None:
+            self.nodes_this_turn = self.threat_search.nodes
+            self.threat_line_this_turn = result.line
+            self.threat_proof_this_turn = result.proof
+        return result
+
+    def solve_endgame(self, root, start_time, time_limit):
+        """Try to prove a win or a draw outright; return the ProofResult if one is found."""
+        deadline = start_time + time_limit * self.endgame_time_share
+        result = self.endgame_solver.solve(root, self.time_budget.turns_left(root), deadline)
+        if result.outcome in (WIN, DRAW) and result.move is not None:
+            self.nodes_this_turn = result.nodes
+            self.proof_this_turn = result.outcome
+            return result
+        return None
+
+    def play_perfectly(self, perfect, player):
+        """Turn a perfect-play table entry into (best move, its score)."""
+        move, outcome, plies = perfect
+        self.perfect_play_this_turn = f"{outcome} in {plies} {'ply' if plies == 1 else 'plies'}" if plies else outcome
+        score = {WIN: WIN_SCORE - plies, DRAW: 0}.get(outcome, plies - WIN_SCORE)
+        return move, score if player == 'X' else -score
+
+    def make_search_root(self, state):
+        """Return the BitState the iterative-deepening search runs on for state."""
+        root = BitState(self.current_game_type, state, self.search_symmetries(None))
+        if self.use_incremental_eval and self.evaluator:
+            root.attach_evaluator(self.evaluator)
+        return root
 
     def minimax(self, state, depth_remaining, pruning=False,
                 alpha=None, beta=None, eval_fn=None, current_depth=0):
         if eval_fn is None:
             eval_fn = self.static_eval
+        if not isinstance(state, BitState):
+            state = BitState(self.current_game_type, state,
+                             self.search_symmetries(eval_fn != self.static_eval))
+            if self.use_incremental_eval and self.evaluator and eval_fn == self.static_eval:
+                state.attach_evaluator(self.evaluator)
 
         # Check if terminal (win/loss/draw)
         if self.is_terminal(state):
@@ -195,42 +414,112 @@ class OurAgent(KAgent):
             return [score]
         # For small boards, continue searching regardless of depth_remaining
 
-        successors, moves = self.get_successors_and_moves(state)
-
-        if not successors or len(successors) == 0:
+        if state.is_full():
             score = eval_fn(state, self.current_game_type)
             self.num_static_evals_this_turn += 1
             return [score]
 
+        history = None
+        if pruning and eval_fn == self.static_eval:
+            # Threats first, then killer moves, then the rest; children are
+            # visited one at a time, so a cutoff skips generating and
+            # ordering the others.
+            history = self.cutoff_history
+            order_rest = None
+            killers = ()
+            if depth_remaining >= 2 or is_small_board:
+                order_rest = lambda st, ms: self.order_moves(st, ms, eval_fn)
+            if history is not None:
+                killers = history.killer_moves(current_depth)
+                if order_rest is None:
+                    order_rest = history.order
+            moves = lazy_moves(state, None, order_rest, killers)
+        else:
+            moves = state.legal_moves()
+        visited = 0
+
         is_maximizing = (state.whose_move == 'X')
 
         if is_maximizing:
             max_eval = float('-inf')
-            for successor in successors:
-                eval = self.minimax(successor, depth_remaining - 1, pruning,
+            for move in moves:
+                state.make_move(move)
+                visited += 1
+                eval = self.minimax(state, depth_remaining - 1, pruning,
                                   alpha, beta, eval_fn, current_depth + 1)[0]
+                state.unmake_move()
                 max_eval = max(max_eval, eval)
 
                 if pruning and alpha is not None:
                     alpha = max(alpha, eval)
                     if beta is not None and beta <= alpha:
                         self.alpha_beta_cutoffs_this_turn += 1
+                        self.children_skipped_this_turn += self.children_left(state, history, visited)
+                        if history is not None:
+                            history.record_cutoff(state, move, depth_remaining, current_depth)
                         break
+            self.nodes_this_turn += visited
             return [max_eval]
         else:
             min_eval = float('inf')
-            for successor in successors:
-                eval = self.minimax(successor, depth_remaining - 1, pruning,
+            for move in moves:
+                state.make_move(move)
+                visited += 1
+                eval = self.minimax(state, depth_remaining - 1, pruning,
                                   alpha, beta, eval_fn, current_depth + 1)[0]
+                state.unmake_move()
                 min_eval = min(min_eval, eval)
 
                 if pruning and beta is not None:
                     beta = min(beta, eval)
                     if alpha is not None and beta <= alpha:
                         self.alpha_beta_cutoffs_this_turn += 1
+                        self.children_skipped_this_turn += self.children_left(state, history, visited)
+                        if history is not None:
+                            history.record_cutoff(state, move, depth_remaining, current_depth)
                         break
+            self.nodes_this_turn += visited
             return [min_eval]
 
+    def children_left(self, state, history, visited):
+        """Children of state never generated after visiting visited of
+        them: lazily generated (with history) or all the empty squares."""
+        total = move_count(state) if history is not None else state.num_empty()
+        return max(total - visited, 0)
+
+    def search_symmetries(self, special_eval):
+        """Symmetries the search may treat as equivalent: those that leave
+        the static evaluation unchanged, and none for an outside eval fn."""
+        symmetries = self.current_game_type.get_symmetries()
+        if special_eval or self.evaluator is None:
+            return symmetries[:1]
+        return self.evaluator.symmetries()
+
+    def order_moves(self, state, moves, eval_fn):
+        """Sort moves best-first for the side to move, by the static value of each child.
+
+        With use_batch_ordering, or with no running-total evaluator
+        attached, all children are scored at once by the NumPy batch
+        evaluator when it is available; otherwise each child costs one
+        make/unmake.
+        """
+        if self.batch_evaluator is not None and eval_fn == self.static_eval \
+                and (self.use_batch_ordering or state.evaluator is None):
+            values = self.batch_evaluator.score_children(state, moves)
+            move_evals = [(int(values[i]), i) for i in range(len(moves))]
+        else:
+            move_evals = []
+            for i, move in enumerate(moves):
+                state.make_move(move)
+                eval_score = eval_fn(state, self.current_game_type)
+                state.unmake_move()
+                move_evals.append((eval_score, i))
+
+        is_maximizing = (state.whose_move == 'X')
+        move_evals.sort(reverse=is_maximizing)
+
+        return [moves[i] for _, i in move_evals]
+
     def static_eval(self, state, game_type=None):
         """Evaluate state from X's perspective (higher is better for X)."""
         if game_type is None:
@@ -239,13 +528,33 @@ class OurAgent(KAgent):
         if game_type is None:
             return 0
 
+        if not isinstance(state, BitState) and self.evaluator is not None \
+                and self.evaluator.game_type is game_type:
+            # Score a plain State by table lookups too.
+            state = BitState(game_type, state)
+            state.attach_evaluator(self.evaluator)
+
+        if isinstance(state, BitState) and state.evaluator is not None \
+                and state.evaluator.game_type is game_type:
+            # Same score, kept as a running total by SageEvaluator.
+            if state.x_wins:
+                return 10000
+            if state.o_wins:
+                return -10000
+            return state.eval_score
+
         board = state.board
         k = game_type.k
         n = game_type.n
         m = game_type.m
 
-        x_win_score = self.check_win(board, 'X', k, n, m)
-        o_win_score = self.check_win(board, 'O', k, n, m)
+        if isinstance(state, BitState):
+            # Window counts are kept up to date on every move.
+            x_win_score = state.x_wins
+            o_win_score = state.o_wins
+        else:
+            x_win_score = self.check_win(board, 'X', k, n, m)
+            o_win_score = self.check_win(board, 'O', k, n, m)
 
         if x_win_score > 0:
             return 10000
@@ -334,6 +643,9 @@ class OurAgent(KAgent):
         if state.finished:
             return True
 
+        if isinstance(state, BitState):
+            return state.winner() is not None or state.is_full()
+
         # Check if someone has won
         if self.current_game_type:
             k = self.current_game_type.k
@@ -353,26 +665,6 @@ class OurAgent(KAgent):
                     return False
         return True
 
-    def get_successors_and_moves(self, state):
-        """Generate all legal successor states and moves."""
-        moves = []
-        new_states = []
-        board = state.board
-        n = len(board)
-        m = len(board[0])
-        other_player = 'O' if state.whose_move == 'X' else 'X'
-
-        for i in range(n):
-            for j in range(m):
-                if board[i][j] == ' ':
-                    new_state = State(old=state)
-                    new_state.board[i][j] = state.whose_move
-                    new_state.whose_move = other_player
-                    moves.append((i, j))
-                    new_states.append(new_state)
-
-        return [new_states, moves]
-
     def generate_utterance(self, old_state, new_state, move, opponent_remark):
         """Generate contextual utterances based on game state."""
         if opponent_remark:
@@ -426,6 +718,26 @@ class OurAgent(KAgent):
         explanation += f"- Time spent: {stats.get('time', 0):.4f} seconds\n"
         explanation += f"- States evaluated statically: {stats.get('static_evals', 0)}\n"
         explanation += f"- Alpha-beta cutoffs: {stats.get('cutoffs', 0)}\n"
+        explanation += f"- Positions visited: {stats.get('nodes', 0)}, "
+        explanation += f"children never generated thanks to cutoffs: {stats.get('children_skipped', 0)}\n"
+        if stats.get('depth'):
+            explanation += f"- Searched {stats['depth']} plies deep by iterative deepening\n"
+        if stats.get('re_searches'):
+            explanation += f"- Re-searched {stats['re_searches']} times where a narrow window or a reduction proved too tight\n"
+        if stats.get('threat_line') and stats.get('threat_proof'):
+            explanation += f"- Found a forced win by continuous fours: {stats['threat_line']}\n"
+        elif stats.get('threat_line'):
+            explanation += f"- Found an attack of fours and threes, not a proof, so searched it first: {stats['threat_line']}\n"
+        if stats.get('proof'):
+            explanation += f"- Proved the position a {stats['proof']} by proof-number search\n"
+        if stats.get('perfect_play'):
+            explanation += f"- Looked the position up in my perfect-play table: a {stats['perfect_play']}\n"
+        if stats.get('ponder') == 'used':
+            explanation += "- Had already thought this through on your time, as I predicted your move\n"
+        elif stats.get('ponder') == 'hit':
+            explanation += "- Predicted your move, and my thinking on your time sped up this search\n"
+        if stats.get('book_depth'):
+            explanation += f"- Played from my opening book, searched {stats['book_depth']} plies deep offline\n"
 
         if stats.get('cutoffs', 0) > 0:
             explanation += f"The cutoffs saved significant computation by pruning {stats.get('cutoffs', 0)} branches.\n"
@@ -463,3 +775,88 @@ class OurAgent(KAgent):
             analysis += "The game is quite balanced at this point. Victory will depend on who makes the next critical mistake."
 
         return analysis
+
+
+class SageEvaluator(IncrementalEvaluator):
+    """Incremental form of OurAgent.static_eval (used once no one has won).
+
+    Every sequence counted by count_sequences lies inside one line of
+    non-forbidden squares (Game_Type.get_lines), with its open ends on
+    the same line, so the score is a sum over lines plus the center bonus.
+    A move only changes the lines through its square.
+
+    Line scores are looked up by the line's base-3 code in tables built
+    once per board layout (see pattern_table.py), so prepare() pays for
+    them and every later game of the same type reuses them.
+    """
+
+    def __init__(self, game_type):
+        super().__init__(game_type)
+        self.k = game_type.k
+        self.lines, self.lines_through = game_type.get_lines()
+        self.center = (game_type.n // 2) * game_type.m + game_type.m // 2
+        self.weights = {}
+        for length in range(2, self.k + 1):
+            weight = (length ** 2) * 10
+            if length == self.k - 1:
+                weight *= 5
+            self.weights[length] = weight
+        tables = get_line_tables(game_type, 'sguptasr', self.cells_score)
+        self.line_tables = [tables[len(line)] for line in self.lines]
+
+    def full_score(self, state):
+        tables = self.line_tables
+        codes = state.line_codes
+        score = 0
+        for l in range(len(codes)):
+            score += tables[l][codes[l]]
+        return score + self.center_score(state)
+
+    def local_score(self, state, sq):
+        tables = self.line_tables
+        codes = state.line_codes
+        score = 0
+        for l, _ in self.lines_through[sq]:
+            score += tables[l][codes[l]]
+        if sq == self.center:
+            score += self.center_score(state)
+        return score
+
+    def symmetries(self):
+        """Only symmetries keeping the center bonus square in place (or a
+        forbidden center, which never gets the bonus)."""
+        c = self.center
+        board = self.game_type.initial_state.board
+        if board[c // self.game_type.m][c % self.game_type.m] == '-':
+            return self.game_type.get_symmetries()
+        return [perm for perm in self.game_type.get_symmetries() if perm[c] == c]
+
+    def center_score(self, state):
+        if state.x_bits >> self.center & 1:
+            return 5
+        if state.o_bits >> self.center & 1:
+            return -5
+        return 0
+
+    def cells_score(self, cells):
+        """Score one line; cells holds 0 (empty), 1 (X) or 2 (O) per square."""
+        score = 0
+        size = len(cells)
+        for length in range(2, self.k + 1):
+            weight = self.weights[length]
+            for start in range(size - length + 1):
+                player = cells[start]
+                if player == 0:
+                    continue
+                if any(cells[t] != player for t in range(start + 1, start + length)):
+                    continue
+                end = start + length
+                if (end < size and cells[end] == 0) or (start > 0 and cells[start - 1] == 0):
+                    score += weight if player == 1 else -weight
+        return score
+
+def parallel_helper(game_type):
+    """Build the search run by a ParallelSearch worker process."""
+    agent = OurAgent()
+    agent.prepare(game_type, 'X', 'helper', utterances_matter=False)
+    return agent.search, agent.make_search_root
@@ -10,12 +10,14 @@
 '''
 
 from time import sleep
+import contextlib
+import io
+import time
 USE_HTML = True
-if USE_HTML: from src.utils import gameToHTML
-
-from src.core.winTesterForK import winTesterForK
 
+from src.core.events import EventStream, ConsoleSink, HTMLSink, GameStart, MoveMade, Utterance, GameResult
 from src.core.game_types import TTT, FIAR, Cassini, State, Game_Type
+from src.core.session import GameSession
 
 TIME_PER_MOVE = 1.0 # In seconds
 INITIAL_STATE = TTT.initial_state
@@ -44,115 +46,72 @@ def set_players(px, po):
     PLAYERX = px
     PLAYERO = po
 
+# Run each agent in a process of its own, held to TIME_PER_MOVE (see isolation.py):
+ISOLATE_AGENTS = False
+ON_TIMEOUT = 'forfeit' # Or 'default': a late agent gets a random move instead.
+def set_isolation(isolate, on_timeout='forfeit'):
+    global ISOLATE_AGENTS, ON_TIMEOUT
+    ISOLATE_AGENTS = isolate
+    ON_TIMEOUT = on_timeout
+
+# Quiet mode: games are played with no rendering at all (see events.py).
+QUIET = False
+CONSOLE_BATCH = 1 # Events the console shows at a time (1 shows each move as it is made).
+def set_quiet(quiet):
+    global QUIET
+    QUIET = quiet
+
+def event_sinks():
+    """The sinks runGame reports to, unless it is given its own."""
+    if QUIET: return []
+    sinks = [ConsoleSink(batch=CONSOLE_BATCH)]
+    if USE_HTML: sinks.append(HTMLSink())
+    return sinks
+
 FINISHED = False
-def runGame():
-    currentState = INITIAL_STATE
+def runGame(sinks=None):
     player1 = PLAYERX
     player2 = PLAYERO
-
-    if USE_HTML:
-        gameToHTML.startHTML(player1.nickname, player2.nickname, GAME_TYPE.short_name, 1)
-
-    # Prepare players silently (suppress output)
-    import sys
-    import io
-    old_stdout = sys.stdout
-    sys.stdout = io.StringIO()
-
-    try:
-        p1comment = player1.prepare(GAME_TYPE, 'X', player2.nickname)
-    except Exception as e:
-        sys.stdout = old_stdout
-        report = 'Player 1 ('+player1.nickname+' failed to prepare, and loses by default.'
-        renderCommentary(report)
-        if USE_HTML: gameToHTML.reportResult(report)
-        report = 'Congratulations to Player 2 ('+player2.nickname+')!'
-        renderCommentary(report)
-        if USE_HTML: gameToHTML.reportResult(report)
-        if USE_HTML: gameToHTML.endHTML()
-        return
+    isolated = []
+    if ISOLATE_AGENTS:
+        from src.core.isolation import IsolatedAgent
+        # A human player stays here, at the keyboard.
+        if not isinstance(player1, HumanPlayer): player1 = IsolatedAgent(player1, ON_TIMEOUT)
+        if not isinstance(player2, HumanPlayer): player2 = IsolatedAgent(player2, ON_TIMEOUT)
+        isolated = [p for p in (player1, player2) if isinstance(p, IsolatedAgent)]
     try:
-        p2comment = player2.prepare(GAME_TYPE, 'O', player1.nickname)
-    except Exception as e:
-        sys.stdout = old_stdout
-        report = 'Player 2 ('+player2.nickname+' failed to prepare, and loses by default.'
-        renderCommentary(report)
-        if USE_HTML: gameToHTML.reportResult(report)
-        report = 'Congratulations to Player 1 ('+player1.nickname+')!'
-        renderCommentary(report)
-        if USE_HTML: gameToHTML.reportResult(report)
-        if USE_HTML: gameToHTML.endHTML()
-        return
-
-    # Restore stdout
-    sys.stdout = old_stdout
-
-    currentRemark = "The game is starting."
-    if USE_HTML: gameToHTML.stateToHTML(currentState)
-    XsTurn = True
-    name = None
+        return playGame(player1, player2, sinks)
+    finally:
+        for player in isolated:
+            player.stop() # Their processes go with the game.
+
+def playGame(player1, player2, sinks):
+    events = EventStream(event_sinks() if sinks is None else sinks)
+    session = GameSession(GAME_TYPE, player1, player2, TIME_PER_MOVE)
     global FINISHED
     FINISHED = False
-    turnCount = 0
-    printState(currentState)
-    while not FINISHED:
-        who = currentState.whose_move
-        if XsTurn:
-            playerResult = player1.make_move(currentState, currentRemark, TIME_PER_MOVE)
-            name = player1.nickname
-            XsTurn = False
-        else:
-            playerResult = player2.make_move(currentState, currentRemark, TIME_PER_MOVE)
-            name = player2.nickname
-            XsTurn = True
-        moveAndState, currentRemark = playerResult
-        if moveAndState==None:
-            FINISHED = True; continue
-        move, currentState = moveAndState
-        moveReport = "Move is by "+who+" to "+str(move)
-        renderCommentary(moveReport)
-        utteranceReport = name +' says: '+currentRemark
-        renderCommentary(utteranceReport)
-        if USE_HTML: gameToHTML.reportResult(moveReport)
-        if USE_HTML: gameToHTML.reportResult(utteranceReport)
-        possibleWin = winTesterForK(currentState, move, K)
-        if possibleWin != "No win":
-            FINISHED = True
-            currentState.finished = True
-            printState(currentState)
-            if USE_HTML: gameToHTML.stateToHTML(currentState, finished=True)
-            renderCommentary(possibleWin)
-            if USE_HTML: gameToHTML.reportResult(possibleWin)
-            if USE_HTML: gameToHTML.endHTML()
-            return
-        printState(currentState)
-        if USE_HTML: gameToHTML.stateToHTML(currentState)
-        turnCount += 1
-        if turnCount == TURN_LIMIT: FINISHED=True
-        else:
+
+    # Prepare players silently (suppress output)
+    with contextlib.redirect_stdout(io.StringIO()):
+        prepared = session.prepare()
+    events.emit(GameStart(GAME_TYPE, player1.nickname, player2.nickname, session.state))
+
+    while prepared and not session.finished:
+        who = session.to_move
+        name = session.nickname(who)
+        start = time.time()
+        move = session.agent_move() # None if the player forfeited.
+        if move is None: break
+        events.emit(MoveMade(who, name, move, session.state, session.turn_count, time.time() - start))
+        events.emit(Utterance(who, name, session.last_remark))
+        if not session.finished and not events.quiet:
             sleep(WAIT_TIME_AFTER_MOVES) # NOT TOO FAST.
-    printState(currentState)
-    if USE_HTML: gameToHTML.stateToHTML(currentState)
-    who = currentState.whose_move
-    renderCommentary("Game over; it's a draw.")
-    if USE_HTML: gameToHTML.reportResult("Game Over; it's a draw")
-    if USE_HTML: gameToHTML.endHTML()
-
-def printState(s):
-    global FINISHED
-    board = s.board
-    who = s.whose_move
-    horizontalBorder = "+"+3*M*"-"+"+"
-    renderCommentary(horizontalBorder)
-    for row in board:
-        line = "|"
-        for item in row:
-            line += " "+item+" "
-        line += "|"
-        renderCommentary(line)
-    renderCommentary(horizontalBorder)
-    if not FINISHED:
-      renderCommentary("It is "+who+"'s turn to move.\n")
+    FINISHED = True
+    winner = session.winner
+    events.emit(GameResult(winner, session.nickname(winner) if winner else None,
+                           session.result, session.state, session.forfeited))
+    events.close()
+    return session
 
 # Temporary function.  Remove when other channels are working.
 def renderCommentary(stuff):
@@ -185,7 +144,8 @@ class HumanPlayer:
     def introduce(self):
         return "I am a human player!"
 
-    def prepare(self, game_type, side, opponent_nickname):
+    def prepare(self, game_type, side, opponent_nickname,
+                expected_time_per_move=0.1, utterances_matter=True):
         self.game_type = game_type
         self.side = side
         return "Ready to play!"
@@ -348,6 +308,7 @@ def interactive_setup():
     print("1. Player vs AI")
     print("2. Random player vs AI")
     print("3. AI vs AI")
+    print("4. No game: solve the starting position (proof-number search)")
     print("-"*60)
 
     playerX = None
@@ -355,13 +316,14 @@ def interactive_setup():
 
     while True:
         try:
-            opponent_choice = input("Enter your choice (1-3): ").strip()
+            opponent_choice = input("Enter your choice (1-4): ").strip()
 
             if opponent_choice == '1':
                 # Human vs AI
                 playerX = HumanPlayer()
                 from src.agents import sguptasr_KInARow
                 playerO = sguptasr_KInARow.OurAgent()
+                playerO.use_pondering = True # Think on the human's time.
                 break
             elif opponent_choice == '2':
                 # Random Player vs AI
@@ -377,8 +339,10 @@ def interactive_setup():
                 playerX = sguptasr_KInARow.OurAgent()
                 playerO = kchua220_KInARow.OurAgent()
                 break
+            elif opponent_choice == '4':
+                return 'solve'
             else:
-                print("Invalid choice. Please enter 1, 2, or 3.")
+                print("Invalid choice. Please enter 1, 2, 3, or 4.")
         except ImportError as e:
             print(f"Error importing agent: {e}")
             print("Make sure all agent files are in the same directory.")
@@ -389,13 +353,34 @@ def interactive_setup():
     set_players(playerX, playerO)
     return True
 
+def solvePosition(game_type, max_nodes=10000000):
+    # Settle the game's starting position outright with proof-number search.
+    from src.core.bitboard import BitState
+    from src.core.proof_number import ProofNumberSearch
+    state = BitState(game_type)
+    solver = ProofNumberSearch(max_nodes)
+    start = time.time()
+    result = solver.solve(state, game_type.turn_limit)
+    elapsed = time.time() - start
+    if result.outcome is None:
+        print(f"Not solved within {max_nodes} nodes ({elapsed:.1f} seconds).")
+        return result
+    print(f"{game_type.long_name}: a {result.outcome} for {state.whose_move}, "
+          f"proved in {result.nodes} nodes ({elapsed:.1f} seconds).")
+    if result.move is not None:
+        print(f"A move that achieves it: {result.move}")
+    return result
+
 def test():
     # Interactive test
     print("\n" + "="*60)
     print("K-in-a-Row Game - Interactive Mode")
     print("="*60)
 
-    if interactive_setup():
+    setup = interactive_setup()
+    if setup == 'solve':
+        solvePosition(GAME_TYPE)
+    elif setup:
         print("\n" + "="*60)
         print("Starting the game...")
         print("="*60 + "\n")
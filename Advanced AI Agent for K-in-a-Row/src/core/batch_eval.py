@@ -0,0 +1,165 @@
+'''batch_eval.py
+
+NumPy evaluation of all the children of a node in one pass.
+
+The children of a position are stacked into one (children x n x m)
+int8 array, with 0 for empty, 1 for X, 2 for O and 3 for forbidden
+squares.  Sliding-window sums along the 4 directions then give every
+window's (or run's) contents for every child at once, and the scores
+come back as one array.  This is used to order moves, where a Python
+loop would otherwise make, evaluate and unmake each child in turn.
+
+Two scoring schemes are provided, matching the agents' static_eval
+functions exactly:
+  WindowCountBatch   -- a score per k-window looked up from its X and O
+                        counts (kchua220_KInARow).
+  OpenSequenceBatch  -- weighted counts of runs of each length with at
+                        least one open end, plus a center bonus
+                        (sguptasr_KInARow).
+
+NumPy is optional.  If it cannot be imported, AVAILABLE is False and
+the agents order moves the way they did before.
+'''
+
+from abc import ABC, abstractmethod
+
+try:
+    import numpy as np
+    AVAILABLE = True
+except ImportError:
+    np = None
+    AVAILABLE = False
+
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+CODES = {' ': 0, 'X': 1, 'O': 2, '-': 3}
+WIN_SCORE = 10000
+
+def board_array(board):
+    """Return a list-of-lists board as an (n x m) int8 array."""
+    return np.array([[CODES[item] for item in row] for row in board], dtype=np.int8)
+
+class BatchEvaluator(ABC):
+    def __init__(self, game_type):
+        self.game_type = game_type
+        self.k = game_type.k
+        self.n = game_type.n
+        self.m = game_type.m
+
+    def children(self, state, moves):
+        """Stack the positions after each of moves into a (children x n x m) array."""
+        base = board_array(state.board)
+        boards = np.repeat(base[np.newaxis], len(moves), axis=0)
+        rows = np.array([i for i, _ in moves])
+        cols = np.array([j for _, j in moves])
+        boards[np.arange(len(moves)), rows, cols] = CODES[state.whose_move]
+        return boards
+
+    def score_children(self, state, moves):
+        """Return the static values (X's point of view) of the children of state."""
+        return self.scores(self.children(state, moves))
+
+    def order(self, state, moves):
+        """Return moves sorted best-first for the side to move (stable on ties)."""
+        if len(moves) < 2:
+            return moves
+        values = self.scores(self.children(state, moves))
+        if state.whose_move == 'X':
+            values = -values
+        return [moves[i] for i in np.argsort(values, kind='stable')]
+
+    @abstractmethod
+    def scores(self, boards):
+        """Return the static values (X's point of view) of the stacked boards."""
+
+class WindowCountBatch(BatchEvaluator):
+    """Sum over k-windows of window_scores[x][o]; +/-WIN_SCORE on a win.
+
+    Windows through a forbidden square are left out.
+    """
+
+    def __init__(self, game_type, window_scores):
+        super().__init__(game_type)
+        self.window_scores = np.array(window_scores, dtype=np.int64)
+        forbidden = board_array(game_type.initial_state.board) == 3
+        self.valid = [self.window_sums(forbidden[np.newaxis], d)[0] == 0
+                      for d in DIRECTIONS]
+
+    def window_sums(self, mask, direction):
+        """Sliding sums of mask over the k-windows starting at each square."""
+        k, n, m = self.k, self.n, self.m
+        di, dj = direction
+        rows = n - (k - 1) * di
+        cols = m - (k - 1) * abs(dj)
+        j0 = (k - 1) if dj < 0 else 0
+        total = np.zeros((mask.shape[0], max(rows, 0), max(cols, 0)), dtype=np.int8)
+        if rows <= 0 or cols <= 0:
+            return total
+        for t in range(k):
+            i = t * di
+            j = j0 + t * dj
+            total += mask[:, i:i + rows, j:j + cols]
+        return total
+
+    def scores(self, boards):
+        x_mask = (boards == 1).astype(np.int8)
+        o_mask = (boards == 2).astype(np.int8)
+        totals = np.zeros(boards.shape[0], dtype=np.int64)
+        x_wins = np.zeros(boards.shape[0], dtype=bool)
+        o_wins = np.zeros(boards.shape[0], dtype=bool)
+        for d, valid in zip(DIRECTIONS, self.valid):
+            x_sums = self.window_sums(x_mask, d)
+            o_sums = self.window_sums(o_mask, d)
+            values = self.window_scores[x_sums, o_sums] * valid
+            totals += values.sum(axis=(1, 2))
+            x_wins |= ((x_sums == self.k) & valid).any(axis=(1, 2))
+            o_wins |= ((o_sums == self.k) & valid).any(axis=(1, 2))
+        totals[o_wins] = -WIN_SCORE
+        totals[x_wins] = WIN_SCORE
+        return totals
+
+class OpenSequenceBatch(BatchEvaluator):
+    """Sum of weights[L] * (X runs - O runs) of length L with an open end,
+    plus center_bonus for the center square; +/-WIN_SCORE on a win.
+
+    A run of length L is counted once for each square where L stones of
+    one player start in a direction; an end is open if the square just
+    before or just after it is empty.
+    """
+
+    def __init__(self, game_type, weights, center_bonus=5):
+        super().__init__(game_type)
+        self.weights = weights
+        self.center = (game_type.n // 2, game_type.m // 2)
+        self.center_bonus = center_bonus
+
+    def scores(self, boards):
+        k, n, m = self.k, self.n, self.m
+        pad = k + 1
+        count = boards.shape[0]
+        totals = np.zeros(count, dtype=np.int64)
+        wins = {}
+        empty = np.zeros((count, n + 2 * pad, m + 2 * pad), dtype=bool)
+        empty[:, pad:pad + n, pad:pad + m] = boards == 0
+        for player, sign in [(1, 1), (2, -1)]:
+            stones = np.zeros_like(empty)
+            stones[:, pad:pad + n, pad:pad + m] = boards == player
+            won = np.zeros(count, dtype=bool)
+            for di, dj in DIRECTIONS:
+                def shifted(a, t):
+                    i = pad + t * di
+                    j = pad + t * dj
+                    return a[:, i:i + n, j:j + m]
+                before = shifted(empty, -1)
+                run = shifted(stones, 0)
+                for length in range(2, k + 1):
+                    run = run & shifted(stones, length - 1)
+                    open_run = run & (before | shifted(empty, length))
+                    totals += sign * self.weights[length] * open_run.sum(axis=(1, 2))
+                won |= run.any(axis=(1, 2))
+            wins[player] = won
+        ci, cj = self.center
+        totals += self.center_bonus * ((boards[:, ci, cj] == 1).astype(np.int64)
+                                       - (boards[:, ci, cj] == 2))
+        totals[wins[2]] = -WIN_SCORE
+        totals[wins[1]] = WIN_SCORE
+        return totals
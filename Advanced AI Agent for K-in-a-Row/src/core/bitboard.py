@@ -0,0 +1,324 @@
+'''bitboard.py
+
+Defines BitState, a bitboard-backed state for searching K-in-a-Row games.
+
+Squares are numbered i*m + j.  The X stones, the O stones and the
+forbidden squares are each kept in one Python int used as a bit mask.
+Moves are made and unmade in place, so a search can walk the whole
+tree with a single BitState instead of allocating a copy of the board
+for every child.
+
+The state also keeps, for every k-square window of its Game_Type (see
+Game_Type.get_windows), how many X and O stones the window holds.  A
+move updates only the windows through its square, and x_wins / o_wins
+count the windows that are full of one player's stones, so testing for
+a win is a lookup rather than a board scan.
+
+The Zobrist hash of the position (Game_Type.get_zobrist_keys) is kept
+in hash, updated with one XOR for the square and one for the side to
+move on every make and unmake.  So is the hash of the position's image
+under each symmetry of the board layout (Game_Type.get_symmetries);
+canonical_key() picks the smallest, so that all the images of a
+position share one key, and canonical_square() / real_square() map
+squares between the real board and that canonical frame.
+
+Likewise it keeps the base-3 code of every line of non-forbidden
+squares (Game_Type.get_lines), which pattern_table.py turns into
+scores with one lookup per line.
+
+For move generation it keeps near_bits, the squares within the game
+type's candidate_radius of some stone (Game_Type.get_neighbourhoods).
+Stones are only ever added, so a move just ORs in its square's mask,
+and unmaking it restores the mask saved on a stack.  candidate_bits()
+gives the empty squares among them.
+
+An IncrementalEvaluator can be attached with attach_evaluator(); its
+score is then kept as a running total in eval_score, changed only by
+the features through each played square.
+
+A list-of-lists board is kept in step with the masks (one assignment
+per move), so code written against game_types.State, such as the
+agents' static evaluators, can read a BitState unchanged.  Use
+to_state() to get an ordinary State back for the game master and
+gameToHTML.
+'''
+
+from src.core.game_types import State, deep_copy
+
+class BitState:
+    def __init__(self, game_type, state=None, symmetries=None):
+        # symmetries: those of game_type.get_symmetries() to hash under
+        # (identity first); by default all of them.
+        if state is None:
+            state = game_type.initial_state
+        self.game_type = game_type
+        self.board = deep_copy(state.board)
+        self.whose_move = state.whose_move
+        self.finished = state.finished
+        self.n = len(self.board)
+        self.m = len(self.board[0])
+        self.x_bits = 0
+        self.o_bits = 0
+        self.forbidden_bits = 0
+        for i, row in enumerate(self.board):
+            for j, item in enumerate(row):
+                bit = 1 << (i * self.m + j)
+                if item == 'X': self.x_bits |= bit
+                elif item == 'O': self.o_bits |= bit
+                elif item == '-': self.forbidden_bits |= bit
+        self.full_bits = (1 << (self.n * self.m)) - 1
+        self.empty_bits = self.full_bits & ~(self.x_bits | self.o_bits | self.forbidden_bits)
+        self.history = [] # Squares played since this BitState was built.
+
+        self.k = game_type.k
+        self.windows, self.windows_through = game_type.get_windows()
+        self.x_counts = [0] * len(self.windows)
+        self.o_counts = [0] * len(self.windows)
+        self.x_wins = 0
+        self.o_wins = 0
+        for w, window in enumerate(self.windows):
+            for sq in window:
+                if self.x_bits >> sq & 1: self.x_counts[w] += 1
+                elif self.o_bits >> sq & 1: self.o_counts[w] += 1
+            if self.x_counts[w] == self.k: self.x_wins += 1
+            if self.o_counts[w] == self.k: self.o_wins += 1
+
+        self.lines, self.lines_through = game_type.get_lines()
+        self.line_codes = [0] * len(self.lines)
+        for sq, steps in enumerate(self.lines_through):
+            for l, power in steps:
+                if self.x_bits >> sq & 1: self.line_codes[l] += power
+                elif self.o_bits >> sq & 1: self.line_codes[l] += 2 * power
+
+        self.x_keys, self.o_keys, self.side_key = game_type.get_zobrist_keys()
+        self.hash = self.side_key if self.whose_move == 'O' else 0
+        for sq in range(self.n * self.m):
+            if self.x_bits >> sq & 1: self.hash ^= self.x_keys[sq]
+            elif self.o_bits >> sq & 1: self.hash ^= self.o_keys[sq]
+
+        # Hashes of the images under the other symmetries (identity first).
+        if symmetries is None:
+            symmetries = game_type.get_symmetries()
+        self.symmetries = symmetries
+        self.inverse_symmetries = []
+        for perm in self.symmetries:
+            inverse = [0] * len(perm)
+            for sq, image in enumerate(perm):
+                inverse[image] = sq
+            self.inverse_symmetries.append(inverse)
+        self.sym_x_keys = [[self.x_keys[image] for image in perm] for perm in self.symmetries[1:]]
+        self.sym_o_keys = [[self.o_keys[image] for image in perm] for perm in self.symmetries[1:]]
+        self.sym_hashes = []
+        for t in range(len(self.sym_x_keys)):
+            h = self.side_key if self.whose_move == 'O' else 0
+            for sq in range(self.n * self.m):
+                if self.x_bits >> sq & 1: h ^= self.sym_x_keys[t][sq]
+                elif self.o_bits >> sq & 1: h ^= self.sym_o_keys[t][sq]
+            self.sym_hashes.append(h)
+
+        self.near_masks, self.center_bits = game_type.get_neighbourhoods()
+        self.near_bits = 0
+        for sq, mask in enumerate(self.near_masks):
+            if (self.x_bits | self.o_bits) >> sq & 1:
+                self.near_bits |= mask
+        self.near_stack = []
+
+        self.evaluator = None
+        self.eval_score = 0
+        self.eval_deltas = []
+
+    def __str__(self):
+        return str(self.to_state())
+
+    def square(self, move):
+        i, j = move
+        return i * self.m + j
+
+    def coords(self, sq):
+        return divmod(sq, self.m)
+
+    def attach_evaluator(self, evaluator):
+        """Keep evaluator's score for this position up to date in eval_score."""
+        self.evaluator = evaluator
+        self.eval_score = evaluator.full_score(self)
+        self.eval_deltas = []
+
+    def make_move(self, move):
+        """Place a stone for the side to move at move = (i, j), in place."""
+        i, j = move
+        sq = i * self.m + j
+        bit = 1 << sq
+        k = self.k
+        evaluator = self.evaluator
+        if evaluator is not None:
+            before = evaluator.local_score(self, sq)
+        if self.whose_move == 'X':
+            self.x_bits |= bit
+            self.whose_move = 'O'
+            self.board[i][j] = 'X'
+            counts = self.x_counts
+            for w in self.windows_through[sq]:
+                counts[w] += 1
+                if counts[w] == k: self.x_wins += 1
+            self.hash ^= self.x_keys[sq] ^ self.side_key
+            sym_keys = self.sym_x_keys
+            digit = 1
+        else:
+            self.o_bits |= bit
+            self.whose_move = 'X'
+            self.board[i][j] = 'O'
+            counts = self.o_counts
+            for w in self.windows_through[sq]:
+                counts[w] += 1
+                if counts[w] == k: self.o_wins += 1
+            self.hash ^= self.o_keys[sq] ^ self.side_key
+            sym_keys = self.sym_o_keys
+            digit = 2
+        hashes = self.sym_hashes
+        for t in range(len(hashes)):
+            hashes[t] ^= sym_keys[t][sq] ^ self.side_key
+        codes = self.line_codes
+        for l, power in self.lines_through[sq]:
+            codes[l] += digit * power
+        self.empty_bits &= ~bit
+        self.near_stack.append(self.near_bits)
+        self.near_bits |= self.near_masks[sq]
+        self.history.append(move)
+        if evaluator is not None:
+            delta = evaluator.local_score(self, sq) - before
+            self.eval_score += delta
+            self.eval_deltas.append(delta)
+
+    def unmake_move(self):
+        """Take back the last move made with make_move, and return it."""
+        move = self.history.pop()
+        i, j = move
+        sq = i * self.m + j
+        bit = 1 << sq
+        k = self.k
+        if self.whose_move == 'X':
+            self.o_bits &= ~bit
+            self.whose_move = 'O'
+            counts = self.o_counts
+            for w in self.windows_through[sq]:
+                if counts[w] == k: self.o_wins -= 1
+                counts[w] -= 1
+            self.hash ^= self.o_keys[sq] ^ self.side_key
+            sym_keys = self.sym_o_keys
+            digit = 2
+        else:
+            self.x_bits &= ~bit
+            self.whose_move = 'X'
+            counts = self.x_counts
+            for w in self.windows_through[sq]:
+                if counts[w] == k: self.x_wins -= 1
+                counts[w] -= 1
+            self.hash ^= self.x_keys[sq] ^ self.side_key
+            sym_keys = self.sym_x_keys
+            digit = 1
+        hashes = self.sym_hashes
+        for t in range(len(hashes)):
+            hashes[t] ^= sym_keys[t][sq] ^ self.side_key
+        codes = self.line_codes
+        for l, power in self.lines_through[sq]:
+            codes[l] -= digit * power
+        self.board[i][j] = ' '
+        self.empty_bits |= bit
+        self.near_bits = self.near_stack.pop()
+        self.finished = False
+        if self.evaluator is not None:
+            self.eval_score -= self.eval_deltas.pop()
+        return move
+
+    def canonical_key(self):
+        """Return (key, t): the smallest hash over the position's symmetric
+        images, and the index of the symmetry giving it (0 is the identity)."""
+        key, best = self.hash, 0
+        for t, h in enumerate(self.sym_hashes, 1):
+            if h < key:
+                key, best = h, t
+        return key, best
+
+    def canonical_square(self, sq, t):
+        """Map square sq of the real board into the frame of symmetry t."""
+        return self.symmetries[t][sq]
+
+    def real_square(self, sq, t):
+        """Map square sq of symmetry t's frame back onto the real board."""
+        return self.inverse_symmetries[t][sq]
+
+    def stabilizer(self):
+        """Return the symmetries (other than the identity) that leave this
+        position unchanged, as permutations of the squares."""
+        h = self.hash
+        return [self.symmetries[t] for t, sym in enumerate(self.sym_hashes, 1) if sym == h]
+
+    def legal_moves(self):
+        """Return the empty squares as (i, j) pairs in row-major order."""
+        moves = []
+        bits = self.empty_bits
+        m = self.m
+        while bits:
+            low = bits & -bits
+            moves.append(divmod(low.bit_length() - 1, m))
+            bits ^= low
+        return moves
+
+    def candidate_bits(self):
+        """Return the empty squares near a stone as a bit mask: the center
+        squares if no stone is down yet, every empty square if none is near."""
+        if not self.near_bits:
+            bits = self.center_bits & self.empty_bits
+        else:
+            bits = self.near_bits & self.empty_bits
+        return bits if bits else self.empty_bits
+
+    def has_win(self, player):
+        """True if player has k in a row somewhere on the board."""
+        if player == 'X': return self.x_wins > 0
+        return self.o_wins > 0
+
+    def winner(self):
+        """Return 'X' or 'O' if that player has k in a row, else None."""
+        if self.x_wins: return 'X'
+        if self.o_wins: return 'O'
+        return None
+
+    def wins_through(self, move):
+        """True if a window through move = (i, j) is full of one player's stones.
+
+        Since any new win must include the last move, this is all the
+        game master's win test needs to look at.
+        """
+        k = self.k
+        for w in self.windows_through[self.square(move)]:
+            if self.x_counts[w] == k or self.o_counts[w] == k:
+                return True
+        return False
+
+    def is_full(self):
+        return self.empty_bits == 0
+
+    def num_empty(self):
+        return bin(self.empty_bits).count('1')
+
+    def to_board(self):
+        """Rebuild a list-of-lists board from the bit masks."""
+        board = []
+        bit = 1
+        for i in range(self.n):
+            row = []
+            for j in range(self.m):
+                if self.x_bits & bit: row.append('X')
+                elif self.o_bits & bit: row.append('O')
+                elif self.forbidden_bits & bit: row.append('-')
+                else: row.append(' ')
+                bit <<= 1
+            board.append(row)
+        return board
+
+    def to_state(self):
+        """Return an ordinary game_types.State with the same position."""
+        s = State(initial_state_data=[self.to_board(), self.whose_move])
+        s.finished = self.finished
+        return s
@@ -0,0 +1,190 @@
+'''events.py
+
+What happens in a game, as events, and sinks that render them.
+
+The game master reports a game as a stream of typed events: GameStart
+once the players are prepared, MoveMade and Utterance for each move,
+and GameResult at the end.  It does not format anything itself; an
+EventStream hands each event to its sinks, and each sink renders the
+events its own way:
+
+  ConsoleSink  the boards and commentary, as text on the console
+  HTMLSink     the game's HTML transcript (see gameToHTML.py)
+  MemorySink   keeps the events, for a program to look at afterwards
+  NullSink     drops them
+
+Sinks are buffered: a sink collects events and renders them a batch at
+a time, in one write, and always at the end of the game (or when
+flushed).  A ConsoleSink with batch=1 shows each move as it is made,
+which a human player needs; the HTML transcript is written in one go
+when the game ends.  An EventStream with no sinks (quiet mode) drops
+every event at once, so a game played quietly renders nothing at all.
+'''
+
+import sys
+from abc import ABC, abstractmethod
+from src.utils import gameToHTML
+
+PLAYER_NUMBERS = {'X': 1, 'O': 2}
+
+class GameEvent:
+    kind = None
+
+class GameStart(GameEvent):
+    kind = 'start'
+    def __init__(self, game_type, x_name, o_name, state, round=1):
+        self.game_type = game_type
+        self.x_name = x_name
+        self.o_name = o_name
+        self.state = state
+        self.round = round
+
+class MoveMade(GameEvent):
+    kind = 'move'
+    def __init__(self, side, name, move, state, turn, seconds):
+        self.side = side
+        self.name = name
+        self.move = move
+        self.state = state     # The position after the move.
+        self.turn = turn       # Moves played so far, this one included.
+        self.seconds = seconds # Time the player took.
+
+class Utterance(GameEvent):
+    kind = 'utterance'
+    def __init__(self, side, name, text):
+        self.side = side
+        self.name = name
+        self.text = text
+
+class GameResult(GameEvent):
+    kind = 'result'
+    def __init__(self, winner, winner_name, text, state, forfeited=False):
+        self.winner = winner # 'X', 'O' or None for a draw.
+        self.winner_name = winner_name
+        self.text = text
+        self.state = state
+        self.forfeited = forfeited
+
+    @property
+    def congratulations(self):
+        return (f"Congratulations to Player {PLAYER_NUMBERS[self.winner]} "
+                f"({self.winner_name})!")
+
+class Sink(ABC):
+    def __init__(self, batch=1):
+        self.batch = batch # Events to collect before rendering; None for a whole game.
+        self.pending = []
+
+    def emit(self, event):
+        self.pending.append(event)
+        if event.kind == 'result' or (self.batch is not None and len(self.pending) >= self.batch):
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            events, self.pending = self.pending, []
+            self.write(events)
+
+    @abstractmethod
+    def write(self, events):
+        """Render a batch of events, in order."""
+
+    def close(self):
+        self.flush()
+
+class NullSink(Sink):
+    def write(self, events):
+        pass
+
+class MemorySink(Sink):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def write(self, events):
+        self.events.extend(events)
+
+class ConsoleSink(Sink):
+    def __init__(self, stream=None, batch=1):
+        super().__init__(batch)
+        self.stream = stream # None for sys.stdout at the time of writing.
+        self.last_state = None
+
+    def write(self, events):
+        lines = []
+        for event in events:
+            self.render(event, lines)
+        stream = self.stream or sys.stdout
+        stream.write('\n'.join(lines) + '\n')
+        stream.flush()
+
+    def render(self, event, lines):
+        if event.kind == 'start':
+            self.render_board(event.state, lines)
+        elif event.kind == 'move':
+            lines.append(f"Move is by {event.side} to {event.move}")
+            self.last_state = event.state
+        elif event.kind == 'utterance':
+            lines.append(f"{event.name} says: {event.text}")
+            # The board goes after what was said with the move.
+            self.render_board(self.last_state, lines)
+        elif event.kind == 'result':
+            lines.append(event.text)
+            if event.forfeited:
+                lines.append(event.congratulations)
+
+    def render_board(self, state, lines):
+        border = '+' + '---' * len(state.board[0]) + '+'
+        lines.append(border)
+        lines.extend('| ' + '  '.join(row) + ' |' for row in state.board)
+        lines.append(border)
+        if not state.finished:
+            lines.append(f"It is {state.whose_move}'s turn to move.\n")
+
+class HTMLSink(Sink):
+    """Writes the game's transcript (see gameToHTML.py) when it ends."""
+    def __init__(self, directory=gameToHTML.OUTPUT_DIR):
+        super().__init__(batch=None)
+        self.directory = directory
+        self.path = None # The transcript last written.
+
+    def write(self, events):
+        start = events[0]
+        if start.kind != 'start':
+            return # Only whole games are written.
+        record = {'X': start.x_name, 'O': start.o_name, 'game': start.game_type.short_name,
+                  'round': start.round, 'board': [''.join(row) for row in start.state.board],
+                  'first': start.state.whose_move, 'moves': [], 'remarks': [], 'result': ''}
+        for event in events[1:]:
+            if event.kind == 'move':
+                record['moves'].append(event.move)
+            elif event.kind == 'utterance':
+                record['remarks'].append(event.text)
+            elif event.kind == 'result':
+                record['result'] = event.text
+                if event.forfeited:
+                    record['result'] += ' ' + event.congratulations
+        try:
+            self.path = gameToHTML.write_transcript(record, self.directory)
+        except OSError as e:
+            print(f"Could not write the game's HTML transcript: {e}")
+
+class EventStream:
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    @property
+    def quiet(self):
+        return not self.sinks
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,351 @@
+'''game_server.py
+
+An asyncio server hosting many human-vs-agent games at once.
+
+Each game is a GameSession (see session.py), so games share nothing but
+the process.  The agents do not run in the event loop: an AgentPool
+keeps a few worker processes, each hosting the agents of the games
+assigned to it (a game stays with its worker, so its agent keeps its
+tables from move to move), and make_move() runs there while the loop
+goes on serving everyone else.  Agents' own output is discarded in the
+workers.  A worker that dies takes the agents it hosted with it (their
+games are forfeited), and is replaced for the games that come after.
+
+Clients speak one JSON object per line, over TCP or stdin/stdout:
+
+  {"op": "new", "game": "FIAR", "agent": "sguptasr", "side": "X", "time": 1.0, "name": "Ann"}
+  {"op": "move", "session": 1, "move": [3, 3], "remark": "Your turn."}
+  {"op": "show", "session": 1}
+  {"op": "close", "session": 1}
+
+"game" is one of TTT, FIAR and Cassini, or "custom" with "k", "n" and
+"m" (all positive, n and m at most MAX_SIDE, k no more than the longer
+side); "time" is the seconds allowed per move (positive, and cut to
+MAX_TIME_PER_MOVE); "side" is the human's side, and the agent (a module in src/agents, named as for
+tournament.py) plays the other.  A connection can only move in, show
+and close the games it started.  Each request is answered by one line
+echoing its "id", if it had one, with "ok" and either "error" or the
+game: its "session", "board" (one string per row), "to_move", the
+agent's last "agent_move" and "agent_says", "finished", "winner" and
+"result".  "new" answers once the agent has prepared (and moved, if it
+goes first), "move" once the agent has replied.  Requests are handled
+concurrently, so answers may come out of order; moves within one game
+are taken one at a time.  A connection's games are closed when it is.
+Run it with, e.g.
+
+  python -m src.core.game_server --port 8415 --workers 2
+  python -m src.core.game_server --stdio
+'''
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.core.game_types import GAME_TYPES, custom_game_type
+from src.core.session import GameSession, IllegalMove
+from src.core.tournament import agent_module, silence
+
+DEFAULT_PORT = 8415
+MAX_TIME_PER_MOVE = 10.0 # Seconds; longer requests are cut to this.
+MAX_SIDE = 20 # Most rows or columns a custom board may have.
+
+AGENTS = {} # In a worker process: session id -> the agent playing in it.
+
+def worker_prepare(session_id, agent_name, game_type, side, opponent, time_per_move):
+    agent = agent_module(agent_name).OurAgent()
+    AGENTS[session_id] = agent
+    agent.prepare(game_type, side, opponent, time_per_move)
+    return agent.nickname
+
+def worker_move(session_id, state, remark, time_per_move):
+    move_and_state, utterance = AGENTS[session_id].make_move(state, remark, time_per_move)
+    return (move_and_state[0] if move_and_state else None), utterance
+
+def worker_close(session_id):
+    AGENTS.pop(session_id, None)
+
+class AgentPool:
+    """Worker processes hosting agents, each game's agent in one of them."""
+    def __init__(self, processes=None):
+        processes = processes or os.cpu_count() or 1
+        self.executors = [ProcessPoolExecutor(max_workers=1, initializer=silence)
+                          for _ in range(processes)]
+        self.games = [0] * processes # Games hosted by each worker.
+
+    def assign(self):
+        worker = self.games.index(min(self.games))
+        self.games[worker] += 1
+        return worker
+
+    def release(self, worker):
+        self.games[worker] -= 1
+
+    async def call(self, worker, fn, *args):
+        executor = self.executors[worker]
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # The worker process died, and its agents with it.  Start a
+            # new one, so that only the games it hosted are lost.
+            if self.executors[worker] is executor:
+                executor.shutdown(wait=False)
+                self.executors[worker] = ProcessPoolExecutor(max_workers=1, initializer=silence)
+            raise
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(cancel_futures=True)
+
+class RemotePlayer:
+    """The human at the other end of a connection."""
+    def __init__(self, nickname):
+        self.nickname = nickname
+
+class PooledAgent:
+    """An agent living in a worker of an AgentPool."""
+    def __init__(self, pool, session_id, name):
+        self.pool = pool
+        self.worker = pool.assign()
+        self.session_id = session_id
+        self.nickname = name
+
+    async def prepare(self, game_type, side, opponent, time_per_move):
+        self.nickname = await self.pool.call(self.worker, worker_prepare, self.session_id,
+                                             self.nickname, game_type, side, opponent, time_per_move)
+
+    async def make_move(self, state, remark, time_per_move):
+        return await self.pool.call(self.worker, worker_move, self.session_id,
+                                    state, remark, time_per_move)
+
+    async def close(self):
+        self.pool.release(self.worker)
+        await self.pool.call(self.worker, worker_close, self.session_id)
+
+class HostedGame:
+    def __init__(self, session_id, session, agent, agent_side):
+        self.session_id = session_id
+        self.session = session
+        self.agent = agent
+        self.agent_side = agent_side
+        self.lock = asyncio.Lock() # One move at a time.
+        self.agent_move = None
+        self.agent_says = ''
+
+class GameServer:
+    def __init__(self, pool):
+        self.pool = pool
+        self.games = {} # Session id -> HostedGame.
+        self.next_id = 1
+
+    async def handle(self, request, owned):
+        """Answer one request (a dict); owned is the set of session ids
+        the requesting connection has opened."""
+        reply = {'id': request['id']} if 'id' in request else {}
+        try:
+            op = request.get('op')
+            if op == 'new':
+                game = await self.new_game(request)
+                owned.add(game.session_id)
+            elif op in ('move', 'show', 'close'):
+                game = None
+                if request.get('session') in owned:
+                    game = self.games.get(request.get('session'))
+                if game is None:
+                    raise ValueError(f"no session {request.get('session')!r}")
+                if op == 'move':
+                    await self.human_move(game, request.get('move'), str(request.get('remark', '')))
+                elif op == 'close':
+                    owned.discard(game.session_id)
+                    async with game.lock:
+                        await self.close_game(game)
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except (ValueError, TypeError, KeyError, IllegalMove) as e:
+            reply.update(ok=False, error=str(e))
+            return reply
+        reply.update(ok=True)
+        reply.update(self.describe(game))
+        return reply
+
+    async def new_game(self, request):
+        name = request.get('game', 'TTT')
+        if name == 'custom':
+            k, n, m = int(request['k']), int(request['n']), int(request['m'])
+            if min(k, n, m) < 1 or k > max(n, m):
+                raise ValueError("k, n and m must be positive, and k no more than max(n, m)")
+            if max(n, m) > MAX_SIDE:
+                raise ValueError(f"n and m must be at most {MAX_SIDE}")
+            game_type = custom_game_type(k, n, m)
+        elif name in GAME_TYPES:
+            game_type = GAME_TYPES[name]
+        else:
+            raise ValueError(f"unknown game {name!r}")
+        human_side = request.get('side', 'X')
+        if human_side not in ('X', 'O'):
+            raise ValueError("side must be 'X' or 'O'")
+        time_per_move = float(request.get('time', game_type.default_time_per_move))
+        if not (math.isfinite(time_per_move) and time_per_move > 0):
+            raise ValueError("time must be a positive number of seconds")
+        time_per_move = min(time_per_move, MAX_TIME_PER_MOVE)
+        agent_name = str(request.get('agent', 'sguptasr'))
+        try:
+            # Only agents in src/agents: a dotted name could import any module.
+            known = '.' not in agent_name and hasattr(agent_module(agent_name), 'OurAgent')
+        except ImportError:
+            known = False
+        if not known:
+            raise ValueError(f"unknown agent {agent_name!r}")
+        session_id = self.next_id
+        self.next_id += 1
+        human = RemotePlayer(str(request.get('name', 'Human Player')))
+        agent = PooledAgent(self.pool, session_id, agent_name)
+        agent_side = 'O' if human_side == 'X' else 'X'
+        players = (human, agent) if human_side == 'X' else (agent, human)
+        game = HostedGame(session_id, GameSession(game_type, *players, time_per_move),
+                          agent, agent_side)
+        self.games[session_id] = game
+        async with game.lock:
+            try:
+                await agent.prepare(game_type, agent_side, human.nickname, time_per_move)
+            except Exception as e:
+                game.session.forfeit(agent_side, f"failed to prepare ({e!r})")
+            await self.agent_turn(game)
+        return game
+
+    async def human_move(self, game, move, remark):
+        async with game.lock:
+            session = game.session
+            if session.to_move == game.agent_side and not session.finished:
+                raise ValueError("it is not your turn")
+            session.play(move, remark)
+            game.agent_move, game.agent_says = None, ''
+            await self.agent_turn(game)
+
+    async def agent_turn(self, game):
+        """Let the agent move, if it is its turn in a game not yet over."""
+        session = game.session
+        if session.finished or session.to_move != game.agent_side:
+            return
+        try:
+            move, utterance = await game.agent.make_move(session.state, session.last_remark,
+                                                         session.time_per_move)
+        except Exception as e:
+            session.forfeit(game.agent_side, f"raised {e!r}")
+            return
+        if move is None:
+            session.forfeit(game.agent_side, "returned no move")
+            return
+        try:
+            session.play(move, utterance)
+        except IllegalMove as e:
+            session.forfeit(game.agent_side, f"played an illegal move: {e}")
+            return
+        game.agent_move, game.agent_says = list(move), utterance
+
+    async def close_game(self, game):
+        if self.games.pop(game.session_id, None) is not None:
+            await game.agent.close()
+
+    def describe(self, game):
+        session = game.session
+        return {'session': game.session_id,
+                'board': [''.join(row) for row in session.state.board],
+                'to_move': session.to_move,
+                'agent': game.agent.nickname,
+                'agent_move': game.agent_move,
+                'agent_says': game.agent_says,
+                'finished': session.finished,
+                'winner': session.winner,
+                'result': session.result}
+
+    async def serve_connection(self, lines, write):
+        """Serve requests from the async iterator lines, answering with
+        write(text); close the connection's games when lines run out."""
+        owned = set()
+        tasks = set()
+
+        async def answer(line):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except ValueError as e:
+                reply = {'ok': False, 'error': f"bad request: {e}"}
+            else:
+                reply = await self.handle(request, owned)
+            await write(json.dumps(reply) + '\n')
+
+        async for line in lines:
+            if line.strip():
+                task = asyncio.create_task(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for session_id in list(owned):
+            game = self.games.get(session_id)
+            if game is not None:
+                async with game.lock:
+                    await self.close_game(game)
+
+    async def serve_stream(self, reader, writer):
+        async def lines():
+            while line := await reader.readline():
+                yield line.decode()
+
+        async def write(text):
+            writer.write(text.encode())
+            await writer.drain()
+
+        try:
+            await self.serve_connection(lines(), write)
+        finally:
+            writer.close()
+
+    async def serve_stdio(self):
+        loop = asyncio.get_running_loop()
+
+        async def lines():
+            while line := await loop.run_in_executor(None, sys.stdin.readline):
+                yield line
+
+        async def write(text):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        await self.serve_connection(lines(), write)
+
+async def serve(host, port, workers, stdio=False):
+    pool = AgentPool(workers)
+    server = GameServer(pool)
+    try:
+        if stdio:
+            await server.serve_stdio()
+        else:
+            listener = await asyncio.start_server(server.serve_stream, host, port)
+            print(f"Serving K-in-a-Row games on {host}:{port}", flush=True)
+            async with listener:
+                await listener.serve_forever()
+    finally:
+        pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Host human-vs-agent K-in-a-Row games.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='agent worker processes (default: one per CPU)')
+    parser.add_argument('--stdio', action='store_true',
+                        help='serve one client on stdin/stdout instead of a socket')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.stdio))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
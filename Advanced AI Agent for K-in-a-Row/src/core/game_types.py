@@ -4,11 +4,16 @@ Defines a State class useful in all K-in-a-Row games.
 
 Defines a KGame class as a base class for these games.
 
-Also defines 3 specific versions of K-in-a-Row.
+Also defines 3 specific versions of K-in-a-Row, GAME_TYPES to look
+them up by short name, and custom_game_type() for any other k, n and m.
 '''
 
+import random
+
 #GAME_TYPE = None # Used in State.__str__
 
+ZOBRIST_SEED = 415 # Same keys in every process, so hashes can be shared.
+
 class State:
     def __init__(self, old=None, initial_state_data=None):
         if old==None:
@@ -51,7 +56,8 @@ def deep_copy(board_data):
     return [row[:] for row in board_data]
 
 class Game_Type:
-    def __init__(self, long_name, short_name, k, n, m, initial_state_data, turn_limit, default_time_per_move):
+    def __init__(self, long_name, short_name, k, n, m, initial_state_data, turn_limit, default_time_per_move,
+                 candidate_radius=2):
         self.long_name = long_name
         self.short_name = short_name
         self.k = k
@@ -60,6 +66,168 @@ class Game_Type:
         self.initial_state = State(initial_state_data = initial_state_data)
         self.turn_limit = turn_limit
         self.default_time_per_move = default_time_per_move
+        # Searches may skip empty squares farther than this (Chebyshev
+        # distance) from every stone; None means consider them all.
+        self.candidate_radius = candidate_radius
+        self.neighbourhoods = None # Built on first use by get_neighbourhoods().
+        self.windows = None # Built on first use by get_windows().
+        self.windows_through = None
+        self.lines = None # Built on first use by get_lines().
+        self.lines_through = None
+        self.zobrist_keys = None # Built on first use by get_zobrist_keys().
+        self.symmetries = None # Built on first use by get_symmetries().
+
+    def get_windows(self):
+        """Return (windows, windows_through), building them once per game type.
+
+        windows is a list of tuples of square numbers (i*m + j), one for
+        each line of k squares, in any of the 4 directions, that does not
+        touch a forbidden '-' square.  windows_through[sq] is the list of
+        indices of the windows that contain square sq.
+        """
+        if self.windows is None:
+            board = self.initial_state.board
+            k, n, m = self.k, self.n, self.m
+            windows = []
+            windows_through = [[] for _ in range(n * m)]
+            for i in range(n):
+                for j in range(m):
+                    for di, dj in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                        end_i = i + (k - 1) * di
+                        end_j = j + (k - 1) * dj
+                        if not (0 <= end_i < n and 0 <= end_j < m): continue
+                        cells = [(i + t * di, j + t * dj) for t in range(k)]
+                        if any(board[ci][cj] == '-' for ci, cj in cells): continue
+                        window = tuple(ci * m + cj for ci, cj in cells)
+                        for sq in window:
+                            windows_through[sq].append(len(windows))
+                        windows.append(window)
+            self.windows = windows
+            self.windows_through = windows_through
+        return self.windows, self.windows_through
+
+    def get_lines(self):
+        """Return (lines, lines_through), building them once per game type.
+
+        A line is a maximal run of two or more non-forbidden squares in
+        one of the 4 directions, given as a tuple of square numbers.
+        Forbidden squares and the edges of the board both end a line.
+        lines_through[sq] lists a pair (line index, 3**position) for each
+        line containing sq, where position is sq's place in the line; this
+        is what a move adds (times 1 for X, 2 for O) to the line's base-3
+        code (see pattern_table.py).
+        """
+        if self.lines is None:
+            board = self.initial_state.board
+            n, m = self.n, self.m
+            lines = []
+            lines_through = [[] for _ in range(n * m)]
+            for di, dj in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                for i in range(n):
+                    for j in range(m):
+                        # Start only where the previous square is off the board or forbidden.
+                        pi, pj = i - di, j - dj
+                        if 0 <= pi < n and 0 <= pj < m and board[pi][pj] != '-': continue
+                        line = []
+                        ci, cj = i, j
+                        while 0 <= ci < n and 0 <= cj < m and board[ci][cj] != '-':
+                            line.append(ci * m + cj)
+                            ci += di
+                            cj += dj
+                        if len(line) < 2: continue
+                        for position, sq in enumerate(line):
+                            lines_through[sq].append((len(lines), 3 ** position))
+                        lines.append(tuple(line))
+            self.lines = lines
+            self.lines_through = lines_through
+        return self.lines, self.lines_through
+
+    def get_zobrist_keys(self):
+        """Return (x_keys, o_keys, side_key), building them once per game type.
+
+        x_keys[sq] and o_keys[sq] are random 64-bit keys for an X or an O
+        on square sq, and side_key is XORed in when O is to move.  The
+        keys come from a private random.Random, so building them neither
+        depends on nor disturbs the global random module.
+        """
+        if self.zobrist_keys is None:
+            rng = random.Random(ZOBRIST_SEED)
+            squares = self.n * self.m
+            x_keys = [rng.getrandbits(64) for _ in range(squares)]
+            o_keys = [rng.getrandbits(64) for _ in range(squares)]
+            self.zobrist_keys = (x_keys, o_keys, rng.getrandbits(64))
+        return self.zobrist_keys
+
+    def get_symmetries(self):
+        """Return the symmetries of the board layout, building them once per game type.
+
+        Each symmetry is a rotation or reflection of the n by m board
+        (8 of them on a square board, 4 otherwise) that maps the
+        forbidden '-' squares of the initial state onto themselves, so
+        it maps every position to one with the same value.  Each is
+        given as a list perm with perm[sq] the square that sq goes to;
+        the identity comes first.
+        """
+        if self.symmetries is None:
+            board = self.initial_state.board
+            n, m = self.n, self.m
+            maps = [lambda i, j: (i, j),
+                    lambda i, j: (i, m - 1 - j),
+                    lambda i, j: (n - 1 - i, j),
+                    lambda i, j: (n - 1 - i, m - 1 - j)]
+            if n == m:
+                maps += [lambda i, j: (j, i),
+                         lambda i, j: (n - 1 - j, n - 1 - i),
+                         lambda i, j: (j, n - 1 - i),
+                         lambda i, j: (n - 1 - j, i)]
+            self.symmetries = []
+            for f in maps:
+                perm = []
+                for i in range(n):
+                    for j in range(m):
+                        fi, fj = f(i, j)
+                        if (board[i][j] == '-') != (board[fi][fj] == '-'): break
+                        perm.append(fi * m + fj)
+                    else: continue
+                    break
+                else:
+                    self.symmetries.append(perm)
+        return self.symmetries
+
+    def get_neighbourhoods(self):
+        """Return (near_masks, center_mask), building them once per game type.
+
+        near_masks[sq] is a bit mask (bit i*m + j) of the non-forbidden
+        squares within candidate_radius of sq in Chebyshev distance (all
+        of them if candidate_radius is None), and center_mask holds the
+        non-forbidden squares nearest the center of the board: the
+        candidates on a board with no stones on it.
+        """
+        if self.neighbourhoods is None:
+            board = self.initial_state.board
+            n, m = self.n, self.m
+            radius = self.candidate_radius
+            if radius is None:
+                radius = max(n, m)
+            near_masks = []
+            for i in range(n):
+                for j in range(m):
+                    mask = 0
+                    for ci in range(max(0, i - radius), min(n, i + radius + 1)):
+                        for cj in range(max(0, j - radius), min(m, j + radius + 1)):
+                            if board[ci][cj] != '-':
+                                mask |= 1 << (ci * m + cj)
+                    near_masks.append(mask)
+            # Twice the distance from the center, so even sizes stay integral.
+            distance = {(i, j): max(abs(2 * i - (n - 1)), abs(2 * j - (m - 1)))
+                        for i in range(n) for j in range(m) if board[i][j] != '-'}
+            nearest = min(distance.values())
+            center_mask = 0
+            for (i, j), d in distance.items():
+                if d == nearest:
+                    center_mask |= 1 << (i * m + j)
+            self.neighbourhoods = (near_masks, center_mask)
+        return self.neighbourhoods
 
     def __str__(self):
         text = ''
@@ -78,7 +246,8 @@ TTT = Game_Type("Tic-Tac-Toe",
                  3,
                  TTT_INITIAL_STATE_DATA,
                  9,
-                 1)
+                 1,
+                 candidate_radius=None)
 
 FIVE_INITIAL_STATE_DATA = \
               [[['-',' ',' ',' ',' ',' ','-'],
@@ -116,6 +285,14 @@ Cassini = Game_Type("Cassini (5 in a row that does not hit Saturn)",
                     44,
                     1)
 
+GAME_TYPES = {'TTT': TTT, 'FIAR': FIAR, 'Cassini': Cassini}
+
+def custom_game_type(k, n, m):
+    """The custom game the game master sets up for k, n and m."""
+    initial_state_data = [[[' ' for _ in range(m)] for _ in range(n)], "X"]
+    return Game_Type(f"{k}-in-a-Row on {n}x{m} Board", f"{k}-in-a-Row",
+                     k, n, m, initial_state_data, n * m, 1.0)
+
 def test():
     global GAME_TYPE
     GAME_TYPE = Cassini
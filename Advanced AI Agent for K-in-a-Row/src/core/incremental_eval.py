@@ -0,0 +1,38 @@
+'''incremental_eval.py
+
+Base class for static evaluators that a BitState keeps as a running total.
+
+An incremental evaluator scores a position as a sum of contributions
+from features (windows, lines, single squares), each depending only on
+the squares it covers.  Playing a stone on square sq changes only the
+features through sq, so BitState.make_move asks the evaluator for
+local_score(state, sq) just before and just after placing the stone,
+and adds the difference to state.eval_score.  unmake_move subtracts it
+again, so leaf evaluation never rescans the board.
+
+Subclasses live next to the static_eval they reproduce (see the agent
+modules), and must give exactly the same numbers as that static_eval.
+'''
+
+from abc import ABC, abstractmethod
+
+class IncrementalEvaluator(ABC):
+    def __init__(self, game_type):
+        self.game_type = game_type
+
+    @abstractmethod
+    def full_score(self, state):
+        """Sum of every feature's contribution, computed from scratch."""
+
+    @abstractmethod
+    def local_score(self, state, sq):
+        """Sum of the contributions of the features that contain square sq."""
+
+    def symmetries(self):
+        """The board symmetries under which this evaluator's score is unchanged.
+
+        Features made of whole windows or lines look the same from every
+        symmetry of the layout; subclasses scoring particular squares
+        must leave out the symmetries that move them.
+        """
+        return self.game_type.get_symmetries()
@@ -0,0 +1,243 @@
+'''isolation.py
+
+Agents in their own processes, held to their time limits.
+
+The game master passes each agent its time per move but cannot make it
+keep to it: an agent that searches too long, or never stops, holds up
+the game, and one that hangs in prepare() hangs the master.
+IsolatedAgent wraps an agent so that it runs in a worker process of its
+own, started once and kept for the whole game (so its tables, books and
+caches carry over from move to move), and answers as an agent does
+itself, so the game master, a GameSession or a tournament can use it
+in place of the agent.
+
+The master waits for each answer only until a hard deadline: the time
+limit plus grace for a move, prepare_limit for prepare().  An agent that
+misses it has its process killed, and then either forfeits (make_move()
+or prepare() raises AgentTimeout, which the game master and GameSession
+score as a loss) or, with on_timeout='default', is given a random legal
+move.  A new process is then started and sent prepare() without waiting
+for it, so it prepares during the opponent's turn; the next make_move()
+waits for its answer for at most half of the move's time limit, and the
+agent gets what is left for the move.  Until the new process has
+prepared (within prepare_limit of the restart) it plays default moves.
+An agent that crashes, or raises an exception in make_move(), is
+treated the same way.  Call stop() when the game is over.
+
+Moves travel as short byte strings, not pickled States: the board as
+one byte a square with the side to move and the time limit, and back
+the move, the time the agent took, its counters for the move (nodes,
+static evaluations, cutoffs, depth) and its remark.  The rest of a
+round trip (last_overhead) costs some tens of microseconds, so
+isolation is affordable even at 0.25 seconds a move.
+Only prepare() messages, sent once a game, are pickled.
+'''
+
+import multiprocessing
+import os
+import pickle
+import random
+import struct
+import sys
+import time
+import weakref
+from src.core.game_types import State
+
+GRACE = 0.05         # Seconds past the time limit before a move is late.
+PREPARE_LIMIT = 10.0 # Seconds an agent may take to prepare.
+NO_MOVE = -1
+MISSING = -1 << 62   # A counter the agent does not keep.
+STATS = ('nodes_this_turn', 'num_static_evals_this_turn',
+         'alpha_beta_cutoffs_this_turn', 'depth_reached_this_turn')
+MOVE_HEADER = struct.Struct('<dc')       # Time limit, side to move.
+REPLY_HEADER = struct.Struct('<dhh4q')   # Agent's seconds, row, column, STATS.
+
+class AgentTimeout(Exception):
+    pass
+
+class AgentFailure(Exception):
+    pass
+
+def worker_main(conn, agent):
+    """Serve agent's prepare() and make_move() over conn until told to stop."""
+    sys.stdout = open(os.devnull, 'w') # Agents' chatter goes nowhere.
+    n = m = 0
+    while True:
+        try:
+            message = conn.recv_bytes()
+        except (EOFError, OSError):
+            return
+        kind = message[:1]
+        try:
+            if kind == b'M':
+                time_limit, whose_move = MOVE_HEADER.unpack_from(message, 1)
+                start = 1 + MOVE_HEADER.size
+                cells = message[start:start + n * m].decode('ascii')
+                remark = message[start + n * m:].decode('utf-8')
+                state = State(initial_state_data=[[list(cells[i * m:(i + 1) * m]) for i in range(n)],
+                                                  whose_move.decode('ascii')])
+                began = time.perf_counter()
+                move_and_state, utterance = agent.make_move(state, remark, time_limit)
+                seconds = time.perf_counter() - began
+                move = move_and_state[0] if move_and_state else None
+                i, j = move if move is not None else (NO_MOVE, NO_MOVE)
+                stats = [getattr(agent, name, MISSING) for name in STATS]
+                stats = [MISSING if value is None else int(value) for value in stats]
+                conn.send_bytes(b'M' + REPLY_HEADER.pack(seconds, i, j, *stats)
+                                + str(utterance).encode('utf-8'))
+            elif kind == b'P':
+                args = pickle.loads(message[1:])
+                n, m = args[0].n, args[0].m
+                remark = agent.prepare(*args)
+                conn.send_bytes(b'P' + str(remark).encode('utf-8'))
+            else:
+                return
+        except Exception as e:
+            conn.send_bytes(b'E' + repr(e).encode('utf-8'))
+
+def stop_worker(process, conn):
+    """Kill a worker process and close its pipe (used as a finalizer, too)."""
+    if process.is_alive():
+        process.kill()
+    process.join()
+    conn.close()
+
+class IsolatedAgent:
+    def __init__(self, agent, on_timeout='forfeit', grace=GRACE, prepare_limit=PREPARE_LIMIT):
+        if on_timeout not in ('forfeit', 'default'):
+            raise ValueError("on_timeout must be 'forfeit' or 'default'")
+        self.agent = agent # Not used here: each worker starts from a copy of it.
+        self.nickname = agent.nickname
+        self.long_name = getattr(agent, 'long_name', agent.nickname)
+        self.on_timeout = on_timeout
+        self.grace = grace
+        self.prepare_limit = prepare_limit
+        self.conn = None
+        self.process = None
+        self.finalizer = None
+        self.prepare_args = None
+        self.restarting = None # Deadline for a restarted process to prepare, or None.
+        self.timeouts = 0 # Moves and prepare()s the agent did not answer in time.
+        self.failures = 0 # ... or answered with an exception, or crashed in.
+        self.last_overhead = 0.0 # Seconds a move took beyond the agent's own time.
+
+    def introduce(self):
+        return self.agent.introduce()
+
+    def start(self):
+        self.stop()
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=worker_main, args=(child, self.agent))
+        self.process.start()
+        child.close()
+        self.finalizer = weakref.finalize(self, stop_worker, self.process, self.conn)
+
+    def stop(self):
+        """Kill the agent's process, if it has one."""
+        if self.finalizer is not None:
+            self.finalizer()
+        self.conn = self.process = self.finalizer = self.restarting = None
+
+    def ask(self, message, limit, what):
+        """Send message; return the answer, if it comes within limit seconds."""
+        deadline = time.perf_counter() + limit
+        try:
+            self.conn.send_bytes(message)
+            if self.conn.poll(max(deadline - time.perf_counter(), 0)):
+                answer = self.conn.recv_bytes()
+                if answer[:1] == b'E':
+                    self.failures += 1
+                    raise AgentFailure(f"{self.nickname} raised {answer[1:].decode('utf-8')} in {what}")
+                return answer
+        except (EOFError, OSError):
+            self.failures += 1
+            self.stop()
+            raise AgentFailure(f"{self.nickname} crashed in {what}")
+        self.timeouts += 1
+        self.stop()
+        raise AgentTimeout(f"{self.nickname} took more than {limit:.2f} seconds in {what}")
+
+    def prepare(self, game_type, what_side_to_play, opponent_nickname,
+                expected_time_per_move=0.1, utterances_matter=True):
+        self.prepare_args = (game_type, what_side_to_play, opponent_nickname,
+                             expected_time_per_move, utterances_matter)
+        self.start()
+        answer = self.ask(b'P' + pickle.dumps(self.prepare_args), self.prepare_limit, 'prepare()')
+        return answer[1:].decode('utf-8')
+
+    def make_move(self, current_state, current_remark, time_limit=1000):
+        start = time.perf_counter()
+        if self.restarting is not None:
+            self.finish_restart(time_limit / 2)
+            if self.restarting is not None:
+                return self.default_move(current_state, "I am still restarting, so I play a default move.")
+            time_limit -= time.perf_counter() - start
+        if self.conn is None:
+            return self.default_move(current_state, "My process is gone, so I play a default move.")
+        message = (b'M' + MOVE_HEADER.pack(time_limit, current_state.whose_move.encode('ascii'))
+                   + ''.join(''.join(row) for row in current_state.board).encode('ascii')
+                   + str(current_remark or '').encode('utf-8'))
+        try:
+            answer = self.ask(message, time_limit + self.grace, 'make_move()')
+        except (AgentTimeout, AgentFailure) as e:
+            if self.on_timeout == 'forfeit':
+                raise
+            if self.conn is None and self.prepare_args is not None:
+                self.restart()
+            return self.default_move(current_state, f"{e}, so a default move is played.")
+        seconds, i, j, *stats = REPLY_HEADER.unpack_from(answer, 1)
+        utterance = answer[1 + REPLY_HEADER.size:].decode('utf-8')
+        for name, value in zip(STATS, stats):
+            if value != MISSING:
+                setattr(self, name, value)
+        if i == NO_MOVE:
+            return [[None, current_state], utterance]
+        new_state = State(old=current_state)
+        new_state.board[i][j] = current_state.whose_move
+        new_state.change_turn()
+        self.last_overhead = time.perf_counter() - start - seconds
+        return [[(i, j), new_state], utterance]
+
+    def restart(self):
+        """Start a new process, after the old one was killed, and send it
+        prepare() without waiting for the answer (see finish_restart)."""
+        self.start()
+        try:
+            self.conn.send_bytes(b'P' + pickle.dumps(self.prepare_args))
+        except OSError:
+            self.failures += 1
+            self.stop()
+            return
+        self.restarting = time.perf_counter() + self.prepare_limit
+
+    def finish_restart(self, limit):
+        """Wait up to limit seconds for the restarted process to prepare.
+
+        Leaves restarting set if it may still do so; stops the process if
+        it failed, or ran past prepare_limit.
+        """
+        deadline = self.restarting
+        try:
+            if self.conn.poll(max(min(limit, deadline - time.perf_counter()), 0)):
+                self.restarting = None
+                if self.conn.recv_bytes()[:1] == b'E':
+                    self.failures += 1
+                    self.stop()
+                return
+        except (EOFError, OSError):
+            self.failures += 1
+            self.stop()
+            return
+        if time.perf_counter() >= deadline:
+            self.timeouts += 1
+            self.stop()
+
+    def default_move(self, state, utterance):
+        empty = [(i, j) for i, row in enumerate(state.board) for j, cell in enumerate(row) if cell == ' ']
+        if not empty:
+            return [[None, state], utterance]
+        i, j = random.choice(empty)
+        new_state = State(old=state)
+        new_state.board[i][j] = state.whose_move
+        new_state.change_turn()
+        return [[(i, j), new_state], utterance]
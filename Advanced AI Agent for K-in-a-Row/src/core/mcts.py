@@ -0,0 +1,347 @@
+'''mcts.py
+
+Monte Carlo tree search (UCT) for K-in-a-Row games.
+
+The board is a flat list of squares i*m + j holding EMPTY, X_STONE,
+O_STONE or FORBIDDEN.  A playout copies the list, shuffles the empty
+squares once and plays them in that order, checking only the windows
+through each new stone (Game_Type.get_windows, so forbidden squares
+never count) for a win; the game is drawn when the turn limit or the
+board runs out.
+
+Each tree node keeps its visit count and the total result (1 for a win,
+0.5 for a draw) for the player who moved into it, and selection picks
+the child with the best UCT value.  A node's untried moves are
+expanded best first: a square that wins at once, then one that stops
+the opponent winning, then squares near the stones
+(Game_Type.get_neighbourhoods), then the rest.  A child that ends the
+game is not played out; its result is known.
+
+The search is anytime: search() runs iterations until its deadline and
+best_move() returns the most visited root move.  set_position() keeps
+the tree between turns: it walks down from the old root along the
+moves that have been played since (found by comparing boards), and
+starts afresh only if it cannot.
+
+MCTSWorkers runs independent trees in worker processes (root
+parallelism): every tree searches the same position until the same
+deadline, and the root visit counts are added up to choose the move.
+'''
+
+import math
+import multiprocessing
+import random
+import time
+from src.core.parallel import GRACE
+
+EMPTY = 0
+X_STONE = 1
+O_STONE = 2
+FORBIDDEN = 3
+EXPLORATION = 0.8 # UCT exploration constant, for results between 0 and 1.
+CHECK_EVERY = 16  # Iterations between clock checks.
+
+STONES = {' ': EMPTY, 'X': X_STONE, 'O': O_STONE, '-': FORBIDDEN}
+
+def flatten(board):
+    """Return a list-of-lists board as a flat list of square codes."""
+    return [STONES[item] for row in board for item in row]
+
+class Node:
+    __slots__ = ('move', 'parent', 'player', 'children', 'untried',
+                 'visits', 'value', 'result')
+
+    def __init__(self, move, parent, player, result=None):
+        self.move = move       # Square played to reach this node.
+        self.parent = parent
+        self.player = player   # X_STONE or O_STONE: who played move.
+        self.children = []
+        self.untried = None    # Squares not yet expanded, best last.
+        self.visits = 0
+        self.value = 0.0       # Total result for player.
+        self.result = result   # Winner (or EMPTY for a draw) if the game is over here.
+
+class MCTS:
+    def __init__(self, game_type, exploration=EXPLORATION, seed=None):
+        self.game_type = game_type
+        self.m = game_type.m
+        self.k = game_type.k
+        self.windows, self.windows_through = game_type.get_windows()
+        self.near_masks, self.center_bits = game_type.get_neighbourhoods()
+        self.initial_stones = sum(row.count('X') + row.count('O')
+                                  for row in game_type.initial_state.board)
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.root = None
+        self.board = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.iterations = 0
+        self.playouts = 0
+        self.reused_visits = 0
+
+    def set_position(self, board, whose_move):
+        """Search from board (a list-of-lists board) with whose_move to move."""
+        self.reset_stats()
+        flat = flatten(board)
+        to_move = X_STONE if whose_move == 'X' else O_STONE
+        node = self.root
+        if node is not None:
+            node = self.follow(flat, to_move)
+        if node is None:
+            node = Node(None, None, O_STONE if to_move == X_STONE else X_STONE)
+        node.parent = None
+        self.root = node
+        self.reused_visits = node.visits
+        self.board = flat
+        stones = sum(1 for item in flat if item in (X_STONE, O_STONE))
+        self.turns_left = min(self.game_type.turn_limit - (stones - self.initial_stones),
+                              flat.count(EMPTY))
+
+    def follow(self, flat, to_move):
+        """Walk the tree from the old root to flat; return the node, or None."""
+        old = self.board
+        added = [sq for sq in range(len(flat)) if flat[sq] != old[sq]]
+        if any(old[sq] != EMPTY for sq in added):
+            return None # Not a later position of the same game.
+        node = self.root
+        mover = O_STONE if node.player == X_STONE else X_STONE
+        while added:
+            mine = [sq for sq in added if flat[sq] == mover]
+            if len(mine) != 1:
+                return None
+            child = None
+            for c in node.children:
+                if c.move == mine[0]:
+                    child = c
+            if child is None:
+                return None
+            added.remove(mine[0])
+            node = child
+            mover = O_STONE if mover == X_STONE else X_STONE
+        if mover != to_move:
+            return None
+        return node
+
+    def advance(self, move):
+        """Make the root's child for move (i, j) the new root, keeping its subtree."""
+        sq = move[0] * self.m + move[1]
+        for child in self.root.children:
+            if child.move == sq:
+                break
+        else:
+            child = Node(sq, None, O_STONE if self.root.player == X_STONE else X_STONE)
+        child.parent = None
+        self.board = list(self.board)
+        self.board[sq] = child.player
+        self.turns_left -= 1
+        self.root = child
+
+    def search(self, deadline):
+        """Run iterations until deadline; return how many were run."""
+        iterations = 0
+        if self.root.result is not None:
+            return 0
+        while True:
+            if iterations % CHECK_EVERY == 0 and time.time() > deadline:
+                break
+            self.iterate()
+            iterations += 1
+        self.iterations += iterations
+        return iterations
+
+    def iterate(self):
+        node = self.root
+        board = list(self.board)
+        ply = 0
+        # Selection: go down through fully expanded nodes.
+        while node.result is None and not node.untried and node.children:
+            node = self.select(node)
+            board[node.move] = node.player
+            ply += 1
+        # Expansion: add one child, best untried move first.
+        if node.result is None:
+            if node.untried is None:
+                node.untried = self.ordered_moves(board, node.player)
+            if node.untried:
+                sq = node.untried.pop()
+                player = O_STONE if node.player == X_STONE else X_STONE
+                board[sq] = player
+                ply += 1
+                child = Node(sq, node, player, self.outcome(board, sq, player, ply))
+                node.children.append(child)
+                node = child
+        # Simulation: a random playout, unless the game is already over.
+        result = node.result
+        if result is None:
+            result = self.playout(board, node.player, self.turns_left - ply)
+            self.playouts += 1
+        # Backpropagation.
+        while node is not None:
+            node.visits += 1
+            if result == node.player:
+                node.value += 1.0
+            elif result == EMPTY:
+                node.value += 0.5
+            node = node.parent
+
+    def select(self, node):
+        log_visits = math.log(node.visits)
+        c = self.exploration
+        best, best_value = None, -1.0
+        for child in node.children:
+            value = child.value / child.visits + c * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def outcome(self, board, sq, player, ply):
+        """The game's result if player's stone at sq ends it, else None."""
+        if self.wins(board, sq, player):
+            return player
+        if ply >= self.turns_left or EMPTY not in board:
+            return EMPTY
+        return None
+
+    def wins(self, board, sq, player):
+        windows = self.windows
+        for w in self.windows_through[sq]:
+            for c in windows[w]:
+                if board[c] != player:
+                    break
+            else:
+                return True
+        return False
+
+    def playout(self, board, last_player, turns):
+        """Play random moves on board (changed in place); return the winner or EMPTY."""
+        empties = [sq for sq in range(len(board)) if board[sq] == EMPTY]
+        self.rng.shuffle(empties)
+        player = last_player
+        for sq in empties[:turns]:
+            player = O_STONE if player == X_STONE else X_STONE
+            board[sq] = player
+            if self.wins(board, sq, player):
+                return player
+        return EMPTY
+
+    def ordered_moves(self, board, last_player):
+        """The empty squares of board, the most promising last (they are popped first)."""
+        player = O_STONE if last_player == X_STONE else X_STONE
+        k = self.k
+        near = 0
+        for sq, item in enumerate(board):
+            if item == X_STONE or item == O_STONE:
+                near |= self.near_masks[sq]
+        if not near:
+            near = self.center_bits
+        windows = self.windows
+        moves = []
+        for sq, item in enumerate(board):
+            if item != EMPTY:
+                continue
+            priority = 1 if near >> sq & 1 else 0
+            for w in self.windows_through[sq]:
+                mine = theirs = 0
+                for c in windows[w]:
+                    if board[c] == player: mine += 1
+                    elif board[c] == last_player: theirs += 1
+                if mine == k - 1 and theirs == 0:
+                    priority = 3
+                    break
+                if theirs == k - 1 and mine == 0:
+                    priority = max(priority, 2)
+            moves.append((priority, self.rng.random(), sq))
+        moves.sort()
+        return [sq for _, _, sq in moves]
+
+    def root_visits(self):
+        """Return {square: visits} for the root's children."""
+        return {child.move: child.visits for child in self.root.children}
+
+    def best_move(self, visits=None):
+        """The most visited root move as (i, j), using visits if given."""
+        if visits is None:
+            visits = self.root_visits()
+        if not visits:
+            # Nothing searched: take the most promising move.
+            moves = self.root.untried or self.ordered_moves(self.board, self.root.player)
+            return divmod(moves[-1], self.m)
+        return divmod(max(visits, key=lambda sq: visits[sq]), self.m)
+
+    def win_rate(self, move):
+        """The fraction of playouts through move won (draws count half) for the side to move."""
+        sq = move[0] * self.m + move[1]
+        for child in self.root.children:
+            if child.move == sq and child.visits:
+                return child.value / child.visits
+        return None
+
+def worker_main(conn, game_type, seed):
+    """Run an MCTS for MCTSWorkers until told to stop (None)."""
+    mcts = MCTS(game_type, seed=seed)
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        number, board, whose_move, deadline = task
+        mcts.set_position(board, whose_move)
+        mcts.search(deadline)
+        conn.send((number, mcts.root_visits(), mcts.playouts))
+
+class MCTSWorkers:
+    def __init__(self, game_type, workers, seed=None):
+        self.connections = []
+        self.processes = []
+        self.task_number = 0
+        base = seed if seed is not None else random.randrange(1 << 30)
+        for index in range(workers):
+            try:
+                parent, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=worker_main,
+                                                  args=(child, game_type, base + index + 1),
+                                                  daemon=True)
+                process.start()
+            except OSError:
+                break # No more processes: go on with the ones we have.
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def start(self, board, whose_move, deadline):
+        """Set every worker searching board until deadline."""
+        self.task_number += 1
+        for conn in self.connections:
+            conn.send((self.task_number, board, whose_move, deadline))
+
+    def collect(self, visits, deadline):
+        """Add the workers' root visit counts into visits; return their playouts."""
+        playouts = 0
+        for conn in self.connections:
+            while True:
+                wait = deadline + GRACE - time.time()
+                try:
+                    if wait <= 0 or not conn.poll(wait):
+                        break
+                    number, counts, count = conn.recv()
+                except (EOFError, OSError):
+                    break # The worker has died.
+                if number == self.task_number:
+                    for sq, n in counts.items():
+                        visits[sq] = visits.get(sq, 0) + n
+                    playouts += count
+                    break
+        return playouts
+
+    def close(self):
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for process in self.processes:
+            process.join(0.1)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
@@ -0,0 +1,189 @@
+'''move_gen.py
+
+Lazy, ordered move generation for searching a BitState.
+
+lazy_moves() is a generator, like RandomPlayer.move_gen, but it yields
+the most promising moves first and does the work for each group of
+moves only when the search asks for it:
+
+  1. the hash move (the best move stored for this position), if legal;
+  2. threats, found from the BitState's window counts:
+     squares that complete k in a row for the side to move,
+     squares that stop the opponent completing k in a row,
+     squares that give the side to move k-1 in an otherwise empty window;
+  3. killer moves: squares that caused a beta cutoff at the same ply
+     elsewhere in the tree (see CutoffHistory);
+  4. every other empty square, sorted by order_rest(state, moves) if given
+     (a static-eval ordering, or CutoffHistory.order).  With near_only,
+     only the BitState's candidate squares (those within the game type's
+     candidate_radius of a stone) are left here; the stages above are
+     never restricted, so a threat far from the stones is still found.
+
+If the position is symmetric (a symmetry of the board layout maps it
+onto itself, as the empty board is under all of them), a move whose
+image under such a symmetry has already been yielded is left out:
+the two children are the same position turned around.
+
+Only moves are yielded; the search makes and unmakes each one on the
+BitState, so a child position exists only while it is being visited.
+After an early cutoff the later groups are never computed at all;
+move_count() says how many moves the generator would have yielded in
+all, without computing them, so the search can count the children it
+never generated.
+'''
+
+def winning_squares(state, player):
+    """Return the set of empty squares that would give player k in a row."""
+    if player == 'X':
+        mine, theirs = state.x_counts, state.o_counts
+    else:
+        mine, theirs = state.o_counts, state.x_counts
+    return window_squares(state, mine, theirs, state.k - 1)
+
+def window_squares(state, mine, theirs, count):
+    """Empty squares of the windows holding count of mine and none of theirs."""
+    squares = set()
+    windows = state.windows
+    empty = state.empty_bits
+    for w in range(len(windows)):
+        if mine[w] == count and theirs[w] == 0:
+            for sq in windows[w]:
+                if empty >> sq & 1:
+                    squares.add(sq)
+    return squares
+
+def threat_squares(state):
+    """Return the threat squares for the side to move, most urgent first."""
+    me = state.whose_move
+    if me == 'X':
+        mine, theirs = state.x_counts, state.o_counts
+    else:
+        mine, theirs = state.o_counts, state.x_counts
+    k = state.k
+    threats = []
+    seen = set()
+    groups = [window_squares(state, mine, theirs, k - 1),
+              window_squares(state, theirs, mine, k - 1)]
+    if k > 2:
+        groups.append(window_squares(state, mine, theirs, k - 2))
+    for group in groups:
+        for sq in sorted(group - seen):
+            threats.append(sq)
+            seen.add(sq)
+    return threats
+
+def move_count(state, near_only=False, tactical=()):
+    """The number of moves lazy_moves() yields for state in all: the
+    empty squares (the candidate squares with near_only, and the
+    tactical ones), one for each set of symmetric images."""
+    bits = state.candidate_bits() if near_only else state.empty_bits
+    for sq in tactical:
+        bits |= 1 << sq
+    stabilizer = state.stabilizer()
+    if not stabilizer:
+        return bin(bits).count('1')
+    count = 0
+    rest = bits
+    while rest:
+        low = rest & -rest
+        sq = low.bit_length() - 1
+        rest ^= low
+        # The stabilizer and the identity form a group: count each set of
+        # images at the smallest of its squares among the moves.
+        if all(perm[sq] >= sq or not bits >> perm[sq] & 1 for perm in stabilizer):
+            count += 1
+    return count
+
+def lazy_moves(state, hash_move=None, order_rest=None, killers=(), tactical=None,
+               near_only=False):
+    """Yield the legal moves of state as (i, j) pairs, best candidates first.
+
+    If tactical is a set, the squares yielded before the rest of the
+    moves (hash move, threats, killers) are added to it as they go.
+    """
+    m = state.m
+    done = 0 # Bit mask of the squares already yielded (or left out).
+    stabilizer = state.stabilizer()
+    if hash_move is not None:
+        sq = hash_move[0] * m + hash_move[1]
+        if state.empty_bits >> sq & 1:
+            done |= 1 << sq
+            if tactical is not None: tactical.add(sq)
+            yield hash_move
+    for sq in threat_squares(state):
+        if not done >> sq & 1:
+            if stabilizer and any(done >> perm[sq] & 1 for perm in stabilizer):
+                done |= 1 << sq
+                continue
+            done |= 1 << sq
+            if tactical is not None: tactical.add(sq)
+            yield divmod(sq, m)
+    for sq in killers:
+        if state.empty_bits >> sq & 1 and not done >> sq & 1:
+            if stabilizer and any(done >> perm[sq] & 1 for perm in stabilizer):
+                continue
+            done |= 1 << sq
+            if tactical is not None: tactical.add(sq)
+            yield divmod(sq, m)
+    rest = (state.candidate_bits() if near_only else state.empty_bits) & ~done
+    moves = []
+    while rest:
+        low = rest & -rest
+        sq = low.bit_length() - 1
+        rest ^= low
+        if stabilizer:
+            if any(done >> perm[sq] & 1 for perm in stabilizer):
+                continue
+            done |= low
+        moves.append(divmod(sq, m))
+    if order_rest is not None and len(moves) > 1:
+        moves = order_rest(state, moves)
+    for move in moves:
+        yield move
+
+class CutoffHistory:
+    """Killer moves and history scores, learned from beta cutoffs.
+
+    killers[ply] holds the squares of the last KILLERS_PER_PLY moves that
+    caused a cutoff at that ply (most recent first); a move that refutes
+    one line often refutes its siblings too.  history[side][sq] adds
+    depth**2 for every cutoff caused by side playing sq, so the squares
+    that keep proving good are tried early everywhere.
+
+    Both are kept across the passes of iterative deepening.  new_turn()
+    shifts the killers by the two plies the game has moved on and halves
+    the history scores, so old knowledge fades but is not thrown away.
+    """
+
+    KILLERS_PER_PLY = 2
+
+    def __init__(self, squares, max_ply=128):
+        self.killers = [[] for _ in range(max_ply)]
+        self.history = {'X': [0] * squares, 'O': [0] * squares}
+
+    def killer_moves(self, ply):
+        if ply < len(self.killers):
+            return self.killers[ply]
+        return ()
+
+    def record_cutoff(self, state, move, depth, ply):
+        """Note that move, for the side to move in state, caused a cutoff."""
+        sq = move[0] * state.m + move[1]
+        if ply < len(self.killers):
+            slots = self.killers[ply]
+            if sq in slots:
+                slots.remove(sq)
+            slots.insert(0, sq)
+            del slots[self.KILLERS_PER_PLY:]
+        self.history[state.whose_move][sq] += max(depth, 1) ** 2
+
+    def order(self, state, moves):
+        """Sort moves by history score, highest first (stable on ties)."""
+        scores = self.history[state.whose_move]
+        m = state.m
+        return sorted(moves, key=lambda move: -scores[move[0] * m + move[1]])
+
+    def new_turn(self, plies=2):
+        self.killers = self.killers[plies:] + [[] for _ in range(plies)]
+        for side, scores in self.history.items():
+            self.history[side] = [score >> 1 for score in scores]
@@ -0,0 +1,211 @@
+'''opening_book.py
+
+Opening books: the first moves of a game, searched deeply once, offline.
+
+The opening is where the branching factor is largest and a search at
+game speed sees least, so build_book() searches every position of the
+first plies of a game with an agent's own search, for as long as it is
+told, and keeps the move it chose.  Positions are enumerated under the
+board's symmetries: children with the same canonical key (see
+BitState.canonical_key) are searched once, and the move is stored in
+the canonical frame, so one entry serves every symmetric image.
+
+An OpeningBook maps canonical keys to (move, score, depth) in a dict,
+so an agent looks a position up in O(1).  On disk a book is a short
+header followed by four packed arrays (64-bit keys, 16-bit squares,
+32-bit scores from X's point of view, 8-bit depths), 15 bytes a
+position.  The header holds the game type's
+fingerprint (k, the board size, the turn limit and the initial
+position), and a book whose fingerprint does not match the game is
+not loaded.
+
+Books are built per agent, since they hold that agent's moves, by
+running this module:
+
+  python -m src.core.opening_book sguptasr FIAR --plies 2 --seconds 2
+  python -m src.core.opening_book kchua220 custom --k 4 --n 6 --m 6
+
+The agent module must provide parallel_helper(game_type), returning
+(search, make_root) as for ParallelSearch.  The book is written to
+book_path(agent, game_type) in assets/books, where agents look for it
+in prepare().
+'''
+
+import argparse
+import hashlib
+import importlib
+import os
+import time
+from array import array
+from src.core.game_types import GAME_TYPES, custom_game_type
+from src.core.move_gen import lazy_moves
+from src.core.search import TimeBudget
+
+MAGIC = b'KBOOK1\n'
+BOOK_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                         '..', '..', 'assets', 'books'))
+
+def fingerprint(game_type):
+    """A string that changes whenever the rules or the starting position do."""
+    board = '/'.join(''.join(row) for row in game_type.initial_state.board)
+    return (f"k={game_type.k} n={game_type.n} m={game_type.m} "
+            f"turns={game_type.turn_limit} {board} {game_type.initial_state.whose_move}")
+
+def book_path(agent, game_type):
+    """Where the book of agent (e.g. 'sguptasr') for game_type is kept."""
+    name = ''.join(c if c.isalnum() else '-' for c in game_type.short_name)
+    digest = hashlib.sha1(fingerprint(game_type).encode()).hexdigest()[:8]
+    return os.path.join(BOOK_DIR, f"{agent}_{name}_{digest}.book")
+
+class OpeningBook:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.entries = {} # Canonical key -> (canonical square, score, depth searched).
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, state, move, score, depth):
+        """Record move (i, j) as the book move of state (a BitState)."""
+        key, t = state.canonical_key()
+        self.entries[key] = (state.canonical_square(state.square(move), t),
+                             int(round(score)), depth)
+
+    def lookup(self, state):
+        """Return (move, score, depth) for state (a BitState), or None if
+        it is not in the book."""
+        key, t = state.canonical_key()
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        sq = state.real_square(entry[0], t)
+        if not state.empty_bits >> sq & 1:
+            return None # A hash collision.
+        return divmod(sq, state.m), entry[1], entry[2]
+
+    def save(self, path):
+        keys, squares, scores, depths = array('Q'), array('H'), array('i'), array('B')
+        for key, (sq, score, depth) in self.entries.items():
+            keys.append(key)
+            squares.append(sq)
+            scores.append(score)
+            depths.append(min(depth, 255))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(self.fingerprint.encode() + b'\n')
+            f.write(array('I', [len(keys)]).tobytes())
+            for a in (keys, squares, scores, depths):
+                f.write(a.tobytes())
+
+    @staticmethod
+    def load(path, game_type):
+        """Return the book at path, or None if there is none for game_type."""
+        try:
+            with open(path, 'rb') as f:
+                if f.readline() != MAGIC:
+                    return None
+                if f.readline().decode().rstrip('\n') != fingerprint(game_type):
+                    return None
+                count = array('I')
+                count.fromfile(f, 1)
+                keys, squares, scores, depths = array('Q'), array('H'), array('i'), array('B')
+                for a in (keys, squares, scores, depths):
+                    a.fromfile(f, count[0])
+        except (OSError, EOFError, UnicodeDecodeError):
+            return None
+        book = OpeningBook(fingerprint(game_type))
+        book.entries = dict(zip(keys, zip(squares, scores, depths)))
+        return book
+
+def build_book(game_type, helper, plies, seconds, width=None, report=None):
+    """Search the positions of the first plies of game_type; return an OpeningBook.
+
+    helper(game_type) gives (search, make_root) as for ParallelSearch.
+    Each position is searched for seconds.  With width, only the first
+    width moves in the search's own order are followed from each
+    position (so a book can go deeper); otherwise every move is.
+    report(ply, done, total) is called after each position.
+    """
+    search, make_root = helper(game_type)
+    # Search as the agents do in play.
+    search.pvs = search.aspiration = search.reductions = search.near_only = True
+    budget = TimeBudget(game_type)
+    book = OpeningBook(fingerprint(game_type))
+    layer = [game_type.initial_state]
+    seen = set()
+    for ply in range(plies):
+        next_layer = []
+        for done, state in enumerate(layer, 1):
+            root = make_root(state)
+            turns_left = budget.turns_left(root)
+            if turns_left > 0 and root.winner() is None:
+                if search.table is not None:
+                    search.table.new_search()
+                if search.history is not None:
+                    search.history.new_turn()
+                search.reset_stats()
+                result = search.iterative_deepening(root, time.time() + seconds,
+                                                    turns_left=turns_left)
+                book.add(root, result.move, result.score, result.depth)
+                if ply + 1 < plies:
+                    next_layer += expand(root, search, width, seen)
+            if report is not None:
+                report(ply, done, len(layer))
+        layer = next_layer
+    return book
+
+def expand(root, search, width, seen):
+    """Return the positions after root's moves (one per symmetry class) not yet seen."""
+    if width is None:
+        moves = root.legal_moves()
+    else:
+        moves = []
+        for move in lazy_moves(root, search.table_move(root), search.order_moves):
+            moves.append(move)
+            if len(moves) == width:
+                break
+    children = []
+    for move in moves:
+        root.make_move(move)
+        key = root.canonical_key()[0]
+        if key not in seen:
+            seen.add(key)
+            children.append(root.to_state())
+        root.unmake_move()
+    return children
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an opening book for an agent.')
+    parser.add_argument('agent', help="agent module prefix, e.g. sguptasr")
+    parser.add_argument('game', choices=sorted(GAME_TYPES) + ['custom'])
+    parser.add_argument('--plies', type=int, default=2, help='plies covered by the book')
+    parser.add_argument('--seconds', type=float, default=2.0, help='search time per position')
+    parser.add_argument('--width', type=int, default=None,
+                        help='follow only this many best moves from each position')
+    parser.add_argument('--k', type=int)
+    parser.add_argument('--n', type=int)
+    parser.add_argument('--m', type=int)
+    args = parser.parse_args()
+    if args.game == 'custom':
+        if None in (args.k, args.n, args.m):
+            parser.error('custom games need --k, --n and --m')
+        game_type = custom_game_type(args.k, args.n, args.m)
+    else:
+        game_type = GAME_TYPES[args.game]
+    helper = importlib.import_module(f"src.agents.{args.agent}_KInARow").parallel_helper
+
+    def report(ply, done, total):
+        if done % 10 == 0 or done == total:
+            print(f"\rply {ply + 1}/{args.plies}: {done}/{total} positions", end='', flush=True)
+        if done == total:
+            print()
+
+    start = time.time()
+    book = build_book(game_type, helper, args.plies, args.seconds, args.width, report)
+    path = book_path(args.agent, game_type)
+    book.save(path)
+    print(f"{len(book)} positions in {time.time() - start:.0f} seconds, saved to {path}")
+
+if __name__ == '__main__':
+    main()
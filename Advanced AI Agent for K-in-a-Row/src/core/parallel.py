@@ -0,0 +1,155 @@
+'''parallel.py
+
+Root-splitting parallel search over worker processes.
+
+ParallelSearch starts its worker processes once (an agent does this in
+prepare()) and keeps them for the whole game.  Each worker builds its
+own Search, transposition table and cutoff history by calling
+helper(game_type), which must be a picklable function returning
+(search, make_root): make_root(state) turns a game_types.State into
+the BitState the search runs on (with the agent's evaluator attached).
+
+For each move the root moves are put in the agent's order and dealt out
+in turn, so every process gets some of the most promising ones; the
+agent's own process searches its share too.  Everyone deepens its
+share up to the same deadlines, and the results are merged at the
+deepest depth that every process completed, so the scores compared are
+of equal depth.  A win found by any process is played at once.
+
+A worker that has not answered by the hard deadline (plus GRACE) is
+left out of the merge; its late answer is recognised by its task number
+and thrown away.  If the processes cannot be started, or the root has
+too few moves to share, the search simply runs in one process.
+'''
+
+import multiprocessing
+import time
+from src.core.game_types import State
+from src.core.move_gen import lazy_moves
+from src.core.search import WIN_BOUND
+
+GRACE = 0.02 # Seconds to wait for a worker after the hard deadline.
+OPTIONS = ('pvs', 'aspiration', 'aspiration_window', 'reductions', 'near_only')
+STATS = ('nodes', 'static_evals', 'cutoffs', 'children_skipped', 're_searches')
+
+def worker_main(conn, helper, game_type):
+    """Run searches for a ParallelSearch until told to stop (None)."""
+    search, make_root = helper(game_type)
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        number, board, whose_move, root_moves, hard, soft, turns_left, first_line, options = task
+        for name, value in options.items():
+            setattr(search, name, value)
+        if search.table is not None:
+            search.table.new_search()
+        if search.history is not None:
+            search.history.new_turn()
+        root = make_root(State(initial_state_data=[board, whose_move]))
+        search.reset_stats()
+        search.root_moves = set(root_moves)
+        search.iterative_deepening(root, hard, soft, turns_left=turns_left,
+                                   first_line=first_line)
+        stats = {name: getattr(search, name) for name in STATS}
+        if search.table is not None:
+            stats['table_stores'] = search.table.stores
+            stats['table_hits'] = search.table.hits
+        conn.send((number, search.completed, stats))
+
+class ParallelSearch:
+    def __init__(self, helper, game_type, workers):
+        self.connections = []
+        self.processes = []
+        self.task_number = 0
+        self.reset_stats()
+        for _ in range(workers):
+            try:
+                parent, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=worker_main,
+                                                  args=(child, helper, game_type),
+                                                  daemon=True)
+                process.start()
+            except OSError:
+                break # No more processes: go on with the ones we have.
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def reset_stats(self):
+        self.helper_stats = dict.fromkeys(STATS + ('table_stores', 'table_hits'), 0)
+
+    def search(self, search, root, hard_deadline, soft_deadline, turns_left, first_line=None):
+        """Search root with search and the workers; return a SearchResult.
+
+        The workers' counters are added up in helper_stats.
+        """
+        self.reset_stats()
+        search.root_moves = None
+        workers = len(self.connections)
+        moves = list(lazy_moves(root, search.table_move(root), search.order_moves,
+                                near_only=search.near_only))
+        if workers == 0 or len(moves) < 2 * (workers + 1):
+            return search.iterative_deepening(root, hard_deadline, soft_deadline,
+                                              turns_left=turns_left, first_line=first_line)
+        self.task_number += 1
+        shares = [moves[i::workers + 1] for i in range(workers + 1)]
+        board = root.to_board()
+        options = {name: getattr(search, name) for name in OPTIONS}
+        for conn, share in zip(self.connections, shares[1:]):
+            conn.send((self.task_number, board, root.whose_move, share,
+                       hard_deadline, soft_deadline, turns_left, first_line, options))
+        search.root_moves = set(shares[0])
+        try:
+            result = search.iterative_deepening(root, hard_deadline, soft_deadline,
+                                                turns_left=turns_left, first_line=first_line)
+        finally:
+            search.root_moves = None
+        runs = [search.completed]
+        for conn in self.connections:
+            runs.append(self.collect(conn, hard_deadline + GRACE))
+        runs = [run for run in runs if run]
+        if not runs:
+            return result # Nobody finished even depth 1.
+        return self.merge(root, runs)
+
+    def collect(self, conn, deadline):
+        """Return the completed results of conn's current task, or None if it is late."""
+        while True:
+            wait = deadline - time.time()
+            try:
+                if wait <= 0 or not conn.poll(wait):
+                    return None
+                number, completed, stats = conn.recv()
+            except (EOFError, OSError):
+                return None # The worker has died.
+            if number == self.task_number:
+                for name, value in stats.items():
+                    self.helper_stats[name] += value
+                return completed
+
+    def merge(self, root, runs):
+        """Pick the best move at the deepest depth every run completed."""
+        sign = 1 if root.whose_move == 'X' else -1
+        wins = [run[-1] for run in runs if sign * run[-1].score >= WIN_BOUND]
+        if wins:
+            return max(wins, key=lambda result: sign * result.score)
+        depth = min(run[-1].depth for run in runs)
+        candidates = []
+        for run in runs:
+            for result in run:
+                if result.depth == depth:
+                    candidates.append(result)
+        return max(candidates, key=lambda result: sign * result.score)
+
+    def close(self):
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for process in self.processes:
+            process.join(0.1)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
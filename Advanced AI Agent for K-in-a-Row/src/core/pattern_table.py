@@ -0,0 +1,73 @@
+'''pattern_table.py
+
+Lookup tables that score a line of a K-in-a-Row board by its base-3 code.
+
+A line is a maximal run of non-forbidden squares (Game_Type.get_lines).
+Its code is the sum of digit * 3**position over its squares, where the
+digit is 0 for empty, 1 for X and 2 for O.  Forbidden squares never
+appear inside a line, so a table for lines of length L has exactly 3**L
+entries, and any static evaluation that is a sum over windows or
+sequences lying inside lines becomes a sum of table lookups.
+
+Tables are built once per board layout and scoring scheme, and kept in
+a module-level cache so that every game of the same type (and every
+agent instance using the same scheme) shares them.
+'''
+
+TABLE_MAX_LENGTH = 9 # Longer lines are scored on demand and remembered.
+
+_TABLES = {}
+
+class LazyScores(dict):
+    """A dict of code -> score that scores unseen codes when first asked."""
+    def __init__(self, length, cells_score):
+        super().__init__()
+        self.length = length
+        self.cells_score = cells_score
+
+    def __missing__(self, code):
+        score = self[code] = self.cells_score(decode(code, self.length))
+        return score
+
+def decode(code, length):
+    """Return the cells of a line code: a tuple of 0 (empty), 1 (X) or 2 (O)."""
+    cells = []
+    for _ in range(length):
+        code, digit = divmod(code, 3)
+        cells.append(digit)
+    return tuple(cells)
+
+def encode(cells):
+    code = 0
+    for digit in reversed(cells):
+        code = code * 3 + digit
+    return code
+
+def layout_key(game_type):
+    """Game types with the same k, size and forbidden squares share tables."""
+    board = game_type.initial_state.board
+    forbidden = tuple(i * game_type.m + j
+                      for i, row in enumerate(board)
+                      for j, item in enumerate(row) if item == '-')
+    return (game_type.k, game_type.n, game_type.m, forbidden)
+
+def get_line_tables(game_type, scheme_name, cells_score):
+    """Return {length: scores} for every line length of game_type.
+
+    scores[code] is cells_score(decode(code, length)).  scheme_name
+    identifies cells_score in the cache, so it must be unique per
+    scoring scheme.
+    """
+    key = (layout_key(game_type), scheme_name)
+    tables = _TABLES.get(key)
+    if tables is None:
+        lines, _ = game_type.get_lines()
+        tables = {}
+        for length in sorted(set(len(line) for line in lines)):
+            if length <= TABLE_MAX_LENGTH:
+                tables[length] = [cells_score(decode(code, length))
+                                  for code in range(3 ** length)]
+            else:
+                tables[length] = LazyScores(length, cells_score)
+        _TABLES[key] = tables
+    return tables
@@ -0,0 +1,92 @@
+'''ponder.py
+
+Pondering: searching on the opponent's time.
+
+When an agent has played its move, the second move of its principal
+variation is the reply it expects.  Ponderer.start() makes that reply
+on the BitState and runs the agent's own Search on the result in a
+background thread, deepening until it is stopped (or for at most
+max_seconds).  It fills the agent's transposition table and history
+tables as any search does, so the agent's next search profits from it
+even when the prediction was wrong, for the positions the two share.
+
+At its next move the agent calls finish() with the real position,
+before touching its search.  finish() stops the thread (the search
+notices within CHECK_EVERY nodes; see search.py) and, if the opponent
+played the predicted reply, returns the deepest result completed, with
+elapsed the seconds it searched; otherwise it drops it and returns
+None.  settles() says whether that result can be played without
+searching again: only if it is a proof (an exact result, with every
+line searched to the end of the game; see search.py), or if the
+ponder search ran at least as long as the move's own search would.
+
+The ponder thread shares the interpreter with the rest of the process,
+so pondering only gains time when the opponent does not need the CPU
+of this process: a human at the keyboard (input() lets other threads
+run), or an agent in another process.  Two agents in one process would
+just slow each other down, so agents leave it off unless asked.
+'''
+
+import threading
+import time
+
+PONDER_LIMIT = 60.0 # Longest a ponder search runs if it is never stopped.
+
+class Ponderer:
+    def __init__(self, search, max_seconds=PONDER_LIMIT):
+        self.search = search
+        self.max_seconds = max_seconds
+        self.thread = None
+        self.position = None # (x_bits, o_bits, whose_move) after the predicted reply.
+        self.completed = []
+        self.started = 0
+        self.elapsed = 0
+        self.outcome = None  # 'hit' or 'miss', for the last finish().
+
+    def start(self, state, reply, turns_left):
+        """Ponder state (a BitState, which the ponderer keeps) after reply."""
+        self.stop()
+        state.make_move(reply)
+        self.position = (state.x_bits, state.o_bits, state.whose_move)
+        self.completed = []
+        self.started = time.time()
+        self.thread = threading.Thread(target=self.run, args=(state, turns_left - 1), daemon=True)
+        self.thread.start()
+
+    def run(self, state, turns_left):
+        search = self.search
+        if search.table is not None:
+            search.table.new_search()
+        search.reset_stats()
+        search.iterative_deepening(state, time.time() + self.max_seconds, turns_left=turns_left)
+        self.completed = list(search.completed)
+
+    def stop(self):
+        """Stop the ponder search, if one is running, and wait for it."""
+        if self.thread is None:
+            return
+        while self.thread.is_alive():
+            # Set again until the thread sees it: a search just starting sets its own.
+            self.search.hard_deadline = 0
+            self.thread.join(0.005)
+        self.elapsed = time.time() - self.started
+        self.thread = None
+
+    def finish(self, state):
+        """Stop pondering; return the deepest SearchResult for state (a
+        BitState) if it is the position pondered, else None."""
+        self.outcome = None
+        if self.position is None:
+            return None
+        self.stop()
+        hit = self.position == (state.x_bits, state.o_bits, state.whose_move)
+        self.position = None
+        self.outcome = 'hit' if hit else 'miss'
+        if not hit or not self.completed:
+            return None
+        return self.completed[-1]
+
+    def settles(self, result, seconds):
+        """True if result, from finish(), can be played at once by a move
+        that would search for seconds."""
+        return result is not None and (result.exact or self.elapsed >= seconds)
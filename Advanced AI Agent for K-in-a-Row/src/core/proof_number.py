@@ -0,0 +1,219 @@
+'''proof_number.py
+
+Depth-first proof-number search (df-pn): solves a K-in-a-Row position.
+
+Each node carries a proof number (how many leaves at least must still
+be shown to succeed to prove it) and a disproof number, kept in
+negamax form: phi is the number for the side to move succeeding, delta
+the number for it failing, and
+
+  phi(node) = min(delta(child))    delta(node) = sum(phi(child)).
+
+The search always expands the child that is cheapest to prove, and a
+df-pn node keeps working below it, without going back to the root,
+until its numbers pass the thresholds handed down from its parent (with
+the 1 + EPSILON trick to avoid thrashing between two close children).
+So it goes straight for the smallest proof, instead of searching every
+move to the same depth as alpha-beta does.
+
+Proof-number search proves a yes/no goal, so solve() asks two:
+  1. can the side to move win?  If so, the position is a win;
+  2. if not, can it at least draw?  If so a draw, otherwise a loss.
+The game ends in a draw when the board fills up or the turn limit is
+reached; a root where that has already happened is a draw, and one
+where the opponent has already won a loss, with no move to play.  A child is scored on the spot if the player to move can
+complete k at once, or if the player the goal depends on can no longer
+fill any window (one free of the other side's stones, needing no more
+stones than that player has turns left).
+
+Results are kept in a dict under the BitState's canonical key, so
+symmetric positions (very common on an empty custom board) are solved
+once.  The dict holds at most max_entries positions: when full, the
+unsolved ones are dropped (and all of them if that is not enough, in
+which case a proved position may be left without a move known to prove
+it, and is reported unsolved).  The search stops, leaving the position
+unsolved, after max_nodes nodes or at its deadline.
+'''
+
+import time
+from src.core.move_gen import winning_squares
+from src.core.search import SearchTimeout, WIN_SCORE, CHECK_EVERY
+
+INFINITY = 10 ** 9
+EPSILON = 0.25
+DEFAULT_MAX_NODES = 1000000
+DEFAULT_MAX_ENTRIES = 500000
+
+WIN = 'win'
+DRAW = 'draw'
+LOSS = 'loss'
+
+class ProofResult:
+    def __init__(self, outcome, move, nodes):
+        self.outcome = outcome # WIN, DRAW or LOSS for the side to move; None if unsolved.
+        self.move = move       # A move that achieves the outcome (for WIN and DRAW; None if the game is over).
+        self.nodes = nodes
+
+    def score(self, player):
+        """The outcome as a score from X's point of view (player is the side to move)."""
+        score = {WIN: WIN_SCORE, DRAW: 0, LOSS: -WIN_SCORE}[self.outcome]
+        return score if player == 'X' else -score
+
+class ProofNumberSearch:
+    def __init__(self, max_nodes=DEFAULT_MAX_NODES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_nodes = max_nodes
+        self.max_entries = max_entries
+        self.table = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.prunes = 0
+
+    def solve(self, state, turns_left=None, deadline=None):
+        """Return a ProofResult for the side to move in state (a BitState)."""
+        self.reset_stats()
+        self.deadline = deadline
+        if turns_left is None:
+            turns_left = state.num_empty()
+        self.turns_left = turns_left
+        self.root_ply = len(state.history)
+        if state.has_win('O' if state.whose_move == 'X' else 'X'):
+            return ProofResult(LOSS, None, self.nodes)
+        if turns_left <= 0 or state.empty_bits == 0:
+            return ProofResult(DRAW, None, self.nodes)
+        try:
+            for outcome in (WIN, DRAW):
+                if self.prove(state, outcome):
+                    move = self.proving_move(state)
+                    if move is None:
+                        # The table was cleared under the proof: a verdict with
+                        # no move to play for it counts as unsolved.
+                        return ProofResult(None, None, self.nodes)
+                    return ProofResult(outcome, move, self.nodes)
+        except SearchTimeout:
+            return ProofResult(None, None, self.nodes)
+        return ProofResult(LOSS, None, self.nodes)
+
+    def prove(self, state, goal):
+        """True if the side to move can get at least goal (WIN or DRAW)."""
+        self.attacker = state.whose_move
+        self.goal = goal
+        self.table = {}
+        phi, delta = self.mid(state, INFINITY, INFINITY)
+        return phi == 0
+
+    def proving_move(self, state):
+        for move, key, value in self.children(state):
+            if value is None:
+                value = self.table.get(key, (1, 1))
+            if value[1] == 0: # The opponent fails after this move.
+                return move
+        return None
+
+    def mid(self, state, phi_th, delta_th):
+        """Search state until its numbers reach a threshold; return (phi, delta)."""
+        self.nodes += 1
+        if self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+        if self.deadline is not None and self.nodes % CHECK_EVERY == 0 \
+                and time.time() > self.deadline:
+            raise SearchTimeout()
+        key = state.canonical_key()[0]
+        children = self.children(state)
+        table = self.table
+        while True:
+            phi, delta = INFINITY, 0
+            best, best_phi, second = None, 0, INFINITY
+            for child in children:
+                value = child[2]
+                if value is None:
+                    value = table.get(child[1], (1, 1))
+                child_phi, child_delta = value
+                if child_delta < phi:
+                    second = phi
+                    phi = child_delta
+                    best, best_phi = child, child_phi
+                elif child_delta < second:
+                    second = child_delta
+                delta = min(delta + child_phi, INFINITY)
+            if phi >= phi_th or delta >= delta_th:
+                self.store(key, phi, delta)
+                return phi, delta
+            child_phi_th = min(delta_th - delta + best_phi, INFINITY)
+            child_delta_th = min(phi_th, int(second * (1 + EPSILON)) + 1)
+            state.make_move(best[0])
+            try:
+                self.mid(state, child_phi_th, child_delta_th)
+            finally:
+                state.unmake_move()
+
+    def children(self, state):
+        """Return [move, key, value] for each move, value being (phi, delta)
+        for a child whose result is already known and None otherwise."""
+        children = []
+        m = state.m
+        done = 0
+        stabilizer = state.stabilizer()
+        mover = state.whose_move
+        bits = state.empty_bits
+        while bits:
+            low = bits & -bits
+            sq = low.bit_length() - 1
+            bits ^= low
+            if stabilizer:
+                # A symmetric image of an earlier move leads to the same position.
+                if any(done >> perm[sq] & 1 for perm in stabilizer):
+                    continue
+                done |= low
+            move = divmod(sq, m)
+            state.make_move(move)
+            children.append([move, state.canonical_key()[0], self.known_value(state, mover)])
+            state.unmake_move()
+        return children
+
+    def known_value(self, state, mover):
+        """(phi, delta) of a position decided at once, just after mover moved, or None."""
+        ply = len(state.history) - self.root_ply
+        defender = 'O' if self.attacker == 'X' else 'X'
+        if state.has_win(mover):
+            goal_met = mover == self.attacker
+        elif state.empty_bits == 0 or ply >= self.turns_left:
+            goal_met = self.goal == DRAW
+        elif winning_squares(state, state.whose_move):
+            goal_met = state.whose_move == self.attacker
+        elif self.goal == WIN and not self.can_still_win(state, self.attacker, ply):
+            goal_met = False
+        elif self.goal == DRAW and not self.can_still_win(state, defender, ply):
+            goal_met = True
+        else:
+            return None
+        if goal_met == (state.whose_move == self.attacker):
+            return (0, INFINITY)
+        return (INFINITY, 0)
+
+    def can_still_win(self, state, player, ply):
+        """True if some window free of the opponent's stones can still be
+        filled by player in the turns left."""
+        turns = self.turns_left - ply
+        moves = (turns + 1) // 2 if state.whose_move == player else turns // 2
+        if player == 'X':
+            mine, theirs = state.x_counts, state.o_counts
+        else:
+            mine, theirs = state.o_counts, state.x_counts
+        need = state.k - moves
+        for w in range(len(mine)):
+            if theirs[w] == 0 and mine[w] >= need:
+                return True
+        return False
+
+    def store(self, key, phi, delta):
+        table = self.table
+        if len(table) >= self.max_entries and key not in table:
+            # Keep only what is solved; unsolved numbers can be found again.
+            self.prunes += 1
+            for old in [old for old, value in table.items() if value[0] and value[1]]:
+                del table[old]
+            if len(table) >= self.max_entries // 2:
+                table.clear()
+        table[key] = (phi, delta)
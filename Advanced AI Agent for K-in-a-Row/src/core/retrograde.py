@@ -0,0 +1,233 @@
+'''retrograde.py
+
+Perfect-play tables for small K-in-a-Row boards.
+
+solve() visits every position reachable from a game type's starting
+position (once per symmetry class, by BitState canonical key) with a
+memoized negamax search, and records for each one its game-theoretic
+value and a best move.  There is no cutoff: every move of every
+position is searched, so the table covers any position a game can
+reach, whatever either player has done.
+
+Values are kept in plies: +d is a win for the side to move in d plies,
+-d a loss in d plies and 0 a draw, so the best move is the fastest win,
+or else a draw, or else the slowest loss.  The game is drawn when the
+board fills up or the turn limit is reached; since every move adds a
+stone, the turns left follow from the position itself.
+
+A PerfectPlayTable is written as a header, padded to 8 bytes, and three
+arrays sorted by key: 64-bit canonical keys, the signed value (1 byte)
+and the best move's square in the canonical frame (1 byte), 10 bytes a
+position.  load() memory-maps the file, so opening a table costs next
+to nothing and only the pages a lookup touches are read; a lookup is a
+binary search over the keys.  As for opening books (opening_book.py),
+the header holds the game type's fingerprint, and a table built for
+other rules is not loaded.
+
+Build a table by running this module, e.g.
+
+  python -m src.core.retrograde TTT
+  python -m src.core.retrograde custom --k 3 --n 4 --m 4
+
+It is written to table_path(game_type) in assets/tables, where the
+agents look for it in prepare().  TTT has 630 positions (not counting
+those already won) and 4x4 with k = 3 about 430,000, solved in half a
+minute; boards much past 16 squares get slow in Python,
+so solve() stops with TableTooLarge after max_positions.
+'''
+
+import argparse
+import bisect
+import hashlib
+import mmap
+import os
+import sys
+import time
+from array import array
+from src.core.bitboard import BitState
+from src.core.game_types import TTT, custom_game_type
+from src.core.opening_book import fingerprint
+from src.core.proof_number import WIN, DRAW, LOSS
+
+MAGIC = b'KTABLE1\n'
+NO_MOVE = 255
+WIN_VALUE = 127 # Values are kept as WIN_VALUE - plies for a win.
+DEFAULT_MAX_POSITIONS = 5000000
+TABLE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          '..', '..', 'assets', 'tables'))
+
+class TableTooLarge(Exception):
+    pass
+
+def table_path(game_type):
+    """Where the perfect-play table for game_type is kept."""
+    name = ''.join(c if c.isalnum() else '-' for c in game_type.short_name)
+    digest = hashlib.sha1(fingerprint(game_type).encode()).hexdigest()[:8]
+    return os.path.join(TABLE_DIR, f"{name}_{game_type.n}x{game_type.m}_{digest}.table")
+
+def solve(game_type, max_positions=DEFAULT_MAX_POSITIONS):
+    """Return {canonical key: (value, canonical square)} for every
+    position reachable in game_type; value is from the side to move's
+    point of view, in WIN_VALUE - plies form."""
+    if game_type.n * game_type.m >= NO_MOVE:
+        raise TableTooLarge()
+    state = BitState(game_type)
+    initial_stones = bin(state.x_bits | state.o_bits).count('1')
+    memo = {}
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 4 * game_type.n * game_type.m + 100))
+    try:
+        negamax(state, memo, game_type.turn_limit + initial_stones, max_positions)
+    finally:
+        sys.setrecursionlimit(limit)
+    return memo
+
+def negamax(state, memo, last_stone, max_positions):
+    """Value of state for the side to move (solving its subtree into memo)."""
+    key, t = state.canonical_key()
+    known = memo.get(key)
+    if known is not None:
+        return known[0]
+    if len(memo) >= max_positions:
+        raise TableTooLarge()
+    stones = bin(state.x_bits | state.o_bits).count('1')
+    best, best_sq = None, NO_MOVE
+    if stones < last_stone:
+        mover = state.whose_move
+        bits = state.empty_bits
+        done = 0
+        stabilizer = state.stabilizer()
+        while bits:
+            low = bits & -bits
+            sq = low.bit_length() - 1
+            bits ^= low
+            if stabilizer:
+                # A symmetric image of an earlier move leads to the same position.
+                if any(done >> perm[sq] & 1 for perm in stabilizer):
+                    continue
+                done |= low
+            state.make_move(divmod(sq, state.m))
+            if state.has_win(mover):
+                value = WIN_VALUE - 1
+            else:
+                value = -negamax(state, memo, last_stone, max_positions)
+                if value > 0: value -= 1
+                elif value < 0: value += 1
+            state.unmake_move()
+            if best is None or value > best:
+                best, best_sq = value, sq
+    if best is None:
+        best = 0 # The board is full or the turn limit is reached: a draw.
+    else:
+        best_sq = state.canonical_square(best_sq, t)
+    memo[key] = (best, best_sq)
+    return best
+
+class PerfectPlayTable:
+    def __init__(self, game_type, keys, values, moves, source=None):
+        self.game_type = game_type
+        self.keys = keys
+        self.values = values
+        self.moves = moves
+        self.source = source # The mmap the arrays are views of, if loaded.
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def build(game_type, max_positions=DEFAULT_MAX_POSITIONS):
+        memo = solve(game_type, max_positions)
+        keys = array('Q', sorted(memo))
+        values = array('b', [memo[key][0] for key in keys])
+        moves = array('B', [memo[key][1] for key in keys])
+        return PerfectPlayTable(game_type, keys, values, moves)
+
+    def save(self, path):
+        header = MAGIC + fingerprint(self.game_type).encode() + b'\n'
+        header += b' ' * (-(len(header) + 8) % 8)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.write(array('Q', [len(self.keys)]).tobytes())
+            for a in (self.keys, self.values, self.moves):
+                f.write(a.tobytes())
+
+    @staticmethod
+    def load(path, game_type):
+        """Memory-map the table at path; return None if there is none for game_type."""
+        try:
+            with open(path, 'rb') as f:
+                source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        header = (MAGIC + fingerprint(game_type).encode() + b'\n')
+        if source[:len(header)] != header:
+            source.close()
+            return None
+        start = len(header) + (-(len(header) + 8) % 8)
+        view = memoryview(source)
+        count = view[start:start + 8].cast('Q')[0]
+        start += 8
+        if len(source) != start + 10 * count:
+            view.release()
+            source.close()
+            return None
+        keys = view[start:start + 8 * count].cast('Q')
+        values = view[start + 8 * count:start + 9 * count].cast('b')
+        moves = view[start + 9 * count:start + 10 * count].cast('B')
+        return PerfectPlayTable(game_type, keys, values, moves, source)
+
+    def lookup(self, state):
+        """Return (move, outcome, plies) for the side to move in state (a
+        game_types.State), or None if the position is not in the table.
+
+        outcome is WIN, DRAW or LOSS with perfect play, plies how long it
+        takes (0 for a draw); move is None if the game is already over.
+        """
+        position = BitState(self.game_type, state)
+        key, t = position.canonical_key()
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        value, sq = self.values[i], self.moves[i]
+        move = None
+        if sq != NO_MOVE:
+            sq = position.real_square(sq, t)
+            if not position.empty_bits >> sq & 1:
+                return None # A hash collision.
+            move = divmod(sq, position.m)
+        if value > 0:
+            return move, WIN, WIN_VALUE - value
+        if value < 0:
+            return move, LOSS, WIN_VALUE + value
+        return move, DRAW, 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve a small K-in-a-Row game completely.')
+    parser.add_argument('game', choices=['TTT', 'custom'])
+    parser.add_argument('--k', type=int)
+    parser.add_argument('--n', type=int)
+    parser.add_argument('--m', type=int)
+    parser.add_argument('--max-positions', type=int, default=DEFAULT_MAX_POSITIONS)
+    args = parser.parse_args()
+    if args.game == 'custom':
+        if None in (args.k, args.n, args.m):
+            parser.error('custom games need --k, --n and --m')
+        game_type = custom_game_type(args.k, args.n, args.m)
+    else:
+        game_type = TTT
+    start = time.time()
+    try:
+        table = PerfectPlayTable.build(game_type, args.max_positions)
+    except TableTooLarge:
+        print(f"More than {args.max_positions} positions: too large to solve.")
+        return
+    path = table_path(game_type)
+    table.save(path)
+    move, outcome, plies = table.lookup(game_type.initial_state)
+    print(f"{len(table)} positions in {time.time() - start:.1f} seconds, saved to {path}")
+    print(f"{game_type.long_name}: a {outcome} for {game_type.initial_state.whose_move}"
+          + (f" in {plies} plies" if plies else "") + f", e.g. by playing {move}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+'''search.py
+
+Iterative-deepening alpha-beta search over a BitState, shared by the agents.
+
+Search.iterative_deepening() searches depth 1, 2, 3, ... and returns
+the best move of the last depth it completed.  The clock is read only
+every CHECK_EVERY nodes; once the hard deadline passes, the search
+unwinds at once (SearchTimeout) and the unfinished depth is dropped,
+except that a root move already proved better in it is kept.  A new
+depth is started only if it is predicted to finish before the soft
+deadline.  A line to try first (an attack from threat-space search,
+say) can be given as first_line; it leads the search until a depth
+has completed and given a principal variation of its own.
+
+A position where the game is over scores as a win, or as a draw when
+the board is full or the turn limit is reached.  A depth is exact when
+every line it searched ended that way: no static evaluation, cutoff by
+a table entry not itself exact, or near_only move skipping along the
+way (a reduced move that is not searched again runs out of depth, so
+it makes a static evaluation).  Deepening stops at an exact depth.
+
+With a TranspositionTable, each node looks up the BitState's canonical
+Zobrist key first (the same for all the symmetric images of a
+position, with the best move kept in the canonical frame): an entry
+searched deep enough whose bound settles the window ends the node at
+once, and otherwise its best move is tried first.  Results are stored with their bound, so the table (kept by the
+agent for the whole game) carries work over from one depth, and one
+turn, to the next.  Win scores are stored relative to the node, since
+the same position can be reached at different plies.  A node whose
+subtree was searched exactly is stored at depth SOLVED, which settles
+a search of it to any depth.
+
+With near_only set, the quiet moves searched are only the empty
+squares near the stones (see BitState.candidate_bits); the hash move,
+threats and killers are always tried wherever they are.
+
+With root_moves set (a set of (i, j) moves), only those root moves are
+searched, so several processes can share the root between them (see
+parallel.py); completed keeps the result of every depth completed.
+
+With a CutoffHistory, every node tries its killer moves right after
+the threats, and nodes too shallow for static-eval ordering sort the
+rest of their moves by history score; each beta cutoff updates both.
+
+Three optional refinements, each switched by an attribute:
+  pvs         principal variation search: the first child of a node
+              gets the full window and the others a null window
+              (alpha, alpha + 1), re-searched only if they fail high;
+  aspiration  each depth after the first opens with a window of
+              aspiration_window (in the evaluation's units) on either
+              side of the previous depth's score, and
+              is searched again with that side open if it falls outside;
+  reductions  late-move reductions: at depth 3 or more, quiet moves
+              (not the hash move, a threat or a killer) after the
+              first LMR_MOVES are searched a ply shallower, and again
+              at full depth only if they beat alpha.
+
+Scores are negamax scores (from the side to move's point of view)
+inside the search, and converted to X's point of view in the result,
+as the agents' static_eval functions use.  A win found at ply p scores
+WIN_SCORE - p, so faster wins and slower losses are preferred.
+
+TimeBudget turns a per-move time limit into those two deadlines, and
+lets moves that finish early pass their unused time on to later ones.
+'''
+
+import time
+from src.core.move_gen import lazy_moves, move_count
+from src.core.transposition import EXACT, LOWER, UPPER, NO_MOVE
+
+WIN_SCORE = 10000
+INFINITY = 10 ** 9
+WIN_BOUND = WIN_SCORE - 1000  # Scores beyond this are wins found by search.
+CHECK_EVERY = 256  # Nodes between clock checks; a power of 2.
+ASPIRATION_WINDOW = 50
+LMR_MOVES = 3  # Moves searched at full depth before reductions start.
+LMR_DEPTH = 3  # Shallowest depth at which moves are reduced.
+SOLVED = 127   # Table depth of a node searched to the end of the game (the most it stores).
+
+class SearchTimeout(Exception):
+    pass
+
+class SearchResult:
+    def __init__(self, move, score, depth, exact, pv):
+        self.move = move
+        self.score = score   # From X's point of view.
+        self.depth = depth   # Last depth completed.
+        self.exact = exact   # True if every line was searched to the end of the game.
+        self.pv = pv         # Principal variation, starting with move.
+
+class Search:
+    def __init__(self, evaluate, order_moves=None, table=None, history=None):
+        # evaluate(state) gives the static value from X's point of view.
+        # order_moves(state, moves) sorts moves best-first, or is None.
+        # table is a TranspositionTable, history a CutoffHistory, or None.
+        self.evaluate = evaluate
+        self.order_moves = order_moves
+        self.table = table
+        self.history = history
+        self.pvs = False
+        self.aspiration = False
+        self.aspiration_window = ASPIRATION_WINDOW
+        self.reductions = False
+        self.near_only = False
+        self.root_moves = None
+        self.completed = []
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.static_evals = 0
+        self.cutoffs = 0
+        self.children_skipped = 0
+        self.re_searches = 0   # Null-window, reduced or aspiration searches done again.
+        self.estimated = False # A score in this depth came from a static eval or the table.
+
+    def iterative_deepening(self, state, hard_deadline, soft_deadline=None,
+                            max_depth=None, turns_left=None, first_line=None):
+        """Return a SearchResult for state, never running past hard_deadline.
+
+        first_line, a list of moves from state, is searched first at depth 1.
+        """
+        if soft_deadline is None:
+            soft_deadline = hard_deadline
+        if turns_left is None:
+            turns_left = state.num_empty()
+        self.hard_deadline = hard_deadline
+        self.turns_left = turns_left
+        self.prev_pv = list(first_line or [])
+        self.completed = []
+        limit = turns_left if max_depth is None else min(max_depth, turns_left)
+        result = None
+        last_time = None
+        score = None
+        depth = 1
+        while depth <= max(limit, 1):
+            started = time.time()
+            self.root_best = None
+            self.estimated = False
+            try:
+                score, pv = self.search_window(state, depth, score)
+            except SearchTimeout:
+                if self.root_best is not None:
+                    score, pv = self.root_best
+                    result = self.make_result(state, score, depth - 1, False, pv, result)
+                break
+            exact = not (self.estimated or self.near_only) and self.root_moves is None
+            result = self.make_result(state, score, depth, exact, pv, result)
+            self.completed.append(result)
+            self.prev_pv = pv
+            if result.exact or abs(score) >= WIN_SCORE - turns_left:
+                break
+            elapsed = time.time() - started
+            # Each depth costs a roughly constant factor more than the last.
+            growth = elapsed / last_time if last_time else 4.0
+            growth = min(max(growth, 2.0), 10.0)
+            last_time = max(elapsed, 1e-4)
+            if time.time() + elapsed * growth > soft_deadline:
+                break
+            depth += 1
+        if result is None:
+            # Out of time before depth 1 finished: play the first candidate.
+            move = next(lazy_moves(state, near_only=self.near_only))
+            result = SearchResult(move, 0, 0, False, [move])
+        return result
+
+    def make_result(self, state, score, depth, exact, pv, previous):
+        if not pv:
+            return previous
+        sign = 1 if state.whose_move == 'X' else -1
+        return SearchResult(pv[0], sign * score, depth, exact, pv)
+
+    def search_window(self, state, depth, guess):
+        """Search the root to depth, opening with an aspiration window around
+        guess (the previous depth's score) when aspiration is on."""
+        if not self.aspiration or guess is None or abs(guess) > WIN_BOUND:
+            return self.search_root(state, depth, -INFINITY, INFINITY)
+        alpha = guess - self.aspiration_window
+        beta = guess + self.aspiration_window
+        while True:
+            score, pv = self.search_root(state, depth, alpha, beta)
+            if score <= alpha and alpha > -INFINITY:
+                alpha = -INFINITY
+            elif score >= beta and beta < INFINITY:
+                beta = INFINITY
+            else:
+                return score, pv
+            self.re_searches += 1
+
+    def search_root(self, state, depth, alpha, beta):
+        """Search the root to depth; return (negamax score, principal variation)."""
+        alpha_orig = alpha
+        best = -INFINITY
+        best_pv = []
+        hash_move = self.prev_pv[0] if self.prev_pv else self.table_move(state)
+        first = True
+        for move in lazy_moves(state, hash_move, self.order_moves, near_only=self.near_only):
+            if self.root_moves is not None and move not in self.root_moves:
+                continue
+            state.make_move(move)
+            try:
+                score = self.search_child(state, depth, alpha, beta, 0,
+                                          move == hash_move, first, 0)
+            finally:
+                state.unmake_move()
+            first = False
+            if score > best:
+                best = score
+                best_pv = [move] + self.child_pv
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+                    self.root_best = (alpha, best_pv)
+        if self.table is not None and best_pv and self.root_moves is None:
+            if best <= alpha_orig: bound = UPPER
+            elif best >= beta: bound = LOWER
+            else: bound = EXACT
+            key, t = state.canonical_key()
+            self.table.store(key, self.table_depth(depth, self.estimated), best, bound,
+                             state.canonical_square(state.square(best_pv[0]), t))
+        return best, best_pv
+
+    def search_child(self, state, depth, alpha, beta, ply, on_pv, first, reduce):
+        """Score (for the parent's side) the child just made on state.
+
+        depth and ply are the parent's.  With pvs, a child after the first
+        gets a null window and is searched again with (alpha, beta) only
+        if it fails high; a reduced child is searched again at full depth
+        if it beats alpha.
+        """
+        window = alpha + 1 if self.pvs and not first else beta
+        new_depth = depth - 1
+        score = -self.alpha_beta(state, new_depth - reduce, -window, -alpha, ply + 1, on_pv)
+        if reduce and score > alpha:
+            self.re_searches += 1
+            score = -self.alpha_beta(state, new_depth, -window, -alpha, ply + 1, on_pv)
+        if window < beta and alpha < score < beta:
+            self.re_searches += 1
+            score = -self.alpha_beta(state, new_depth, -beta, -alpha, ply + 1, on_pv)
+        return score
+
+    def table_depth(self, depth, estimated):
+        """The depth to store a node's result at: SOLVED if it is exact."""
+        if estimated or self.near_only:
+            return min(depth, SOLVED - 1)
+        return SOLVED
+
+    def table_move(self, state):
+        """Return the best move stored for state, or None."""
+        if self.table is None:
+            return None
+        key, t = state.canonical_key()
+        slot = self.table.probe(key)
+        if slot < 0 or self.table.moves[slot] == NO_MOVE:
+            return None
+        return state.coords(state.real_square(self.table.moves[slot], t))
+
+    def alpha_beta(self, state, depth, alpha, beta, ply, on_pv):
+        """Fail-soft negamax alpha-beta; sets self.child_pv to the best line."""
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0 and time.time() > self.hard_deadline:
+            raise SearchTimeout()
+        self.child_pv = []
+        if state.x_wins or state.o_wins:
+            # The player who just moved has won.
+            return -(WIN_SCORE - ply)
+        if ply >= self.turns_left or state.empty_bits == 0:
+            return 0 # A draw: the board is full or the turn limit is reached.
+        if depth <= 0:
+            self.estimated = True
+            self.static_evals += 1
+            value = self.evaluate(state)
+            return value if state.whose_move == 'X' else -value
+        table = self.table
+        hash_move = None
+        if table is not None:
+            key, t = state.canonical_key()
+            slot = table.probe(key)
+            if slot >= 0:
+                score = table.scores[slot]
+                if score > WIN_BOUND: score -= ply
+                elif score < -WIN_BOUND: score += ply
+                if table.cutoff(slot, depth, alpha, beta, score):
+                    if table.depths[slot] < SOLVED:
+                        self.estimated = True
+                    return score
+                if table.moves[slot] != NO_MOVE:
+                    hash_move = state.coords(state.real_square(table.moves[slot], t))
+        if on_pv and ply < len(self.prev_pv):
+            hash_move = self.prev_pv[ply]
+        alpha_orig = alpha
+        estimated, self.estimated = self.estimated, False # Track this subtree on its own.
+        history = self.history
+        killers = ()
+        order = self.order_moves if depth >= 2 else None
+        if history is not None:
+            killers = history.killer_moves(ply)
+            if order is None:
+                order = history.order
+        best = -INFINITY
+        best_pv = []
+        visited = 0
+        tactical = set() # Squares yielded as the hash move, threats or killers.
+        late = self.reductions and depth >= LMR_DEPTH
+        m = state.m
+        for move in lazy_moves(state, hash_move, order, killers, tactical, self.near_only):
+            visited += 1
+            reduce = late and visited > LMR_MOVES and move[0] * m + move[1] not in tactical
+            state.make_move(move)
+            try:
+                score = self.search_child(state, depth, alpha, beta, ply,
+                                          on_pv and move == hash_move,
+                                          visited == 1, 1 if reduce else 0)
+            finally:
+                state.unmake_move()
+            if score > best:
+                best = score
+                best_pv = [move] + self.child_pv
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        self.children_skipped += move_count(state, self.near_only, tactical) - visited
+                        if history is not None:
+                            history.record_cutoff(state, move, depth, ply)
+                        break
+        self.child_pv = best_pv
+        subtree_estimated = self.estimated
+        self.estimated = estimated or subtree_estimated
+        if table is not None:
+            if best <= alpha_orig: bound = UPPER
+            elif best >= beta: bound = LOWER
+            else: bound = EXACT
+            stored = best
+            if best > WIN_BOUND: stored += ply
+            elif best < -WIN_BOUND: stored -= ply
+            table.store(key, self.table_depth(depth, subtree_estimated), stored, bound,
+                        state.canonical_square(state.square(best_pv[0]), t))
+        return best
+
+class TimeBudget:
+    """Splits a game's time over its moves.
+
+    The game master allows time_limit seconds per move.  Each move gets
+    a hard deadline a safety margin inside that limit, and a soft
+    deadline (when to stop starting new depths) of SOFT_SHARE of the
+    hard one, plus its share of the bank.  The bank holds the time that
+    earlier moves were allotted and did not use (book moves, proofs and
+    quick searches save most of theirs), spread over the moves left;
+    moves that overran their soft deadline draw it down again.  A soft
+    deadline is never later than the hard one.
+    """
+
+    SAFETY = 0.9     # Fraction of the move's time limit the search may use.
+    MARGIN = 0.01    # Seconds kept back for building the reply.
+    SOFT_SHARE = 0.5 # Fraction of the hard deadline a move is allotted.
+
+    def __init__(self, game_type):
+        self.game_type = game_type
+        self.initial_stones = sum(row.count('X') + row.count('O')
+                                  for row in game_type.initial_state.board)
+        self.bank = 0.0     # Seconds saved by earlier moves.
+        self.allotted = 0.0 # Seconds allotted to the move being made.
+
+    def turns_left(self, state):
+        """Turns left in the game: limited by the turn limit and the empty squares."""
+        stones = bin(state.x_bits | state.o_bits).count('1')
+        played = stones - self.initial_stones
+        return max(0, min(self.game_type.turn_limit - played, state.num_empty()))
+
+    def hard_time(self, time_limit):
+        return max(time_limit * self.SAFETY - self.MARGIN, time_limit * 0.5)
+
+    def open(self, state, time_limit):
+        """Start a move: allot it its time, so that what a move needing no
+        search (a book move, say) leaves unused goes to the bank."""
+        self.allotted = self.hard_time(time_limit) * self.SOFT_SHARE
+
+    def plan(self, state, start_time, time_limit):
+        """Return (soft_deadline, hard_deadline) for a move started at start_time."""
+        hard = self.hard_time(time_limit)
+        my_moves_left = max(1, (self.turns_left(state) + 1) // 2)
+        self.open(state, time_limit)
+        soft = min(hard, self.allotted + self.bank / my_moves_left)
+        return start_time + soft, start_time + hard
+
+    def spend(self, elapsed):
+        """Record the time a move used; what it saved of its allotment goes to the bank."""
+        self.bank = max(0.0, self.bank + self.allotted - elapsed)
+        self.allotted = 0.0
@@ -0,0 +1,131 @@
+'''session.py
+
+One game, with all of its state in one object.
+
+The game master keeps its game in module globals, so a process can run
+one game at a time.  A GameSession holds everything about a game
+itself: the game type, the two players, the position, the turn count,
+the moves and remarks so far, and the result once there is one, so a
+process can hold any number of them.
+
+A session applies moves and judges the game; it does not choose moves
+or print anything.  play() takes a move from anyone (a human at the
+other end of a connection, say): it checks the move is legal, builds
+the next position itself, and looks for a win, a full board or the
+turn limit.  It keeps a BitState in step with the board, so a win is
+found by looking at the windows through the move (BitState.wins_through)
+rather than by scanning the board; the board is only scanned to
+describe a win once there is one.  agent_move() asks the player to move for its move and
+plays it.  A player that fails to prepare, raises an exception,
+returns no move or an illegal one forfeits the game, as in the game
+master.
+'''
+
+from src.core.bitboard import BitState
+from src.core.game_types import State
+from src.core.winTesterForK import winTesterForK
+
+FIRST_REMARK = "The game is starting." # What the first player to move is told.
+
+class IllegalMove(Exception):
+    pass
+
+class GameSession:
+    def __init__(self, game_type, player_x, player_o, time_per_move=None):
+        self.game_type = game_type
+        self.players = {'X': player_x, 'O': player_o}
+        if time_per_move is None:
+            time_per_move = game_type.default_time_per_move
+        self.time_per_move = time_per_move
+        self.state = game_type.initial_state
+        # Hashed under the identity only: the session never looks up positions.
+        self.bits = BitState(game_type, symmetries=game_type.get_symmetries()[:1])
+        self.turn_count = 0
+        self.moves = []    # (side, (i, j)) for each move played.
+        self.remarks = []  # What the player said with each move.
+        self.finished = False
+        self.winner = None # 'X' or 'O' once won (or forfeited); None for a draw.
+        self.result = None # How the game ended, once it has.
+        self.forfeited = False
+
+    @property
+    def to_move(self):
+        return self.state.whose_move
+
+    @property
+    def last_remark(self):
+        return self.remarks[-1] if self.remarks else FIRST_REMARK
+
+    def nickname(self, side):
+        return getattr(self.players[side], 'nickname', side)
+
+    def prepare(self, utterances_matter=True):
+        """Prepare both players; return False if one failed (and so lost)."""
+        for side, other in (('X', 'O'), ('O', 'X')):
+            try:
+                self.players[side].prepare(self.game_type, side, self.nickname(other),
+                                           self.time_per_move, utterances_matter=utterances_matter)
+            except Exception as e:
+                self.forfeit(side, f"failed to prepare ({e!r})")
+                return False
+        return True
+
+    def play(self, move, remark=''):
+        """Play move (i, j) for the side to move; return the result if it
+        ends the game, else None.  Raises IllegalMove if it is not legal."""
+        if self.finished:
+            raise IllegalMove("the game is over")
+        try:
+            i, j = move
+            legal = (0 <= i < self.game_type.n and 0 <= j < self.game_type.m
+                     and self.state.board[i][j] == ' ')
+        except (TypeError, ValueError):
+            legal = False
+        if not legal:
+            raise IllegalMove(f"{move!r} is not a legal move")
+        side = self.to_move
+        state = State(old=self.state)
+        state.board[i][j] = side
+        state.change_turn()
+        self.state = state
+        self.turn_count += 1
+        self.moves.append((side, (i, j)))
+        self.remarks.append(remark)
+        self.bits.make_move((i, j))
+        if self.bits.wins_through((i, j)):
+            state.finished = True
+            self.end(side, winTesterForK(state, (i, j), self.game_type.k))
+        elif self.turn_count >= self.game_type.turn_limit or self.bits.empty_bits == 0:
+            self.end(None, "Game over; it's a draw.")
+        return self.result
+
+    def agent_move(self):
+        """Have the player to move (an agent) choose a move, and play it;
+        return the move, or None if the player forfeited instead."""
+        side = self.to_move
+        try:
+            move_and_state, remark = self.players[side].make_move(self.state, self.last_remark,
+                                                                  self.time_per_move)
+        except Exception as e:
+            self.forfeit(side, f"raised {e!r}")
+            return None
+        move = move_and_state[0] if move_and_state else None
+        if move is None:
+            self.forfeit(side, "returned no move")
+            return None
+        try:
+            self.play(move, remark)
+        except IllegalMove as e:
+            self.forfeit(side, f"played an illegal move: {e}")
+            return None
+        return self.moves[-1][1]
+
+    def forfeit(self, side, reason):
+        other = 'O' if side == 'X' else 'X'
+        self.forfeited = True
+        self.end(other, f"{self.nickname(side)} ({side}) {reason}, and loses by default.")
+
+    def end(self, winner, result):
+        self.finished = True
+        self.winner = winner
+        self.result = result
@@ -0,0 +1,182 @@
+'''threat_space.py
+
+Threat-space search: looks for a forced win made only of threats.
+
+The side to move (the attacker) plays only moves that threaten to win:
+  fours   moves that leave a window with k-1 of its stones and none of
+          the opponent's, so the opponent must block the last square;
+  threes  moves after which one more move would make two such windows
+          with different empty squares (a double four), which no single
+          block stops.
+The defender answers a four with its one possible block (two blocks
+needed means it has lost), and a three with a block inside the
+attacker's windows of k-2 stones or a four of its own.  The defender's
+own fours are answered too: the attacker must block them, and may go
+on only if the block is itself a threat.  So each node has a handful of
+children instead of one per empty square, and wins far beyond the
+horizon of a full-width search are found in milliseconds.
+
+A win made only of fours (no threes) is a forced win outright.  With
+threes, the defender's quiet replies away from the threat are not
+tried, as in Allis's threat-space search, so a found line is a very
+strong attack rather than a proof.  So the search looks for a win of
+fours first, and for one with threes only if there is none; the
+result's proof flag says which it found.
+
+Windows come from Game_Type.get_windows(), which never crosses a
+forbidden square, so forbidden squares and Cassini's obstacles are
+never counted as part of a threat.
+
+The search deepens one attacking move at a time, so the shortest win
+is found first, and gives up quietly at its deadline.  Positions that
+hold no win to a given depth are remembered by Zobrist hash.
+'''
+
+import time
+from src.core.move_gen import window_squares, winning_squares
+from src.core.search import SearchTimeout, WIN_SCORE, CHECK_EVERY
+
+MAX_DEPTH = 10 # Attacking moves, the winning one included.
+
+class ThreatResult:
+    def __init__(self, line, depth, proof):
+        self.line = line     # The win: attacking moves and the replies tried.
+        self.move = line[0]  # The move to play now.
+        self.depth = depth   # Attacking moves needed to win.
+        self.proof = proof   # True if made only of fours: a forced win.
+
+    def score(self, player):
+        """The win's score from X's point of view, as Search would give it
+        (only a proof has earned it)."""
+        score = WIN_SCORE - (2 * self.depth - 1)
+        return score if player == 'X' else -score
+
+class ThreatSpaceSearch:
+    def __init__(self, threes=True):
+        self.threes = threes
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def find_win(self, state, deadline=None, max_depth=MAX_DEPTH, turns_left=None):
+        """Return a ThreatResult if the side to move has a threat-space win, else None."""
+        self.reset_stats()
+        self.deadline = deadline
+        if turns_left is None:
+            turns_left = state.num_empty()
+        # Winning with the d-th attacking move takes 2d - 1 turns.
+        max_depth = min(max_depth, (turns_left + 1) // 2)
+        threes = self.threes
+        try:
+            for use_threes in ((False, True) if threes else (False,)):
+                self.threes = use_threes
+                self.failed = {} # Zobrist hash -> depth searched without a win.
+                for depth in range(1, max_depth + 1):
+                    line = self.attack(state, depth)
+                    self.depth_reached = depth
+                    if line is not None:
+                        return ThreatResult(line, depth, not use_threes)
+        except SearchTimeout:
+            pass
+        finally:
+            self.threes = threes
+        return None
+
+    def count_node(self):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CHECK_EVERY == 0 \
+                and time.time() > self.deadline:
+            raise SearchTimeout()
+
+    def attack(self, state, depth):
+        """Attacker to move: return a winning line within depth attacking moves, or None."""
+        self.count_node()
+        me = state.whose_move
+        wins = winning_squares(state, me)
+        if wins:
+            return [state.coords(min(wins))]
+        if depth <= 1:
+            return None
+        key = state.hash
+        if self.failed.get(key, 0) >= depth:
+            return None
+        blocks = winning_squares(state, 'O' if me == 'X' else 'X')
+        if len(blocks) > 1:
+            candidates = []
+        elif blocks:
+            candidates = list(blocks) # Forced; defend() checks that it threatens.
+        else:
+            candidates = self.threat_moves(state, depth)
+        for sq in candidates:
+            move = state.coords(sq)
+            state.make_move(move)
+            try:
+                line = self.defend(state, depth - 1)
+            finally:
+                state.unmake_move()
+            if line is not None:
+                return [move] + line
+        self.failed[key] = depth
+        return None
+
+    def defend(self, state, depth):
+        """Defender to move: return a line by which every reply loses, or None."""
+        self.count_node()
+        you = state.whose_move
+        if winning_squares(state, you):
+            return None
+        if you == 'X':
+            mine, theirs = state.o_counts, state.x_counts
+        else:
+            mine, theirs = state.x_counts, state.o_counts
+        replies = window_squares(state, mine, theirs, state.k - 1)
+        if not replies:
+            # Not a four: the attacker needs a double four next move.
+            if not self.threes or depth < 2:
+                return None
+            fours = window_squares(state, mine, theirs, state.k - 2)
+            if not any(self.gain(state, sq, mine, theirs) > 1 for sq in fours):
+                return None
+            replies = fours | window_squares(state, theirs, mine, state.k - 2)
+        line = None
+        for sq in sorted(replies):
+            move = state.coords(sq)
+            state.make_move(move)
+            try:
+                rest = self.attack(state, depth)
+            finally:
+                state.unmake_move()
+            if rest is None:
+                return None
+            if line is None or len(rest) + 1 > len(line):
+                line = [move] + rest
+        return line
+
+    def threat_moves(self, state, depth):
+        """The attacker's fours, double fours first, then (if depth allows) threes."""
+        if state.whose_move == 'X':
+            mine, theirs = state.x_counts, state.o_counts
+        else:
+            mine, theirs = state.o_counts, state.x_counts
+        k = state.k
+        fours = window_squares(state, mine, theirs, k - 2)
+        moves = sorted(fours, key=lambda sq: (-self.gain(state, sq, mine, theirs), sq))
+        if self.threes and k > 3 and depth >= 3:
+            threes = window_squares(state, mine, theirs, k - 3) - fours
+            moves += sorted(threes, key=lambda sq: (-len(state.windows_through[sq]), sq))
+        return moves
+
+    def gain(self, state, sq, mine, theirs):
+        """Count the squares that would win for mine after mine plays sq."""
+        k2 = state.k - 2
+        empty = state.empty_bits & ~(1 << sq)
+        wins = set()
+        windows = state.windows
+        for w in state.windows_through[sq]:
+            if mine[w] == k2 and theirs[w] == 0:
+                for s in windows[w]:
+                    if empty >> s & 1:
+                        wins.add(s)
+        return len(wins)
@@ -0,0 +1,246 @@
+'''tournament.py
+
+Headless round-robin tournaments between agents, in parallel.
+
+The game master plays one game per process, printing every board,
+writing HTML and pausing after each move, which is right for watching a
+game and wrong for evaluating agents over thousands of them.
+play_game() plays one game with none of that: no output, no pauses, no
+module globals, just a GameSession (see session.py) judging the moves,
+and the time and nodes each took.
+
+run_tournament() plays every pair of agents against each other on every
+game type, each pair once with each side first (and `rounds` times
+over), dealing the games out to a process pool.  Every game gets fresh
+agents and its own random seed, so results do not depend on which
+worker played what.  Agents are named by module: 'sguptasr' is
+src.agents.sguptasr_KInARow, 'RandomPlayer' is src.agents.RandomPlayer,
+and a dotted name is imported as it is.
+
+A player loses a game by failing to prepare, raising an exception,
+returning no move or an illegal one; the game is a draw when the board
+fills up or the turn limit is reached (as GameSession judges it).
+summarize() turns the game records into one row per agent and game
+type (wins, losses, draws, average and worst move time, nodes searched
+per move), which format_table() lays out as text or CSV.  Run it with, e.g.
+
+  python -m src.core.tournament sguptasr kchua220 RandomPlayer --games TTT FIAR --time 0.25
+
+Output from the agents themselves (e.g. in prepare()) is discarded in
+the worker processes.  With --html, the games' transcripts and an index
+page linking them are written once all the games are over (see
+gameToHTML.py).
+'''
+
+import argparse
+import importlib
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.core.game_types import GAME_TYPES
+from src.core.session import GameSession
+from src.utils import gameToHTML
+
+COLUMNS = ('game', 'agent', 'played', 'won', 'lost', 'drawn', 'forfeits',
+           'avg_move_time', 'max_move_time', 'late_moves', 'nodes_per_move')
+
+def agent_module(name):
+    """Import the agent module called name (see the module docstring)."""
+    if '.' in name:
+        return importlib.import_module(name)
+    try:
+        return importlib.import_module(f"src.agents.{name}_KInARow")
+    except ModuleNotFoundError:
+        return importlib.import_module(f"src.agents.{name}")
+
+def nodes_of(agent):
+    """Nodes the agent reports for its last move (its static evals if it
+    does not count nodes; 0 if it reports neither)."""
+    nodes = getattr(agent, 'nodes_this_turn', None)
+    if nodes is None:
+        nodes = getattr(agent, 'num_static_evals_this_turn', 0)
+    return max(nodes or 0, 0)
+
+def play_game(game_type, x_name, o_name, time_per_move, seed=None, isolate=False):
+    """Play one game between the agents named x_name (as X) and o_name;
+    return its record, a dict.
+
+    The record holds the names, the winning side ('X', 'O' or None for
+    a draw), how the game ended, the moves played, and per side the
+    number of moves, their total and worst time, the moves over
+    time_per_move and the nodes searched.  It is also a game record for
+    gameToHTML, with the starting board, remarks and result.  With isolate, each agent
+    runs in a process of its own and forfeits a move it is late with
+    (see isolation.py).
+    """
+    if seed is not None:
+        random.seed(seed)
+    initial = game_type.initial_state
+    record = {'game': game_type.short_name, 'X': x_name, 'O': o_name,
+              'winner': None, 'reason': 'draw', 'moves': [],
+              'board': [''.join(row) for row in initial.board], 'first': initial.whose_move}
+    for side in 'XO':
+        record[side + '_stats'] = {'moves': 0, 'time': 0.0, 'max_time': 0.0,
+                                   'late': 0, 'nodes': 0}
+    # A second copy of the same agent plays as its twin.
+    players = [agent_module(x_name).OurAgent(), agent_module(o_name).OurAgent(twin=(x_name == o_name))]
+    if isolate:
+        from src.core.isolation import IsolatedAgent
+        players = [IsolatedAgent(player) for player in players]
+    session = GameSession(game_type, *players, time_per_move)
+    if session.prepare(utterances_matter=False):
+        while not session.finished:
+            side = session.to_move
+            stats = record[side + '_stats']
+            start = time.perf_counter()
+            session.agent_move()
+            elapsed = time.perf_counter() - start
+            stats['moves'] += 1
+            stats['time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['late'] += elapsed > time_per_move
+            stats['nodes'] += nodes_of(session.players[side])
+    if isolate:
+        for player in players:
+            player.stop()
+    record['winner'] = session.winner
+    record['moves'] = [move for _, move in session.moves]
+    record['remarks'] = [str(remark) for remark in session.remarks]
+    record['result'] = session.result
+    if session.forfeited:
+        record['reason'] = session.result
+    elif session.winner is not None:
+        record['reason'] = 'win'
+    return record
+
+def schedule(agents, game_types, rounds=1):
+    """Every pairing of a round robin: (game_type, x_name, o_name), each
+    pair once with each side first, per round."""
+    pairings = []
+    for _ in range(rounds):
+        for game_type in game_types:
+            for a in range(len(agents)):
+                for b in range(a + 1, len(agents)):
+                    pairings.append((game_type, agents[a], agents[b]))
+                    pairings.append((game_type, agents[b], agents[a]))
+    return pairings
+
+def silence():
+    # Pool initializer: the agents' chatter goes nowhere.
+    sys.stdout = open(os.devnull, 'w')
+
+def run_tournament(agents, game_types, time_per_move, rounds=1, processes=None,
+                   seed=0, report=None, isolate=False):
+    """Play the round robin of agents (module names) on game_types;
+    return the records of the games, in schedule order.
+
+    Games are played in a pool of processes (os.cpu_count() by default).
+    report(done, total) is called as games finish.
+    """
+    pairings = schedule(agents, game_types, rounds)
+    per_round = len(pairings) // rounds
+    records = [None] * len(pairings)
+    with ProcessPoolExecutor(max_workers=processes, initializer=silence) as pool:
+        futures = {pool.submit(play_game, game_type, x, o, time_per_move, seed + i, isolate): i
+                   for i, (game_type, x, o) in enumerate(pairings)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            records[i] = future.result()
+            records[i]['round'] = i // per_round + 1
+            if report is not None:
+                report(done, len(pairings))
+    return records
+
+def summarize(records):
+    """One row per (game, agent), a dict keyed by COLUMNS, in the order
+    the game types and agents first appear in records."""
+    rows = {}
+    for record in records:
+        for side in 'XO':
+            key = (record['game'], record[side])
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {column: 0 for column in COLUMNS}
+                row['game'], row['agent'] = key
+                row['time'] = 0.0
+                row['moves'] = row['nodes'] = 0
+            stats = record[side + '_stats']
+            row['played'] += 1
+            if record['winner'] is None:
+                row['drawn'] += 1
+            elif record['winner'] == side:
+                row['won'] += 1
+            else:
+                row['lost'] += 1
+                row['forfeits'] += record['reason'] != 'win'
+            row['moves'] += stats['moves']
+            row['time'] += stats['time']
+            row['nodes'] += stats['nodes']
+            row['max_move_time'] = max(row['max_move_time'], stats['max_time'])
+            row['late_moves'] += stats['late']
+    for row in rows.values():
+        moves = max(row.pop('moves'), 1)
+        row['avg_move_time'] = row.pop('time') / moves
+        row['nodes_per_move'] = row.pop('nodes') / moves
+    return list(rows.values())
+
+def format_table(rows, csv=False):
+    """The summary rows as aligned text, or as CSV."""
+    def cell(row, column):
+        value = row[column]
+        if column.endswith('_time'):
+            return f"{value:.4f}"
+        if column == 'nodes_per_move':
+            return f"{value:.0f}"
+        return str(value)
+    lines = [list(COLUMNS)] + [[cell(row, column) for column in COLUMNS] for row in rows]
+    if csv:
+        return '\n'.join(','.join(line) for line in lines) + '\n'
+    widths = [max(len(line[c]) for line in lines) for c in range(len(COLUMNS))]
+    return '\n'.join('  '.join(value.ljust(w) if c < 2 else value.rjust(w)
+                               for c, (value, w) in enumerate(zip(line, widths)))
+                     for line in lines) + '\n'
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a round-robin tournament between agents.')
+    parser.add_argument('agents', nargs='+', help="agent modules, e.g. sguptasr kchua220 RandomPlayer")
+    parser.add_argument('--games', nargs='+', choices=sorted(GAME_TYPES), default=['TTT'])
+    parser.add_argument('--time', type=float, default=0.25, help='seconds per move')
+    parser.add_argument('--rounds', type=int, default=1, help='times to play each pairing')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--isolate', action='store_true',
+                        help='run each agent in its own process, forfeiting late moves')
+    parser.add_argument('--out', help='write the table here too (as CSV if it ends in .csv)')
+    parser.add_argument('--html', metavar='DIRECTORY',
+                        help='write transcripts of the games and an index page here')
+    args = parser.parse_args()
+    if len(args.agents) < 2:
+        parser.error('a tournament needs at least two agents')
+
+    def report(done, total):
+        if done % 10 == 0 or done == total:
+            print(f"\r{done}/{total} games", end='', flush=True)
+        if done == total:
+            print()
+
+    start = time.time()
+    records = run_tournament(args.agents, [GAME_TYPES[g] for g in args.games], args.time,
+                             args.rounds, args.processes, args.seed, report, args.isolate)
+    rows = summarize(records)
+    print(f"{len(records)} games in {time.time() - start:.1f} seconds")
+    print(format_table(rows), end='')
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(format_table(rows, csv=args.out.endswith('.csv')))
+    if args.html:
+        # After all the games, so no game waits for a report.
+        paths = gameToHTML.write_reports(records, args.html, args.processes)
+        title = f"{' vs '.join(args.agents)}: {', '.join(args.games)} at {args.time} s a move"
+        index = gameToHTML.write_index(records, paths, args.html, title, rows)
+        print(f"Transcripts of {len(paths)} games in {args.html}, index at {index}")
+
+if __name__ == '__main__':
+    main()
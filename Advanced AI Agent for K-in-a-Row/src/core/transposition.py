@@ -0,0 +1,132 @@
+'''transposition.py
+
+A fixed-size transposition table kept in preallocated arrays.
+
+The table has a power-of-two number of slots, grouped in buckets of
+two, and one array per field (key, depth, score, bound, best move,
+age), so its memory is fixed when it is built and nothing is allocated
+while searching.  The full 64-bit key is stored as the key check.
+
+Replacement: the first slot of a bucket keeps the deeper result (an
+entry from an earlier search, i.e. an older age, counts as shallower
+than anything new), and the entry it displaces moves to the second
+slot, which is always overwritten.  So deep results survive from one
+turn to the next, and shallow ones still get stored.
+
+Scores are stored with a bound flag, because alpha-beta only proves
+the value of a node exactly when it falls inside the window:
+  EXACT  the value is score,
+  LOWER  the value is at least score (the node failed high),
+  UPPER  the value is at most score (the node failed low).
+'''
+
+from array import array
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+NO_MOVE = -1
+
+ENTRY_BYTES = 8 + 1 + 8 + 1 + 1 + 4 # key, depth, score, bound, age, move
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+class TranspositionTable:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        size = 2
+        while size * 2 * ENTRY_BYTES <= max_bytes:
+            size *= 2
+        self.size = size
+        self.mask = (size - 1) & ~1 # Index of the first slot of a bucket.
+        self.keys = array('Q', [0]) * size
+        self.depths = array('b', [-1]) * size # -1 marks an empty slot.
+        self.scores = array('d', [0.0]) * size
+        self.bounds = array('B', [EXACT]) * size
+        self.ages = array('B', [0]) * size
+        self.moves = array('i', [NO_MOVE]) * size
+        self.age = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """Start a new turn: older entries become the first to be replaced."""
+        self.age = (self.age + 1) & 0xFF
+        self.reset_stats()
+
+    def clear(self):
+        self.depths = array('b', [-1]) * self.size
+        self.moves = array('i', [NO_MOVE]) * self.size
+
+    def memory_bytes(self):
+        return self.size * ENTRY_BYTES
+
+    def probe(self, key):
+        """Return the slot holding key, or -1.  Read its fields from the arrays."""
+        self.probes += 1
+        slot = key & self.mask
+        if self.depths[slot] >= 0 and self.keys[slot] == key:
+            self.hits += 1
+            return slot
+        slot += 1
+        if self.depths[slot] >= 0 and self.keys[slot] == key:
+            self.hits += 1
+            return slot
+        return -1
+
+    def cutoff(self, slot, depth, alpha, beta, score=None):
+        """True if the entry in slot settles a search to depth with window (alpha, beta).
+
+        score is the entry's score as the caller reads it (a search that
+        stores win scores relative to the node passes it back in the
+        root's terms); by default it is the stored one.
+        """
+        if self.depths[slot] < depth:
+            return False
+        bound = self.bounds[slot]
+        if score is None:
+            score = self.scores[slot]
+        if bound == EXACT:
+            return True
+        if bound == LOWER:
+            return beta is not None and score >= beta
+        return alpha is not None and score <= alpha
+
+    def store(self, key, depth, score, bound, move=NO_MOVE):
+        """Record a search result for key (move is a square index or NO_MOVE)."""
+        self.stores += 1
+        slot = key & self.mask
+        depths = self.depths
+        if depths[slot] >= 0 and self.keys[slot] != key:
+            if self.ages[slot] == self.age and depths[slot] > depth:
+                # Keep the deeper entry; use the always-replace slot.
+                self.write(slot + 1, key, depth, score, bound, move)
+                return
+            # Move the first slot's entry down rather than lose it.
+            self.copy(slot, slot + 1)
+        elif depths[slot] >= 0 and move == NO_MOVE:
+            move = self.moves[slot] # Same position: keep its best move.
+        self.write(slot, key, depth, score, bound, move)
+
+    def write(self, slot, key, depth, score, bound, move):
+        if self.depths[slot] >= 0 and self.keys[slot] != key:
+            self.overwrites += 1
+        self.keys[slot] = key
+        self.depths[slot] = min(depth, 127)
+        self.scores[slot] = score
+        self.bounds[slot] = bound
+        self.ages[slot] = self.age
+        self.moves[slot] = move
+
+    def copy(self, source, target):
+        if self.depths[target] >= 0 and self.keys[target] != self.keys[source]:
+            self.overwrites += 1
+        self.keys[target] = self.keys[source]
+        self.depths[target] = self.depths[source]
+        self.scores[target] = self.scores[source]
+        self.bounds[target] = self.bounds[source]
+        self.ages[target] = self.ages[source]
+        self.moves[target] = self.moves[source]
@@ -1,55 +1,178 @@
 '''gameToHTML.py
 
+HTML transcripts of games, written once a game is over.
+
+A transcript is rendered from the whole game at once, from its record:
+the starting position, the moves with what was said with each, and the
+result.  The page is filled in from string templates and written to
+its file in one write, so nothing is done for HTML while the game is
+being played.
+
+Boards are not tables of image tags: a board is one <div> of <i>
+squares whose classes say what is on them, and a shared stylesheet
+(transcript.css) draws every square from one sprite image
+(sprite32.png, a strip of the 32-pixel tiles in assets/images).  Both
+are copied into the output directory with the first transcript written
+there.
+
+File names are never reused: a transcript whose name is taken gets
+-2, -3, ... added, and names are claimed with an exclusive create, so
+transcripts can be written by several processes at once.
+write_reports() writes the transcripts of many games (say, a
+tournament's) in a pool of processes, and write_index() adds a page
+linking them all.
+
+A game record is a dict with
+  'X', 'O'    the players' names
+  'game'      the game type's short name
+  'round'     the round (1 if missing)
+  'board'     the starting board, one string per row
+  'first'     the side to move first
+  'moves'     the moves played, (i, j) each
+  'remarks'   what the player said with each move
+  'result'    how the game ended
 '''
-f = None
-def startHTML(nickName1, nickName2, gameType, round=1):
-    # Create a filename.
-    fn = 'output/'+clean(nickName1)+'-vs-'+clean(nickName2)+'-in-'+clean(gameType)+'-round-'+str(round)+'.html'
-    # To be added: Check for existing file by this name and create a new variation of it.
-    global F
-    try: F = open(fn, "w");
-    except:
-        print("Could not open the file "+fn+" for the game's HTML page.")
-        return
-    F.write('''
-<html><head><title>K-in-a-Row game</title></head>
-<body>
-<h1>Game Report: ''')
-    F.write(nickName1 + ' versus ' + nickName2 + ' in ' +gameType + ', round '+str(round))
 
-    F.write(''' </h1>
-''')
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
 
-def reportResult(result):
-    F.write("<h2>"+result+"</h2>\n")
+OUTPUT_DIR = 'output'
+SPRITE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       '..', '..', 'assets', 'images', 'sprite32.png'))
+CELLS = {' ': '<i></i>', 'X': '<i class=x></i>', 'O': '<i class=o></i>', '-': '<i class=f></i>'}
+LAST_CELLS = {'X': '<i class="x last"></i>', 'O': '<i class="o last"></i>'}
+
+STYLESHEET = '''body { font-family: sans-serif; margin: 2em; }
+.board { display: grid; grid-template-columns: repeat(var(--m), 32px); margin: 0.5em 0 1.5em; }
+.board i { width: 32px; height: 32px; background: url(sprite32.png) 0 0; }
+.board .x { background-position: -32px 0; }
+.board .o { background-position: -64px 0; }
+.board .f { background-position: -96px 0; }
+.board .last { outline: 2px solid #c00; outline-offset: -2px; }
+.move { margin: 0; }
+.result { font-size: 1.3em; font-weight: bold; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #ccc; padding: 0.2em 0.6em; text-align: left; }
+'''
 
-def endHTML():
-    F.write("</body></html>\n")
-    F.close()
+PAGE = Template('''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>$title</title>
+<link rel="stylesheet" href="transcript.css"></head>
+<body>
+<h1>$title</h1>
+$body
+</body></html>
+''')
+BOARD = Template('<div class=board style="--m:$m">$cells</div>\n')
+MOVE = Template('<p class=move>$number. $name ($side) plays $move: $remark</p>\n')
+RESULT = Template('<p class=result>$result</p>\n')
+INDEX_ROW = Template('<tr><td>$number</td><td>$game</td><td>$round</td><td>$x</td>'
+                     '<td>$o</td><td>$result</td><td><a href="$href">transcript</a></td></tr>\n')
 
-    
 def clean(name):
-    import re
-    #print("in clean, name is", name)
     new_name = re.sub(' ', '-', name)
-    new_name = re.sub('[^a-zA-Z10-9\\-]', '', new_name)
+    new_name = re.sub('[^a-zA-Z0-9\\-]', '', new_name)
     return new_name
 
-def stateToHTML(state, finished=False):
-    board = state.board
-    who = state.whose_move
-    html = '''<table>
-'''
-    for row in board:
-        html += "<tr>"
-        for col in row:
-            img = "assets/images/gray32.png"
-            if col=='X': img = "assets/images/X32.png"
-            elif col=='O': img = "assets/images/O32.png"
-            elif col=="-": img = "assets/images/black32.png"
-            html += "<td><img src=" + img + "></td>"
-        html += "</tr>\n"
-    html += "</table><br>\n"
-    if not finished: html += "<h3>"+who+" to move.</h3>\n"
-    F.write(html)
-    
+def render_game(record):
+    """The transcript page of the game record, as a string."""
+    board = [list(row) for row in record['board']]
+    m = len(board[0])
+    cells = [CELLS[c] for row in board for c in row]
+    names = {'X': html.escape(record['X']), 'O': html.escape(record['O'])}
+    title = (f"{names['X']} versus {names['O']} in {html.escape(record['game'])}, "
+             f"round {record.get('round', 1)}")
+    parts = [BOARD.substitute(m=m, cells=''.join(cells))]
+    side = record['first']
+    last = None
+    for number, ((i, j), remark) in enumerate(zip(record['moves'], record['remarks']), 1):
+        if last is not None:
+            cells[last] = CELLS[board[last // m][last % m]]
+        board[i][j] = side
+        last = i * m + j
+        cells[last] = LAST_CELLS[side]
+        parts.append(MOVE.substitute(number=number, name=names[side], side=side,
+                                     move=f"({i}, {j})", remark=html.escape(remark)))
+        parts.append(BOARD.substitute(m=m, cells=''.join(cells)))
+        side = 'O' if side == 'X' else 'X'
+    parts.append(RESULT.substitute(result=html.escape(record['result'] or '')))
+    return PAGE.substitute(title=title, body=''.join(parts))
+
+def install_assets(directory):
+    """Put the stylesheet and the sprite in directory, if they are not there yet."""
+    os.makedirs(directory, exist_ok=True)
+    for name, data in (('transcript.css', STYLESHEET.encode()), ('sprite32.png', None)):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            continue
+        if data is None:
+            with open(SPRITE, 'rb') as f:
+                data = f.read()
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path) # Whole or not at all, whoever gets there first.
+
+def create_unique(directory, name, extension='.html'):
+    """Create a new file for name in directory, adding -2, -3, ... to the
+    name while it is taken; return (path, open file)."""
+    copy = 1
+    while True:
+        path = os.path.join(directory, name + (f"-{copy}" if copy > 1 else '') + extension)
+        try:
+            return path, open(path, 'x', encoding='utf-8')
+        except FileExistsError:
+            copy += 1
+
+def write_transcript(record, directory=OUTPUT_DIR):
+    """Write the transcript of the game record; return its path."""
+    page = render_game(record)
+    install_assets(directory)
+    name = (f"{clean(record['X'])}-vs-{clean(record['O'])}-in-{clean(record['game'])}"
+            f"-round-{record.get('round', 1)}")
+    path, f = create_unique(directory, name)
+    with f:
+        f.write(page)
+    return path
+
+def write_reports(records, directory=OUTPUT_DIR, processes=None):
+    """Write the transcripts of the game records in a pool of processes;
+    return their paths, in the order of records."""
+    install_assets(directory)
+    if len(records) < 2 or processes == 1:
+        return [write_transcript(record, directory) for record in records]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(write_transcript, records, [directory] * len(records),
+                             chunksize=max(len(records) // (4 * (processes or os.cpu_count() or 1)), 1)))
+
+def write_index(records, paths, directory=OUTPUT_DIR, title='Tournament', summary=None):
+    """Write a page linking the transcripts at paths of the game records,
+    after the summary table if given (a list of dicts, one per row);
+    return its path."""
+    install_assets(directory)
+    parts = []
+    if summary:
+        columns = list(summary[0])
+        parts.append('<h2>Results</h2>\n<table><tr>'
+                     + ''.join(f"<th>{html.escape(c)}</th>" for c in columns) + '</tr>\n')
+        for row in summary:
+            parts.append('<tr>' + ''.join(
+                f"<td>{row[c]:.4f}</td>" if isinstance(row[c], float) else f"<td>{html.escape(str(row[c]))}</td>"
+                for c in columns) + '</tr>\n')
+        parts.append('</table>\n')
+    parts.append('<h2>Games</h2>\n<table><tr><th>#</th><th>Game</th><th>Round</th><th>X</th>'
+                 '<th>O</th><th>Result</th><th></th></tr>\n')
+    for number, (record, path) in enumerate(zip(records, paths), 1):
+        parts.append(INDEX_ROW.substitute(number=number, game=html.escape(record['game']),
+                                          round=record.get('round', 1), x=html.escape(record['X']),
+                                          o=html.escape(record['O']),
+                                          result=html.escape(record['result'] or ''),
+                                          href=html.escape(os.path.relpath(path, directory))))
+    parts.append('</table>\n')
+    path, f = create_unique(directory, 'index')
+    with f:
+        f.write(PAGE.substitute(title=html.escape(title), body=''.join(parts)))
+    return path
@@ -0,0 +1,5 @@
+# The modules are imported as src.core..., from the project directory.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,61 @@
+'''test_batch_eval.py
+
+The NumPy batch evaluators score every child exactly as the agents'
+static_eval functions do, and the agents order moves the same way
+with use_batch_ordering on.
+'''
+
+import random
+import pytest
+from src.core.bitboard import BitState
+from src.core.game_types import GAME_TYPES
+from src.agents import sguptasr_KInARow, kchua220_KInARow
+
+pytest.importorskip('numpy')
+
+AGENTS = [sguptasr_KInARow, kchua220_KInARow]
+
+def prepared(module, game_type):
+    agent = module.OurAgent()
+    agent.prepare(game_type, 'X', 'them', 0.1, utterances_matter=False)
+    return agent
+
+def positions(game_type, seed, count=10):
+    rng = random.Random(seed)
+    for _ in range(count):
+        state = BitState(game_type)
+        for _ in range(rng.randrange(0, 12)):
+            if state.winner() or not state.empty_bits:
+                break
+            state.make_move(rng.choice(state.legal_moves()))
+        if state.winner() is None and state.empty_bits:
+            yield BitState(game_type, state.to_state())
+
+@pytest.mark.parametrize('module', AGENTS, ids=lambda m: m.__name__.split('.')[-1])
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+def test_batch_scores_match_static_eval(module, name):
+    game_type = GAME_TYPES[name]
+    agent = prepared(module, game_type)
+    for state in positions(game_type, name):
+        moves = state.legal_moves()
+        batch = agent.batch_evaluator.score_children(state, moves)
+        for move, value in zip(moves, batch):
+            state.make_move(move)
+            expected = agent.static_eval(state, game_type)
+            state.unmake_move()
+            assert int(value) == expected, move
+
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+def test_batch_ordering_orders_as_the_running_total(name):
+    game_type = GAME_TYPES[name]
+    for module in AGENTS:
+        agent = prepared(module, game_type)
+        order = (agent.order_children if module is kchua220_KInARow else
+                 lambda state, moves: agent.order_moves(state, moves, agent.static_eval))
+        for state in positions(game_type, name):
+            state.attach_evaluator(agent.evaluator)
+            moves = state.legal_moves()
+            agent.use_batch_ordering = False
+            expected = order(state, moves)
+            agent.use_batch_ordering = True
+            assert order(state, moves) == expected
@@ -0,0 +1,112 @@
+'''test_bitboard.py
+
+BitState make/unmake round trips: unmaking a move restores everything
+the move changed, and the incrementally kept fields always match a
+BitState built from scratch.  The hash depends on the stones and the
+side to move, not on the order the moves were played in, and every symmetric image
+of a position has the same canonical key.
+'''
+
+import random
+import pytest
+from src.core.bitboard import BitState
+from src.core.game_types import State, GAME_TYPES
+from src.core.winTesterForK import winTesterForK
+
+def snapshot(state):
+    return {'board': [row[:] for row in state.board], 'whose_move': state.whose_move,
+            'x_bits': state.x_bits, 'o_bits': state.o_bits, 'empty_bits': state.empty_bits,
+            'x_counts': state.x_counts[:], 'o_counts': state.o_counts[:],
+            'x_wins': state.x_wins, 'o_wins': state.o_wins,
+            'line_codes': state.line_codes[:], 'hash': state.hash,
+            'sym_hashes': state.sym_hashes[:], 'near_bits': state.near_bits,
+            'history': state.history[:]}
+
+def from_scratch(state):
+    fields = snapshot(BitState(state.game_type, state.to_state()))
+    fields['history'] = state.history[:] # A new BitState has played nothing.
+    return fields
+
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+def test_make_unmake_round_trip(name):
+    rng = random.Random(name)
+    for _ in range(5):
+        state = BitState(GAME_TYPES[name])
+        snapshots = [snapshot(state)]
+        while state.empty_bits and not (state.x_wins or state.o_wins):
+            state.make_move(rng.choice(state.legal_moves()))
+            assert snapshot(state) == from_scratch(state)
+            snapshots.append(snapshot(state))
+        snapshots.pop()
+        while snapshots:
+            state.unmake_move()
+            assert snapshot(state) == snapshots.pop()
+
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+def test_hash_ignores_move_order(name):
+    rng = random.Random(name)
+    state = BitState(GAME_TYPES[name])
+    moves = rng.sample(state.legal_moves(), 6)
+    for move in moves:
+        state.make_move(move)
+    other = BitState(GAME_TYPES[name])
+    xs, os = moves[0::2], moves[1::2]
+    rng.shuffle(xs)
+    rng.shuffle(os)
+    for x, o in zip(xs, os):
+        other.make_move(x)
+        other.make_move(o)
+    assert other.hash == state.hash == BitState(state.game_type, state.to_state()).hash
+    board = state.to_state().board
+    o_to_move = BitState(state.game_type, State(initial_state_data=[board, 'O']))
+    assert o_to_move.hash != state.hash # The side to move is hashed too.
+
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+def test_unmake_restores_symmetric_keys(name):
+    state = BitState(GAME_TYPES[name])
+    key = state.canonical_key()
+    for move in state.legal_moves()[:6]:
+        state.make_move(move)
+        state.unmake_move()
+        assert state.canonical_key() == key
+
+def image(state, perm):
+    """A BitState of state's position moved by the symmetry perm."""
+    m = state.m
+    board = [row[:] for row in state.to_state().board]
+    for sq, target in enumerate(perm):
+        board[target // m][target % m] = state.board[sq // m][sq % m]
+    return BitState(state.game_type, State(initial_state_data=[board, state.whose_move]))
+
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+def test_symmetric_images_share_canonical_key(name):
+    game_type = GAME_TYPES[name]
+    rng = random.Random(name)
+    for plies in range(1, 8):
+        state = BitState(game_type)
+        for move in rng.sample(state.legal_moves(), plies):
+            state.make_move(move)
+        key, t = state.canonical_key()
+        for perm in game_type.get_symmetries():
+            other = image(state, perm)
+            other_key, other_t = other.canonical_key()
+            assert other_key == key
+            if not state.stabilizer():
+                # The canonical frame is the same board, so a square stored
+                # from one image comes back as its place in the other.
+                sq = rng.choice([sq for sq in range(len(perm)) if state.empty_bits >> sq & 1])
+                assert other.real_square(state.canonical_square(sq, t), other_t) == perm[sq]
+
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+def test_wins_through_agrees_with_board_scan(name):
+    game_type = GAME_TYPES[name]
+    rng = random.Random(name)
+    for _ in range(20):
+        state = BitState(game_type)
+        while state.empty_bits:
+            move = rng.choice(state.legal_moves())
+            state.make_move(move)
+            won = winTesterForK(state.to_state(), move, game_type.k) != 'No win'
+            assert state.wins_through(move) == won
+            if won:
+                break
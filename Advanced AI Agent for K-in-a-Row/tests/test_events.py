@@ -0,0 +1,24 @@
+'''test_events.py
+
+Sinks must say how they write, and the in-memory ones keep or drop
+every event an EventStream hands them.
+'''
+
+import pytest
+from src.core.events import EventStream, Sink, NullSink, MemorySink, Utterance
+
+def test_sink_without_write_cannot_be_made():
+    class Silent(Sink):
+        pass
+    with pytest.raises(TypeError):
+        Silent()
+
+def test_memory_and_null_sinks():
+    memory, null = MemorySink(), NullSink()
+    stream = EventStream([memory, null])
+    events = [Utterance('X', 'Ann', 'Hello'), Utterance('O', 'Bob', 'Hi')]
+    for event in events:
+        stream.emit(event)
+    stream.close()
+    assert memory.events == events
+    assert null.pending == []
@@ -0,0 +1,98 @@
+'''test_game_server.py
+
+GameServer requests, with the agents run in this process: new games
+are checked before they start, and a connection only reaches its own
+sessions.  An AgentPool replaces a worker process that has died.
+'''
+
+import asyncio
+import os
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from src.core.game_server import GameServer, AgentPool, MAX_SIDE
+
+class InlinePool:
+    """An AgentPool with one worker: this process."""
+    def assign(self):
+        return 0
+
+    def release(self, worker):
+        pass
+
+    async def call(self, worker, fn, *args):
+        return fn(*args)
+
+def run(requests):
+    """Answer requests, (connection, request) pairs, in order."""
+    server = GameServer(InlinePool())
+    connections = {}
+
+    async def answer_all():
+        return [await server.handle(request, connections.setdefault(who, set()))
+                for who, request in requests]
+    return asyncio.run(answer_all())
+
+@pytest.mark.parametrize('request_', [
+    {'op': 'new', 'game': 'custom', 'k': 4, 'n': 3, 'm': 3},
+    {'op': 'new', 'game': 'custom', 'k': 0, 'n': 3, 'm': 3},
+    {'op': 'new', 'game': 'custom', 'k': 3, 'n': -3, 'm': 3},
+    {'op': 'new', 'game': 'custom', 'k': 3, 'n': 3},
+    {'op': 'new', 'game': 'custom', 'k': 5, 'n': MAX_SIDE + 1, 'm': 5},
+    {'op': 'new', 'game': 'custom', 'k': 5, 'n': 5, 'm': 10 ** 6},
+    {'op': 'new', 'time': float('nan')},
+    {'op': 'new', 'time': float('inf')},
+    {'op': 'new', 'time': 0},
+    {'op': 'new', 'time': -1},
+    {'op': 'new', 'time': 'soon'},
+    {'op': 'new', 'game': 'Go'},
+    {'op': 'new', 'agent': 'nobody'},
+    {'op': 'new', 'agent': 'os.path'},
+    {'op': 'new', 'side': 'Z'},
+])
+def test_bad_new_games_are_refused(request_):
+    reply, = run([('a', request_)])
+    assert reply['ok'] is False and reply['error']
+
+def test_new_custom_game():
+    reply, = run([('a', {'op': 'new', 'game': 'custom', 'k': 3, 'n': 3, 'm': 4,
+                         'agent': 'RandomPlayer', 'side': 'O', 'id': 7})])
+    assert reply['ok'] and reply['id'] == 7
+    assert len(reply['board']) == 3 and len(reply['board'][0]) == 4
+    assert reply['to_move'] == 'O' and reply['agent_move'] is not None
+
+def test_sessions_belong_to_their_connection():
+    new, other_show, other_move, other_close, own_show = run([
+        ('a', {'op': 'new', 'agent': 'RandomPlayer'}),
+        ('b', {'op': 'show', 'session': 1}),
+        ('b', {'op': 'move', 'session': 1, 'move': [0, 0]}),
+        ('b', {'op': 'close', 'session': 1}),
+        ('a', {'op': 'show', 'session': 1}),
+    ])
+    assert new['ok'] and new['session'] == 1
+    for reply in (other_show, other_move, other_close):
+        assert reply['ok'] is False
+    assert own_show['ok'] and own_show['board'] == new['board']
+
+def test_move_and_close():
+    new, move, close, gone = run([
+        ('a', {'op': 'new', 'agent': 'RandomPlayer'}),
+        ('a', {'op': 'move', 'session': 1, 'move': [1, 1]}),
+        ('a', {'op': 'close', 'session': 1}),
+        ('a', {'op': 'show', 'session': 1}),
+    ])
+    assert move['ok'] and move['board'][1][1] == 'X' and move['agent_move'] is not None
+    assert close['ok'] and gone['ok'] is False
+
+def test_pool_replaces_dead_worker():
+    pool = AgentPool(1)
+
+    async def calls():
+        first = await pool.call(0, os.getpid)
+        with pytest.raises(BrokenProcessPool):
+            await pool.call(0, os._exit, 1)
+        return first, await pool.call(0, os.getpid)
+    try:
+        first, second = asyncio.run(calls())
+    finally:
+        pool.shutdown()
+    assert first != second
@@ -0,0 +1,126 @@
+'''test_isolation.py
+
+IsolatedAgent holding agents to their time limits: a late move is
+forfeited, or replaced by a default move while the agent restarts in
+the background.  The game master stops the processes of the agents it
+isolated when the game is over.
+'''
+
+import multiprocessing
+import time
+import pytest
+from src.core import Game_Master_Offline
+from src.core.game_types import State, GAME_TYPES
+from src.core.isolation import IsolatedAgent, AgentTimeout, AgentFailure
+from src.core.session import GameSession
+
+TTT = GAME_TYPES['TTT']
+LIMIT = 0.2
+
+class FirstEmpty:
+    """Plays the first empty square; hangs on an empty board if told to."""
+    nickname = 'Hangman'
+
+    def __init__(self, hang_on_empty=False, fail=False, prepare_delay=0.0):
+        self.hang_on_empty = hang_on_empty
+        self.fail = fail
+        self.prepare_delay = prepare_delay
+
+    def introduce(self):
+        return "I take the first free square."
+
+    def prepare(self, game_type, side, opponent, time_per_move=0.1, utterances_matter=True):
+        time.sleep(self.prepare_delay)
+        return 'OK'
+
+    def make_move(self, state, remark, time_limit=1000):
+        empty = [(i, j) for i, row in enumerate(state.board) for j, cell in enumerate(row) if cell == ' ']
+        if self.fail:
+            raise ValueError('no move for you')
+        if self.hang_on_empty and len(empty) == len(state.board) * len(state.board[0]):
+            time.sleep(30)
+        i, j = empty[0]
+        new_state = State(old=state)
+        new_state.board[i][j] = state.whose_move
+        new_state.change_turn()
+        return [[(i, j), new_state], f"({i}, {j}) it is."]
+
+@pytest.fixture
+def isolated():
+    agents = []
+
+    def make(agent, on_timeout):
+        agents.append(IsolatedAgent(agent, on_timeout=on_timeout))
+        agents[-1].prepare(TTT, 'X', 'them', LIMIT)
+        return agents[-1]
+    yield make
+    for agent in agents:
+        agent.stop()
+
+def test_prompt_moves_pass_through(isolated):
+    agent = isolated(FirstEmpty(), 'forfeit')
+    (move, state), utterance = agent.make_move(TTT.initial_state, '', LIMIT)
+    assert move == (0, 0) and state.board[0][0] == 'X' and state.whose_move == 'O'
+    assert utterance == "(0, 0) it is."
+    assert agent.timeouts == 0
+
+def test_forfeit_mode_raises(isolated):
+    agent = isolated(FirstEmpty(hang_on_empty=True), 'forfeit')
+    start = time.perf_counter()
+    with pytest.raises(AgentTimeout):
+        agent.make_move(TTT.initial_state, '', LIMIT)
+    assert time.perf_counter() - start < LIMIT + 1.0
+    assert agent.timeouts == 1 and agent.process is None
+
+def test_default_mode_plays_on(isolated):
+    agent = isolated(FirstEmpty(hang_on_empty=True), 'default')
+    start = time.perf_counter()
+    (move, state), utterance = agent.make_move(TTT.initial_state, '', LIMIT)
+    assert time.perf_counter() - start < LIMIT + 1.0 # Not waiting for the restart.
+    i, j = move
+    assert TTT.initial_state.board[i][j] == ' ' and state.board[i][j] == 'X'
+    assert 'default move' in utterance and agent.timeouts == 1
+    # The restarted agent answers the next position itself.
+    (move, _), utterance = agent.make_move(state, '', LIMIT)
+    assert move == ((0, 1) if (i, j) == (0, 0) else (0, 0))
+    assert utterance.endswith("it is.")
+
+def test_slow_restart_plays_default_moves_meanwhile(isolated):
+    agent = isolated(FirstEmpty(hang_on_empty=True, prepare_delay=1.0), 'default')
+    (move, state), _ = agent.make_move(TTT.initial_state, '', LIMIT)
+    start = time.perf_counter()
+    (move, state), utterance = agent.make_move(state, '', LIMIT)
+    assert time.perf_counter() - start < LIMIT # Waited only part of the move's time.
+    assert 'still restarting' in utterance
+    time.sleep(1.0)
+    (move, _), utterance = agent.make_move(state, '', LIMIT)
+    assert utterance.endswith("it is.")
+
+def test_exceptions(isolated):
+    with pytest.raises(AgentFailure):
+        isolated(FirstEmpty(fail=True), 'forfeit').make_move(TTT.initial_state, '', LIMIT)
+    (move, _), utterance = isolated(FirstEmpty(fail=True), 'default').make_move(
+        TTT.initial_state, '', LIMIT)
+    assert move is not None and 'default move' in utterance
+
+def test_late_agent_loses_the_session():
+    players = [IsolatedAgent(FirstEmpty(hang_on_empty=True)), IsolatedAgent(FirstEmpty())]
+    try:
+        game = GameSession(TTT, *players, LIMIT)
+        assert game.prepare(utterances_matter=False)
+        assert game.agent_move() is None
+        assert game.forfeited and game.winner == 'O'
+        assert 'took more than' in game.result
+    finally:
+        for player in players:
+            player.stop()
+
+def test_game_master_stops_isolated_agents(monkeypatch):
+    monkeypatch.setattr(Game_Master_Offline, 'GAME_TYPE', TTT, raising=False) # Set by set_game().
+    monkeypatch.setattr(Game_Master_Offline, 'TIME_PER_MOVE', LIMIT)
+    monkeypatch.setattr(Game_Master_Offline, 'PLAYERX', FirstEmpty())
+    monkeypatch.setattr(Game_Master_Offline, 'PLAYERO', FirstEmpty())
+    monkeypatch.setattr(Game_Master_Offline, 'ISOLATE_AGENTS', True)
+    session = Game_Master_Offline.runGame(sinks=[])
+    assert session.finished
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,38 @@
+'''test_move_gen.py
+
+lazy_moves() yields every legal move once (one of each set of
+symmetric images), and move_count() counts them without generating
+them.
+'''
+
+import random
+import pytest
+from src.core.bitboard import BitState
+from src.core.move_gen import lazy_moves, move_count
+from src.core.game_types import GAME_TYPES
+
+def positions(game_type, seed, count=30):
+    rng = random.Random(seed)
+    for _ in range(count):
+        state = BitState(game_type)
+        for _ in range(rng.randrange(0, 8)):
+            if state.winner() or not state.empty_bits:
+                break
+            state.make_move(rng.choice(state.legal_moves()))
+        yield state, rng
+
+@pytest.mark.parametrize('name', sorted(GAME_TYPES))
+@pytest.mark.parametrize('near_only', [False, True])
+def test_move_count_matches_lazy_moves(name, near_only):
+    for state, rng in positions(GAME_TYPES[name], name):
+        killers = rng.sample(range(state.n * state.m), 2)
+        tactical = set()
+        moves = list(lazy_moves(state, None, None, killers, tactical, near_only))
+        assert len(set(moves)) == len(moves)
+        assert move_count(state, near_only, tactical) == len(moves)
+
+def test_symmetric_positions_count_one_move_per_image():
+    state = BitState(GAME_TYPES['TTT'])
+    assert move_count(state) == 3 # Corner, edge, center.
+    state.make_move((1, 1))
+    assert move_count(state) == 2 # Corner, edge.
@@ -0,0 +1,113 @@
+'''test_proof_number.py
+
+Proof-number search against brute force on small boards: its verdict,
+the move it gives for a win or a draw, the verdict on a game already
+over, and the root left as it was when it runs out of nodes.
+'''
+
+import random
+import pytest
+from src.core.bitboard import BitState
+from src.core.game_types import GAME_TYPES, custom_game_type
+from src.core.proof_number import ProofNumberSearch, WIN, DRAW, LOSS
+
+VALUES = {WIN: 1, DRAW: 0, LOSS: -1}
+SMALL = [GAME_TYPES['TTT'], custom_game_type(3, 3, 4), custom_game_type(3, 4, 3)]
+
+def brute_force(state, turns_left, memo):
+    """1, 0 or -1: the value of state for the side to move, by full minimax."""
+    if turns_left <= 0 or state.empty_bits == 0:
+        return 0
+    key = (state.hash, turns_left)
+    if key not in memo:
+        best = -1
+        for move in state.legal_moves():
+            state.make_move(move)
+            try:
+                if state.x_wins or state.o_wins:
+                    value = 1
+                else:
+                    value = -brute_force(state, turns_left - 1, memo)
+            finally:
+                state.unmake_move()
+            best = max(best, value)
+            if best == 1:
+                break
+        memo[key] = best
+    return memo[key]
+
+def positions(game_type, count, seed):
+    """The empty board and some random positions with no win yet."""
+    rng = random.Random(seed)
+    yield BitState(game_type)
+    for _ in range(count):
+        state = BitState(game_type)
+        for _ in range(rng.randrange(1, 6)):
+            state.make_move(rng.choice(state.legal_moves()))
+            if state.x_wins or state.o_wins:
+                state.unmake_move()
+                break
+        yield BitState(game_type, state.to_state())
+
+def check(state, turns_left):
+    memo = {}
+    result = ProofNumberSearch().solve(state, turns_left)
+    assert result.outcome is not None
+    assert VALUES[result.outcome] == brute_force(state, turns_left, memo)
+    if result.outcome == LOSS:
+        assert result.move is None
+        return
+    assert result.move in state.legal_moves()
+    state.make_move(result.move)
+    try:
+        if state.x_wins or state.o_wins:
+            achieved = 1
+        else:
+            achieved = -brute_force(state, turns_left - 1, memo)
+    finally:
+        state.unmake_move()
+    assert achieved == VALUES[result.outcome]
+
+@pytest.mark.parametrize('game_type', SMALL, ids=lambda g: f"{g.k}-{g.n}x{g.m}")
+def test_verdict_and_move_match_brute_force(game_type):
+    for state in positions(game_type, 12, game_type.long_name):
+        check(state, state.num_empty())
+
+@pytest.mark.parametrize('turns_left', [1, 2, 3, 4, 5])
+def test_turn_limit(turns_left):
+    for state in positions(GAME_TYPES['TTT'], 8, turns_left):
+        check(state, min(turns_left, state.num_empty()))
+
+def test_game_already_over():
+    state = BitState(GAME_TYPES['TTT'])
+    for move in ((0, 0), (0, 1), (0, 2), (1, 1), (1, 0), (1, 2), (2, 1), (2, 0), (2, 2)):
+        state.make_move(move)
+    assert state.winner() is None # A full board, drawn.
+    result = ProofNumberSearch().solve(state)
+    assert result.outcome == DRAW and result.move is None
+    state = BitState(GAME_TYPES['TTT'])
+    result = ProofNumberSearch().solve(state, turns_left=0)
+    assert result.outcome == DRAW and result.move is None
+    for move in ((0, 0), (1, 0), (0, 1), (1, 1), (0, 2)):
+        state.make_move(move)
+    result = ProofNumberSearch().solve(state)
+    assert result.outcome == LOSS and result.move is None
+
+def test_out_of_nodes_leaves_root_intact():
+    game_type = custom_game_type(4, 5, 5)
+    for max_nodes in (3, 10, 50, 200):
+        state = BitState(game_type)
+        state.make_move((2, 2))
+        before = (state.x_bits, state.o_bits, state.hash, state.x_counts[:], state.o_counts[:],
+                  [row[:] for row in state.board], state.whose_move, state.history[:])
+        result = ProofNumberSearch(max_nodes=max_nodes).solve(state)
+        assert result.outcome is None and result.move is None
+        assert (state.x_bits, state.o_bits, state.hash, state.x_counts, state.o_counts,
+                state.board, state.whose_move, state.history) == before
+
+def test_small_table_never_gives_a_verdict_without_a_move():
+    for max_entries in (8, 40, 80, 160):
+        state = BitState(GAME_TYPES['TTT'])
+        result = ProofNumberSearch(max_nodes=20000, max_entries=max_entries).solve(state)
+        if result.outcome is not None:
+            assert result.outcome == DRAW and result.move in state.legal_moves()
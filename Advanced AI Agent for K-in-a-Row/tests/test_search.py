@@ -0,0 +1,124 @@
+'''test_search.py
+
+The time budget keeps its soft deadline inside the hard one and banks
+what quick moves leave unused, and the search returns by its hard
+deadline however big the board.  Principal variation search and
+aspiration windows give the score of plain negamax at every depth, and
+late-move reductions, which may change a heuristic score, keep every
+forced win and loss it finds.  A first line to try changes only the
+order of the search, not its score.
+'''
+
+import random
+import time
+import pytest
+from src.core.bitboard import BitState
+from src.core.game_types import GAME_TYPES, custom_game_type
+from src.core.search import Search, TimeBudget, WIN_SCORE, WIN_BOUND, INFINITY
+
+FIAR = GAME_TYPES['FIAR']
+
+def test_soft_deadline_within_hard():
+    budget = TimeBudget(FIAR)
+    state = BitState(FIAR)
+    for bank in (0.0, 0.5, 100.0):
+        budget.bank = bank
+        soft, hard = budget.plan(state, 10.0, 1.0)
+        assert 10.0 < soft <= hard < 11.0
+
+def test_quick_moves_fill_the_bank():
+    budget = TimeBudget(FIAR)
+    state = BitState(FIAR)
+    soft, hard = budget.plan(state, 0.0, 1.0)
+    budget.spend(0.0)
+    assert budget.bank > 0
+    later_soft, later_hard = budget.plan(state, 0.0, 1.0)
+    assert later_soft > soft and later_hard == hard
+
+def test_overruns_draw_the_bank_down():
+    budget = TimeBudget(FIAR)
+    budget.bank = 0.1
+    budget.plan(BitState(FIAR), 0.0, 1.0)
+    budget.spend(1.0)
+    assert budget.bank == 0.0 and budget.allotted == 0.0
+
+def test_search_stops_at_hard_deadline():
+    game_type = custom_game_type(5, 15, 15)
+    search = Search(lambda state: 0)
+    deadline = time.time() + 0.2
+    result = search.iterative_deepening(BitState(game_type), deadline, deadline + 10)
+    assert time.time() < deadline + 0.1
+    assert result.move is not None
+
+def noisy_eval(state):
+    """A static value with no pattern to it, the same for symmetric positions."""
+    return (state.canonical_key()[0] * 2654435761 >> 11) % 201 - 100
+
+def negamax(state, depth, ply, turns_left):
+    """The score Search should give, from the side to move's point of view."""
+    if state.x_wins or state.o_wins:
+        return -(WIN_SCORE - ply)
+    if ply >= turns_left or state.empty_bits == 0:
+        return 0
+    if depth <= 0:
+        value = noisy_eval(state)
+        return value if state.whose_move == 'X' else -value
+    best = -INFINITY
+    for move in state.legal_moves():
+        state.make_move(move)
+        best = max(best, -negamax(state, depth - 1, ply + 1, turns_left))
+        state.unmake_move()
+    return best
+
+def positions(seed, stones):
+    """Random unfinished positions with the given numbers of stones."""
+    rng = random.Random(seed)
+    for game_type in (GAME_TYPES['TTT'], custom_game_type(3, 4, 4)):
+        for count in stones:
+            for _ in range(4):
+                state = BitState(game_type)
+                for move in rng.sample(state.legal_moves(), count):
+                    state.make_move(move)
+                if state.empty_bits and not (state.x_wins or state.o_wins):
+                    yield state
+
+def search_and_check(search, state, depth):
+    """Search state to depth; return (Search's score, negamax's), both for X."""
+    turns_left = state.num_empty()
+    result = search.iterative_deepening(state, time.time() + 60, max_depth=depth,
+                                        turns_left=turns_left)
+    sign = 1 if state.whose_move == 'X' else -1
+    return result.score, sign * negamax(state, result.depth, 0, turns_left)
+
+@pytest.mark.parametrize('switches', [('pvs',), ('aspiration',), ('pvs', 'aspiration')])
+def test_switches_keep_negamax_score(switches):
+    re_searches = 0
+    for state in positions('+'.join(switches), (1, 3, 5)):
+        for depth in (1, 2, 3, 4):
+            search = Search(noisy_eval)
+            for switch in switches:
+                setattr(search, switch, True)
+            search.aspiration_window = 5 # Narrow enough to fail and search again.
+            score, expected = search_and_check(search, state, depth)
+            assert score == expected
+            re_searches += search.re_searches
+    assert re_searches # The windows did fail, and were widened.
+
+def test_reductions_keep_forced_results():
+    forced = 0
+    for state in positions('reductions', (3, 4, 5, 6)):
+        search = Search(noisy_eval)
+        search.reductions = True
+        score, expected = search_and_check(search, state, 4)
+        if abs(expected) > WIN_BOUND or abs(score) > WIN_BOUND:
+            assert score == expected
+            forced += 1
+    assert forced
+
+def test_first_line_changes_only_the_order():
+    for state in positions('first line', (2, 4)):
+        line = [state.legal_moves()[-1]]
+        plain = Search(noisy_eval).iterative_deepening(state, time.time() + 60, max_depth=3)
+        hinted = Search(noisy_eval).iterative_deepening(state, time.time() + 60, max_depth=3,
+                                                       first_line=line)
+        assert hinted.score == plain.score
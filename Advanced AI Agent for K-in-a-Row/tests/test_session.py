@@ -0,0 +1,93 @@
+'''test_session.py
+
+GameSession judging games: illegal moves are refused, and a player
+that fails forfeits.
+'''
+
+import pytest
+from src.core.game_types import State, GAME_TYPES
+from src.core.session import GameSession, IllegalMove
+
+TTT = GAME_TYPES['TTT']
+
+class Scripted:
+    """Plays the given moves in turn, remembering what it was told."""
+    def __init__(self, nickname, moves=()):
+        self.nickname = nickname
+        self.moves = list(moves)
+        self.heard = []
+
+    def prepare(self, game_type, side, opponent, time_per_move=0.1, utterances_matter=True):
+        return 'OK'
+
+    def make_move(self, state, remark, time_limit=1000):
+        self.heard.append(remark)
+        move = self.moves.pop(0)
+        new_state = State(old=state)
+        if move is not None and state.board[move[0]][move[1]] == ' ':
+            new_state.board[move[0]][move[1]] = state.whose_move
+            new_state.change_turn()
+        return [[move, new_state], f"{self.nickname} to {move}"]
+
+class Raising(Scripted):
+    def make_move(self, state, remark, time_limit=1000):
+        raise RuntimeError('out of ideas')
+
+class NotPreparing(Scripted):
+    def prepare(self, *args, **kwargs):
+        raise RuntimeError('no tables')
+
+def session(x=None, o=None):
+    return GameSession(TTT, x or Scripted('Xavier'), o or Scripted('Olga'), 0.1)
+
+@pytest.mark.parametrize('move', [(1, 1), (3, 0), (0, -1), (1,), 'a1', None])
+def test_play_rejects_illegal_moves(move):
+    game = session()
+    game.play((1, 1))
+    board = [row[:] for row in game.state.board]
+    with pytest.raises(IllegalMove):
+        game.play(move)
+    assert game.state.board == board
+    assert game.to_move == 'O' and game.turn_count == 1 and not game.finished
+
+def test_play_rejects_moves_after_the_end():
+    game = session()
+    for move in [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2)]:
+        game.play(move)
+    assert game.finished and game.winner == 'X' and not game.forfeited
+    with pytest.raises(IllegalMove):
+        game.play((2, 2))
+
+def test_first_remark():
+    x = Scripted('Xavier', [(0, 0)])
+    o = Scripted('Olga', [(1, 1)])
+    game = session(x, o)
+    game.prepare()
+    game.agent_move()
+    game.agent_move()
+    assert x.heard == ["The game is starting."]
+    assert o.heard == ["Xavier to (0, 0)"]
+
+def test_exception_forfeits():
+    game = session(Scripted('Xavier', [(0, 0)]), Raising('Olga'))
+    assert game.prepare()
+    assert game.agent_move() == (0, 0)
+    assert game.agent_move() is None
+    assert game.finished and game.forfeited and game.winner == 'X'
+    assert game.result.startswith("Olga (O) raised RuntimeError('out of ideas')")
+    assert game.result.endswith("and loses by default.")
+
+@pytest.mark.parametrize('move', [(0, 0), (5, 5), None])
+def test_bad_move_forfeits(move):
+    game = session(Scripted('Xavier', [(0, 0)]), Scripted('Olga', [move]))
+    game.prepare()
+    game.agent_move()
+    assert game.agent_move() is None
+    assert game.forfeited and game.winner == 'X'
+    assert game.moves == [('X', (0, 0))]
+
+def test_failing_to_prepare_forfeits():
+    game = session(Scripted('Xavier'), NotPreparing('Olga'))
+    assert not game.prepare()
+    assert game.finished and game.forfeited and game.winner == 'X'
+    assert 'failed to prepare' in game.result
@@ -0,0 +1,78 @@
+'''test_threat_space.py
+
+Threat-space search finds wins made of threats, calls only those made
+of fours proofs, and leaves the root position as it found it when its
+time runs out mid-line.
+'''
+
+from src.core.bitboard import BitState
+from src.core.game_types import State, GAME_TYPES
+from src.core.search import SearchTimeout
+from src.core.threat_space import ThreatSpaceSearch
+
+FIAR = GAME_TYPES['FIAR']
+
+def position(rows, whose_move):
+    return BitState(FIAR, State(initial_state_data=[[list(row) for row in rows], whose_move]))
+
+# X to move with an open three and more stones about: plenty of threats to try.
+OPEN = ['       ',
+        '  X    ',
+        '  XX O ',
+        '   XO  ',
+        '  O  O ',
+        '       ',
+        '       ']
+
+class Interrupted(ThreatSpaceSearch):
+    """Runs out of time after limit nodes, wherever it is."""
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def count_node(self):
+        super().count_node()
+        if self.nodes >= self.limit:
+            raise SearchTimeout()
+
+def test_finds_open_four_win():
+    state = position(['       ',
+                      '       ',
+                      ' XXX   ',
+                      '       ',
+                      '  OO   ',
+                      '    O  ',
+                      '       '], 'X')
+    result = ThreatSpaceSearch().find_win(state)
+    assert result is not None and result.depth == 2
+    assert result.move in ((2, 0), (2, 4))
+    assert result.proof # Made of fours only.
+    assert state.history == []
+
+def test_win_needing_threes_is_no_proof():
+    # X's (3, 3) makes two threes; no line of fours wins.
+    state = position(['       ',
+                      '   X   ',
+                      '   X   ',
+                      ' XX    ',
+                      '       ',
+                      ' O   O ',
+                      'O     O'], 'X')
+    assert ThreatSpaceSearch(threes=False).find_win(state) is None
+    search = ThreatSpaceSearch()
+    result = search.find_win(state)
+    assert result is not None and not result.proof
+    assert result.move == (3, 3)
+    assert search.threes # Put back after the search of fours alone.
+
+def test_timeout_leaves_root_intact():
+    for limit in (2, 5, 10, 25, 60):
+        state = position(OPEN, 'X')
+        before = (state.x_bits, state.o_bits, state.hash, state.x_counts[:], state.o_counts[:],
+                  [row[:] for row in state.board], state.whose_move)
+        search = Interrupted(limit)
+        search.find_win(state)
+        assert search.nodes == limit # The search was cut off, not finished.
+        assert state.history == []
+        assert (state.x_bits, state.o_bits, state.hash, state.x_counts, state.o_counts,
+                state.board, state.whose_move) == before
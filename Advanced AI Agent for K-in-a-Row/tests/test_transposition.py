@@ -0,0 +1,63 @@
+'''test_transposition.py
+
+Which stored bounds settle which windows, and which entries the
+table keeps when two positions share a bucket.
+'''
+
+import pytest
+from src.core.transposition import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
+
+KEY = 0x1234567890abcdef
+
+def stored(depth, score, bound):
+    table = TranspositionTable(max_bytes=4096)
+    table.store(KEY, depth, score, bound, 7)
+    return table, table.probe(KEY)
+
+@pytest.mark.parametrize('bound, alpha, beta, settles', [
+    (EXACT, -100, 100, True),
+    (LOWER, -100, 50, True),    # At least 50: fails high.
+    (LOWER, -100, 51, False),
+    (UPPER, 50, 100, True),     # At most 50: fails low.
+    (UPPER, 49, 100, False),
+    (LOWER, -100, None, False),
+    (UPPER, None, 100, False),
+])
+def test_bounds(bound, alpha, beta, settles):
+    table, slot = stored(4, 50, bound)
+    assert table.cutoff(slot, 4, alpha, beta) == settles
+
+def test_too_shallow_never_settles():
+    table, slot = stored(3, 50, EXACT)
+    assert table.cutoff(slot, 3, -100, 100)
+    assert not table.cutoff(slot, 4, -100, 100)
+
+def test_caller_score_replaces_stored_one():
+    table, slot = stored(4, 50, LOWER)
+    assert not table.cutoff(slot, 4, -100, 60)
+    assert table.cutoff(slot, 4, -100, 60, score=60)
+
+def test_probe_misses_other_keys():
+    table, slot = stored(4, 50, EXACT)
+    assert slot >= 0 and table.moves[slot] == 7
+    assert table.probe(KEY ^ 1 << 40) == -1
+
+def test_deeper_entry_keeps_first_slot():
+    table, slot = stored(6, 50, EXACT)
+    other = KEY + table.size # Same bucket, another position.
+    table.store(other, 2, 10, EXACT)
+    assert table.probe(KEY) == slot
+    assert table.probe(other) == slot + 1
+
+def test_new_search_lets_old_entries_go():
+    table, slot = stored(6, 50, EXACT)
+    table.new_search()
+    other = KEY + table.size
+    table.store(other, 2, 10, EXACT)
+    assert table.probe(other) == slot
+    assert table.probe(KEY) == slot + 1 # Moved down, not lost.
+
+def test_restore_keeps_best_move():
+    table, slot = stored(4, 50, EXACT)
+    table.store(KEY, 5, 60, LOWER, NO_MOVE)
+    assert table.moves[slot] == 7 and table.depths[slot] == 5